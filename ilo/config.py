@@ -51,6 +51,20 @@ class Config(object):
 
         cls.__cfg["render.texture"]                         = True
         cls.__cfg["render.shader"]                          = True
+        cls.__cfg["render.patchlevel"]                      = 8
+        cls.__cfg["render.patchdistance"]                   = 256.0
+        cls.__cfg["render.lightmapatlas"]                   = 2048
+        cls.__cfg["render.lodlevels"]                       = 4
+        cls.__cfg["render.lodminfaces"]                     = 256
+        cls.__cfg["render.loddistance"]                     = 8.0
+        cls.__cfg["render.lodhysteresis"]                   = 0.1
+        cls.__cfg["render.vertexformat"]                    = "float"
+        cls.__cfg["render.creaseangle"]                     = 60.0
+        cls.__cfg["render.shadows"]                         = "none"
+        cls.__cfg["render.shadowdarkness"]                  = 0.5
+        cls.__cfg["render.shadowshader"]                    = True
+        cls.__cfg["render.shadowmapsize"]                   = 1024
+        cls.__cfg["render.shadowpcf"]                       = 3
 
         cls.__cfg["projection.fov"]                         = 50.0
         cls.__cfg["window.width"]                           = 640
@@ -58,6 +72,11 @@ class Config(object):
 
         cls.__cfg["display.normalvectors"]                  = False
 
+        cls.__cfg["resource.meshcache"]                     = "data/cache"
+        cls.__cfg["resource.loadworkers"]                   = 0
+        cls.__cfg["resource.vertexcache"]                   = 32
+        cls.__cfg["resource.keepmeshdata"]                  = False
+
 
     @classmethod
     def loadConfigXML (cls, xmlFile, reset=True):
@@ -92,6 +111,8 @@ class Config(object):
                         itemType  = item.getAttribute("type")
                         if itemType == 'int':
                             cls.__cfg[lower(catName+"."+itemName)] = int(itemValue)
+                        elif itemType == 'float':
+                            cls.__cfg[lower(catName+"."+itemName)] = float(itemValue)
                         elif itemType == 'bool':
                             cls.__cfg[lower(catName+"."+itemName)] = lower(itemValue) == 'true'
                         else:
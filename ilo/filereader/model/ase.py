@@ -4,16 +4,458 @@ __author__="Vadasz Laszlo"
 __date__ = "2009.07.21. 21:46:18"
 
 from ilo.messages.exceptios import *
+import os
 import os.path
+import re
+import json
+import numpy
 
 from ilo.tools.strtool import fullstrip
 from ilo.messages.exceptios import IloError
 from ilo.structs.modelfile import ModelFile
 
+"""
+ASE (ASCII Scene Export) fájlok beolvasása
 
-def loadASEFile (fileName):
+A fájlt egyben olvassuk be, a blokkokat a kapcsos zárójelek
+alapján keressük meg, a listákat pedig soronkénti feldolgozás helyett
+egyetlen C{numpy.fromstring} hívással alakítjuk tömbbé.
+
+Többobjektumos fájlokból a kért geometriák a fájl mellé írt
+C{.idx} indexben tárolt bájt-tartományok alapján, a többi objektum
+feldolgozása nélkül olvashatók be.
+"""
+
+__ase_index_version__ = 1
+
+__ase_node_name__   = re.compile(r'\*NODE_NAME\s+"([^"]*)"')
+__ase_face__        = re.compile(r'(\d+):\s*A:\s*(\d+)\s+B:\s*(\d+)\s+C:\s*(\d+)'
+                                 r'(?:[^\n]*?MESH_SMOOTHING[ \t]*([\d,]*))?')
+
+
+def _findTag(data, tag, start, end):
+    """
+    Egy önálló címke (melyet szóköz követ) első előfordulásának keresése
+
+    @param  data:   Az ASE fájl tartalma
+    @type   data:   C{string}
+    @param  tag:    A keresett címke, pl. C{*MESH_NUMVERTEX}
+    @type   tag:    C{string}
+    @param  start:  A keresés kezdete
+    @type   start:  C{int}
+    @param  end:    A keresés vége
+    @type   end:    C{int}
+
+    @return:        A címke utáni első karakter pozíciója, vagy C{-1} ha nem
+                    található
+    @rtype:         C{int}
+    """
+    pos = data.find(tag, start, end)
+    while pos >= 0:
+        pos += len(tag)
+        if data[pos:pos + 1].isspace():
+            return pos
+        pos = data.find(tag, pos, end)
+    return -1
+
+
+def _findOpening(data, tag, start, end):
+    """
+    Egy blokkot nyitó címke (C{tag {}) keresése
+
+    @return:    A nyitó C{{} utáni pozíció, vagy C{-1} ha nem található
+    @rtype:     C{int}
+    """
+    pos = _findTag(data, tag, start, end)
+    while pos >= 0:
+        opening = data.find('{', pos, end)
+        if opening >= 0 and data[pos:opening].isspace():
+            return opening + 1
+        pos = _findTag(data, tag, pos, end)
+    return -1
+
+
+def _blockEnd(data, start):
+    """
+    A C{start} pozíción kezdődő blokk záró C{}} karakterének pozíciója
+
+    @param  data:   Az ASE fájl tartalma
+    @type   data:   C{string}
+    @param  start:  A nyitó C{{} utáni első karakter pozíciója
+    @type   start:  C{int}
+
+    @return:        A blokkot lezáró C{}} pozíciója, ha nincs ilyen, akkor a
+                    fájl hossza
+    @rtype:         C{int}
+    """
+    depth = 1
+    pos = start
+    while depth > 0:
+        close = data.find('}', pos)
+        if close < 0:
+            # a lezáratlan blokk a fájl végéig tart (pl. hajo.ase)
+            return len(data)
+        opening = data.find('{', pos, close)
+        if opening >= 0:
+            depth += 1
+            pos = opening + 1
+        else:
+            depth -= 1
+            pos = close + 1
+    return pos - 1
+
+
+def _iterBlocks(data, tag, start=0, end=None):
+    """
+    A megadott címkéjű blokkok bejárása
+
+    @param  data:   Az ASE fájl tartalma
+    @type   data:   C{string}
+    @param  tag:    A blokk címkéje, pl. C{*GEOMOBJECT}
+    @type   tag:    C{string}
+    @param  start:  A keresés kezdete
+    @type   start:  C{int}
+    @param  end:    A keresés vége, C{None} esetén a fájl vége
+    @type   end:    C{int}
+
+    @return:        A blokkok tartalmának (kezdet, vég) pozíciói
+    @rtype:         C{generator}
+    """
+    if end == None:
+        end = len(data)
+    pos = _findOpening(data, tag, start, end)
+    while pos >= 0:
+        blockEnd = _blockEnd(data, pos)
+        yield pos, blockEnd
+        pos = _findOpening(data, tag, blockEnd, end)
+
+
+def _findList(data, tag, start, end):
+    """
+    Az első megadott címkéjű lista blokk tartalma
+
+    A lista blokkok nem tartalmaznak további blokkokat, ezért a lista a
+    következő C{}} vagy - hiányzó lezárás esetén - a következő C{{} karakterig
+    tart.
+
+    @return:    A blokk tartalma, vagy C{None} ha nem található
+    @rtype:     C{string}
+    """
+    listStart = _findOpening(data, tag, start, end)
+    if listStart < 0:
+        return None
+    listEnd = data.find('}', listStart, end)
+    if listEnd < 0:
+        listEnd = end
+    opening = data.find('{', listStart, listEnd)
+    if opening >= 0:
+        listEnd = opening
+    return data[listStart:listEnd]
+
+
+def _findCount(data, tag, start, end):
+    """
+    Számláló érték (pl. C{*MESH_NUMVERTEX}) beolvasása
+
+    @return:    A címkéhez tartozó érték, ha nincs ilyen címke akkor 0
+    @rtype:     C{int}
+    """
+    pos = _findTag(data, tag, start, end)
+    if pos < 0:
+        return 0
+    return int(data[pos:pos + 32].split(None, 1)[0])
+
+
+def _parseRows(block, tags, columns, dtype=numpy.float32):
+    """
+    Egy lista blokk sorainak tömbbé alakítása
+
+    A sorokból a címkéket eltávolítva a számokat egyetlen szövegként adjuk át a
+    C{numpy.fromstring}-nek.
+
+    @param  block:      A lista blokk tartalma
+    @type   block:      C{string}
+    @param  tags:       A sorok címkéi, pl. C{("*MESH_VERTEX",)}
+    @type   tags:       C{tuple}
+    @param  columns:    A címke utáni számok darabszáma soronként
+    @type   columns:    C{int}
+    @param  dtype:      A tömb elemeinek típusa
+    @type   dtype:      C{numpy.dtype}
+
+    @return:            C{(n, columns)} méretű tömb
+    @rtype:             C{numpy.ndarray}
+    """
+    for tag in tags:
+        block = block.replace(tag, " ")
+    rows = numpy.fromstring(block, dtype=dtype, sep=" ")
+    if len(rows) % columns:
+        raise IloError("ASE fajl hiba: hibas %s lista" % tags[0])
+    return rows.reshape(-1, columns)
+
+
+def _scatterRows(rows, count, width, dtype):
+    """
+    Az indexelt sorok elhelyezése egy előre lefoglalt tömbben
+
+    Az első oszlop az elem indexe, a többi az érték.
+
+    @param  rows:   C{_parseRows} eredménye
+    @type   rows:   C{numpy.ndarray}
+    @param  count:  A fájlban megadott elemszám
+    @type   count:  C{int}
+    @param  width:  Egy elem értékeinek száma
+    @type   width:  C{int}
+    @param  dtype:  A tömb elemeinek típusa
+    @type   dtype:  C{numpy.dtype}
+
+    @return:        C{(count, width)} méretű tömb
+    @rtype:         C{numpy.ndarray}
+    """
+    if len(rows) != count:
+        raise IloError("ASE fajl hiba: %d elem helyett %d" % (count, len(rows)))
+    result = numpy.empty((count, width), dtype=dtype)
+    result[rows[:, 0].astype(numpy.int32)] = rows[:, 1:width + 1]
+    return result
+
+
+def _smoothingMasks(groups):
+    """
+    A C{*MESH_SMOOTHING} csoportlisták (pl. C{"1,3"}) bitmaszkká alakítása
+
+    A lapok többnyire néhány féle listát használnak, ezért csak a különböző
+    listákat dolgozzuk fel.
+
+    @param  groups: Laponként a vesszővel elválasztott csoportok (1-32)
+    @type   groups: C{numpy.ndarray}
+
+    @return:        Laponként a bitmaszk, az I{n}. csoport az I{n-1}. bit
+    @rtype:         C{numpy.ndarray}
+    """
+    unique, inverse = numpy.unique(groups, return_inverse=True)
+    masks = numpy.zeros(len(unique), dtype=numpy.uint32)
+    for i, text in enumerate(unique):
+        for group in text.split(","):
+            if group and 0 < int(group) <= 32:
+                masks[i] |= numpy.uint32(1 << (int(group) - 1))
+    return masks[inverse]
+
+
+def _parseGeomObject(data, start, end):
+    """
+    Egy C{*GEOMOBJECT} blokk feldolgozása
+
+    @param  data:   Az ASE fájl tartalma
+    @type   data:   C{string}
+    @param  start:  A blokk kezdete
+    @type   start:  C{int}
+    @param  end:    A blokk vége
+    @type   end:    C{int}
+
+    @return:        A beolvasott geometria
+    @rtype:         C{ModelFile}
+    """
+    geometry = ModelFile()
+
+    match = __ase_node_name__.search(data, start, end)
+    if match != None:
+        geometry.name = match.group(1)
+
+    for meshStart, meshEnd in _iterBlocks(data, "*MESH", start, end):
+        numVertex   = _findCount(data, "*MESH_NUMVERTEX",  meshStart, meshEnd)
+        numFace     = _findCount(data, "*MESH_NUMFACES",   meshStart, meshEnd)
+        numTVertex  = _findCount(data, "*MESH_NUMTVERTEX", meshStart, meshEnd)
+        numCVertex  = _findCount(data, "*MESH_NUMCVERTEX", meshStart, meshEnd)
+
+        #VERTEX
+        block = _findList(data, "*MESH_VERTEX_LIST", meshStart, meshEnd)
+        if block != None:
+            rows = _parseRows(block, ("*MESH_VERTEX",), 4)
+            geometry.vertex = _scatterRows(rows, numVertex, 3, numpy.float32)
+
+        #FACE
+        block = _findList(data, "*MESH_FACE_LIST", meshStart, meshEnd)
+        if block != None:
+            rows = numpy.array(__ase_face__.findall(block)).reshape(-1, 5)
+            index = rows[:, :4].astype(numpy.int32)
+            geometry.face = _scatterRows(index, numFace, 3, numpy.int32)
+            if (rows[:, 4] != "").any():
+                smoothing = numpy.empty(numFace, dtype=numpy.uint32)
+                smoothing[index[:, 0]] = _smoothingMasks(rows[:, 4])
+                geometry.faceSmoothing = smoothing
+
+        #ColorVERTEX
+        block = _findList(data, "*MESH_CVERTLIST", meshStart, meshEnd)
+        if block != None:
+            rows = _parseRows(block, ("*MESH_VERTCOL",), 4)
+            geometry.vertexColor = _scatterRows(rows, numCVertex, 3, numpy.float32)
+
+        #ColorFACE
+        block = _findList(data, "*MESH_CFACELIST", meshStart, meshEnd)
+        if block != None:
+            geometry.faceColor = _parseRows(block, ("*MESH_CFACE",), 4, numpy.int32)[:, 1:]
+
+        #TextureVERTEX
+        block = _findList(data, "*MESH_TVERTLIST", meshStart, meshEnd)
+        if block != None:
+            rows = _parseRows(block, ("*MESH_TVERT",), 4)
+            geometry.vertexUV = _scatterRows(rows, numTVertex, 2, numpy.float32)
+
+        #TextureFACE
+        block = _findList(data, "*MESH_TFACELIST", meshStart, meshEnd)
+        if block != None:
+            geometry.faceUV = _parseRows(block, ("*MESH_TFACE",), 4, numpy.int32)[:, 1:]
+
+        #NORMALS
+        block = _findList(data, "*MESH_NORMALS", meshStart, meshEnd)
+        if block != None:
+            # lapnként egy lap- és három csúcs normálvektor
+            rows = _parseRows(block, ("*MESH_FACENORMAL", "*MESH_VERTEXNORMAL"), 4)
+            if len(rows) != numFace * 4:
+                raise IloError("ASE fajl hiba: hibas *MESH_NORMALS lista")
+            rows = rows.reshape(numFace, 4, 4)
+            geometry.faceNormal = rows[:, 0, 1:].copy()
+
+            # egy csúcshoz több normálvektor is tartozhat, mindig az utolsó marad
+            rows = rows[:, 1:, :].reshape(-1, 4)
+            normals = numpy.zeros((numVertex, 3), dtype=numpy.float32)
+            normals[rows[:, 0].astype(numpy.int32)] = rows[:, 1:]
+            geometry.vertexNormal = normals
+
+    return geometry
+
+
+def _readFile(fileName):
+    """
+    Az ASE fájl teljes tartalma
+
+    @rtype:     C{string}
+    """
+    try:
+        file_in = open(fileName, "rb")
+        try:
+            return file_in.read()
+        finally:
+            file_in.close()
+    except IOError as e:
+        raise IloError("ASE fajl (%s) olvasasi hiba: %s" % (fileName, e))
+
+
+def _scanObjects(data):
+    """
+    A C{*GEOMOBJECT} blokkok nevének és bájt-tartományának kigyűjtése
+
+    Csak a blokkhatárokat és a C{*NODE_NAME} címkét keressük, a listákat
+    nem dolgozzuk fel.
+
+    @return:    Blokkonként a C{[név, kezdet, vég]} hármas
+    @rtype:     C{list}
+    """
+    objects = []
+    for start, end in _iterBlocks(data, "*GEOMOBJECT"):
+        match = __ase_node_name__.search(data, start, end)
+        objects.append([match.group(1) if match != None else "", start, end])
+    return objects
+
+
+def indexASEFile(fileName):
+    """
+    A fájl objektumainak bájt-tartomány indexe
+
+    Az indexet a fájl mellé (C{<fájl>.idx}) írjuk ki, a forrásfájl méretével
+    és módosítási idejével együtt. Ha ezek egyeznek, a fájlt nem kell
+    beolvasni. Ha az index nem írható (pl. csak olvasható könyvtár), minden
+    alkalommal újraépítjük.
+
+    @param  fileName:   Az ASE fájl neve és elérési útvonala
+    @type   fileName:   C{string}
+
+    @return:            Objektumonként a C{[név, kezdet, vég]} hármas
+    @rtype:             C{list}
+    """
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        raise IloError("ASE fajl megnyitasi hiba %s" % fileName)
+
+    indexName = fileName + ".idx"
+    try:
+        file_in = open(indexName, "r")
+        try:
+            index = json.load(file_in)
+        finally:
+            file_in.close()
+        if index.get("version") == __ase_index_version__ and \
+           index.get("size") == stat.st_size and index.get("mtime") == stat.st_mtime:
+            return index["objects"]
+    except (IOError, ValueError):
+        pass
+
+    objects = _scanObjects(_readFile(fileName))
+    try:
+        file_out = open(indexName, "w")
+        try:
+            json.dump({"version" : __ase_index_version__,
+                       "size"    : stat.st_size,
+                       "mtime"   : stat.st_mtime,
+                       "objects" : objects}, file_out)
+        finally:
+            file_out.close()
+    except IOError as err:
+        print "ASE index irasi hiba (%s): %s" % (indexName, err)
+    return objects
+
+
+def loadASEFile (fileName, geomIDs=None):
     """
     ASE (ASCII Scene Export) fájl feldogozás
+
+    A fájl minden C{*GEOMOBJECT} blokkjából egy C{ModelFile} készül, melynek
+    listái már C{numpy} tömbök (C{float32} illetve C{int32}).
+    Ha a C{geomIDs} meg van adva, akkor az index (lásd C{indexASEFile})
+    alapján csak a kért objektumok blokkjait olvassuk be és dolgozzuk fel.
+
+    @param  fileName:   Az ASE fájl neve és elérési útvonala
+    @type   fileName:   C{string}
+    @param  geomIDs:    A beolvasandó objektumok azonosítói, C{None} esetén
+                        mindet beolvassa
+    @type   geomIDs:    C{list}
+
+    @return:            A fájlban található (kért) geometriák listája
+    @rtype:             C{list}
+    """
+    if not (os.path.exists(fileName) and os.path.isfile(fileName)):
+        raise IloError("ASE fajl megnyitasi hiba %s" % fileName)
+
+    geometris = []
+    if geomIDs == None:
+        data = _readFile(fileName)
+        for start, end in _iterBlocks(data, "*GEOMOBJECT"):
+            geometris.append(_parseGeomObject(data, start, end))
+    else:
+        try:
+            file_in = open(fileName, "rb")
+            try:
+                for name, start, end in indexASEFile(fileName):
+                    if name in geomIDs:
+                        file_in.seek(start)
+                        block = file_in.read(end - start)
+                        geometris.append(_parseGeomObject(block, 0, len(block)))
+            finally:
+                file_in.close()
+        except IOError as e:
+            raise IloError("ASE fajl (%s) olvasasi hiba: %s" % (fileName, e))
+
+    print "File is loaded %s" % (fileName)
+    return geometris
+
+
+def loadASEFileByLine (fileName):
+    """
+    ASE (ASCII Scene Export) fájl soronkénti feldolgozása
+
+    A korábbi, soronként C{fullstrip}-et hívó olvasó. Csak összehasonlításra
+    (lásd a modul C{__main__} részét) maradt meg, a motor a C{loadASEFile}
+    függvényt használja.
     """
     geometris = []
     try:
@@ -26,21 +468,13 @@ def loadASEFile (fileName):
             for line in file_in:
                 line = fullstrip(line, True)
                 if len(line) > 0:
-                    if "*COMMENT" in line[0]:
-                        #print " ".join (line[1:]).split('"')                                                           #COMMENT
-                        pass
-                    if "*SCANE" in line[0]:                                                                            #SCENE
-                        #TODO ASE scane információk feldolgozása
-                        pass
                     if "*GEOMOBJECT" in line[0]:                                                                       #GEOMOBJECT
-                        #initgeometry
                         geometry = ModelFile()
                         for geomLine in file_in:
                             geomLine = fullstrip(geomLine, True)
                             if "*NODE_NAME" in geomLine[0]:
                                 geometry.name = geomLine[1].split('"')[1]
                             elif "*NODE_TM" in geomLine[0]:                                                            #NODE
-                                #TODO parse ASE node information
                                 for nodeLine in file_in:
                                     nodeLine = fullstrip(nodeLine, True)
                                     if nodeLine[0] == '}':
@@ -48,33 +482,20 @@ def loadASEFile (fileName):
                             elif "*MESH" in geomLine[0]:
                                 for meshLine in file_in:
                                     meshLine = fullstrip(meshLine, True)
-                                    if "*TIMEVALUE" in meshLine[0]:
-                                        #TODO parse ASE timevalue
-                                        pass
-                                    elif "*MESH_NUMVERTEX" in meshLine[0]:                                             #VERTEX
-                                        pass    #számítható paraméter!
-                                    elif "*MESH_VERTEX_LIST" in meshLine[0]:
+                                    if "*MESH_VERTEX_LIST" in meshLine[0]:
                                         for vertLine in file_in:
                                             vertLine = fullstrip(vertLine, True)
                                             if "*MESH_VERTEX" in vertLine[0]:
                                                 geometry.addVertex([float(n) for n in vertLine[2:5]])
                                             else:
                                                 break
-                                    elif "*MESH_NUMFACES" in meshLine[0]:                                              #FACE
-                                        pass    #számítható paraméter!
                                     elif "*MESH_FACE_LIST" in meshLine[0]:
                                         for faceLine in file_in:
                                             faceLine = fullstrip(faceLine, True)
                                             if "*MESH_FACE" in faceLine[0]:
-                                                #TODO face adatok feldolgozása
-                                                #flag = {}#{"edge":edge, "smooth":faceLine[15], "matid":faceLine[17]}
-                                                vertList = [int(faceLine[i]) for i in [3, 5, 7]]
-                                                geometry.addFace(vertList)
-                                                #geometry["listFlag"].append(flag)
+                                                geometry.addFace([int(faceLine[i]) for i in [3, 5, 7]])
                                             else:
                                                 break
-                                    elif "*MESH_NUMCVERTEX" in meshLine[0]:                                            #ColorVERTEX
-                                        pass    #számítható paraméter!
                                     elif "MESH_CVERTLIST" in meshLine[0]:
                                         for cvertLine in file_in:
                                             cvertLine = fullstrip(cvertLine, True)
@@ -82,8 +503,6 @@ def loadASEFile (fileName):
                                                 geometry.addVertexColor([float(n) for n in cvertLine[2:5]])
                                             else:
                                                 break
-                                    elif "*MESH_NUMCVFACES" in meshLine[0]:                                            #ColorFACE
-                                        pass    #számítható paraméter!
                                     elif "*MESH_CFACELIST" in meshLine[0]:
                                         for cfaceLine in file_in:
                                             cfaceLine = fullstrip(cfaceLine, True)
@@ -91,8 +510,6 @@ def loadASEFile (fileName):
                                                 geometry.addFaceColor([int(n) for n in cfaceLine[2:5]])
                                             else:
                                                 break
-                                    elif "*MESH_NUMTVERTEX" in meshLine[0]:                                            #TextureVERTEX
-                                        pass    #számítható paraméter!
                                     elif "MESH_TVERTLIST" in meshLine[0]:
                                         for tvertLine in file_in:
                                             tvertLine = fullstrip(tvertLine, True)
@@ -100,8 +517,6 @@ def loadASEFile (fileName):
                                                 geometry.addVertexUV([float(n) for n in tvertLine[2:4]])
                                             else:
                                                 break
-                                    elif "*MESH_NUMTVFACES" in meshLine[0]:                                            #TextureFACE
-                                        pass    #számítható paraméter!
                                     elif "*MESH_TFACELIST" in meshLine[0]:
                                         for tfaceLine in file_in:
                                             tfaceLine = fullstrip(tfaceLine, True)
@@ -123,32 +538,71 @@ def loadASEFile (fileName):
                                             geometry.addVertexNormal(vnormals[i])
                                     elif meshLine[0] == '}':
                                         break
-                            elif "*PROP_MOTIONBLUR" in line[0]:
-                                pass
-                            elif "*PROP_CASTSHADOW" in line[0]:
-                                pass
-                            elif "*PROP_RECVSHADOW" in line[0]:
-                                pass
-                            elif "*MATERIAL_REF" in line[0]:
-                                pass
                             elif geomLine[0] == '}' :
                                 break
                         geometris.append(geometry)
 
         except IOError as e:
-            raise IloError("ASE fajl (:", fileName, ") olvasasi hiba:" + e)
+            raise IloError("ASE fajl (%s) olvasasi hiba: %s" % (fileName, e))
         finally:
             file_in.close()
 
         for geom in geometris :
             geom.convert()
 
-        print "File is loaded %s" % (fileName)
         return geometris
 
     except IOError:
         raise IloError("ASE fajl megnyitasi hiba %s" % fileName)
-        
+
 
 if __name__ == "__main__":
-    ase = load("/home/max/texture.ase")
+    # Sebességmérés: az új és a soronkénti olvasó összehasonlítása a mellékelt
+    # modelleken. Futtatás a projekt gyökeréből:
+    #   python -m ilo.filereader.model.ase [fájl.ase ...]
+    import sys
+    import glob
+    from timeit import default_timer as clock
+
+    def bench(loader, fileName, repeat=3):
+        best = None
+        for i in xrange(repeat):
+            t = clock()
+            geoms = loader(fileName)
+            t = clock() - t
+            best = t if best == None else min(best, t)
+        return best, geoms
+
+    files = sys.argv[1:] or sorted(glob.glob("data/model/*.ase"))
+    print "%-28s %10s %10s %8s" % ("file", "line [ms]", "new [ms]", "speedup")
+    for fileName in files:
+        oldTime, oldGeoms = bench(loadASEFileByLine, fileName)
+        newTime, newGeoms = bench(loadASEFile, fileName)
+
+        for old, new in zip(oldGeoms, newGeoms):
+            assert old.name == new.name
+            for attr in ("vertex", "face", "vertexUV", "faceUV", "vertexNormal", "faceNormal"):
+                a, b = getattr(old, attr), getattr(new, attr)
+                assert (a is None) == (b is None), (fileName, attr)
+                if a is not None:
+                    assert numpy.array_equal(a, b), (fileName, attr)
+
+        print "%-28s %10.2f %10.2f %7.1fx" % (os.path.basename(fileName),
+                                                oldTime * 1000.0,
+                                                newTime * 1000.0,
+                                                oldTime / newTime)
+
+    # Egyetlen objektum beolvasása az index alapján
+    for fileName in files:
+        objects = indexASEFile(fileName)
+        if len(objects) < 2:
+            continue
+        name = objects[-1][0]
+        allTime, allGeoms = bench(loadASEFile, fileName)
+        oneTime, oneGeoms = bench(lambda f: loadASEFile(f, [name]), fileName)
+        assert [g.name for g in oneGeoms] == [name]
+        assert numpy.array_equal(oneGeoms[0].vertex, allGeoms[-1].vertex)
+        print "%-28s %10.2f %10.2f  (%s of %d objects)" % (os.path.basename(fileName),
+                                                          allTime * 1000.0,
+                                                          oneTime * 1000.0,
+                                                          name, len(objects))
@@ -0,0 +1,268 @@
+# -*- coding: utf -*-
+
+__author__="Vadasz Laszlo"
+__date__ = "2010.04.12. 18:05:41"
+
+import os
+import os.path
+import json
+import hashlib
+import numpy
+
+from ilo.messages.exceptios import IloError
+from ilo.structs.modelfile import ModelFile
+
+"""
+Előfeldolgozott geometriák lemezes gyorsítótára
+
+Minden forrásfájlhoz egy könyvtár tartozik a gyorsítótárban, benne a
+geometriák tömbjei külön C{.npy} fájlokban és egy C{meta.json} leíró, mely a
+forrásfájl méretét, módosítási idejét és SHA1 lenyomatát tárolja.
+A tömböket C{numpy.load(mmap_mode='r')}-rel töltjük vissza, így a meleg
+indításkor nincs szövegfeldolgozás.
+"""
+
+__cache_version__ = 2
+
+__cache_arrays__  = ("vertex", "vertexNormal", "vertexUV", "vertexColor",
+                     "face", "faceNormal", "faceUV", "faceColor", "faceSmoothing",
+                     "lodFace", "lodFaceUV", "lodOrigin", "lodCount")
+
+
+def _fileHash(fileName):
+    """
+    A fájl tartalmának SHA1 lenyomata
+
+    @param  fileName:   A fájl neve és elérési útvonala
+    @type   fileName:   C{string}
+
+    @return:            Hexadecimális lenyomat
+    @rtype:             C{string}
+    """
+    sha = hashlib.sha1()
+    file_in = open(fileName, "rb")
+    try:
+        for chunk in iter(lambda: file_in.read(1 << 16), ""):
+            sha.update(chunk)
+    finally:
+        file_in.close()
+    return sha.hexdigest()
+
+
+def _cachePath(cacheDir, fileName, format):
+    """
+    A forrásfájlhoz tartozó gyorsítótár könyvtár
+
+    @return:    A könyvtár elérési útvonala
+    @rtype:     C{string}
+    """
+    key = hashlib.sha1("%s|%s" % (os.path.abspath(fileName), format)).hexdigest()
+    return os.path.join(cacheDir, key)
+
+
+def _readMeta(path):
+    """
+    A gyorsítótár leíró beolvasása
+
+    @return:    A leíró, vagy C{None} ha nem létezik, sérült vagy elavult
+    @rtype:     C{dict}
+    """
+    try:
+        file_in = open(os.path.join(path, "meta.json"), "r")
+        try:
+            meta = json.load(file_in)
+        finally:
+            file_in.close()
+    except (IOError, ValueError):
+        return None
+    if meta.get("version") != __cache_version__:
+        return None
+    return meta
+
+
+def _writeMeta(path, meta):
+    """
+    A gyorsítótár leíró kiírása
+    """
+    file_out = open(os.path.join(path, "meta.json"), "w")
+    try:
+        json.dump(meta, file_out)
+    finally:
+        file_out.close()
+
+
+def _isValid(meta, fileName, stat, path):
+    """
+    Érvényes-e a gyorsítótárazott változat?
+
+    Egyező méret és módosítási idő esetén nem olvassuk be a forrást, eltérő
+    módosítási időnél a tartalom lenyomata dönt (pl. verziókezelőből frissen
+    kivett, de nem változott fájl).
+
+    @return:    C{True} ha a gyorsítótár használható
+    @rtype:     C{bool}
+    """
+    if meta == None or meta["size"] != stat.st_size:
+        return False
+    if meta["mtime"] == stat.st_mtime:
+        return True
+    if meta["sha1"] == _fileHash(fileName):
+        meta["mtime"] = stat.st_mtime
+        _writeMeta(path, meta)
+        return True
+    return False
+
+
+def _bounds(vertex):
+    """
+    A csúcspontok befoglaló dobozának (min, max) sarokpontjai
+
+    @return:    C{(2, 3)} méretű tömb
+    @rtype:     C{numpy.ndarray}
+    """
+    if vertex is None or len(vertex) == 0:
+        return numpy.zeros((2, 3), dtype=numpy.float32)
+    return numpy.array([vertex.min(0), vertex.max(0)], dtype=numpy.float32)
+
+
+def _store(path, fileName, stat, geoms):
+    """
+    A beolvasott geometriák kiírása a gyorsítótárba
+
+    A leírót írjuk ki utoljára, így a félbeszakadt írás nem hagy maga után
+    érvényesnek tűnő bejegyzést.
+
+    @return:    A kiírt leíró
+    @rtype:     C{dict}
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    elif os.path.exists(os.path.join(path, "meta.json")):
+        os.remove(os.path.join(path, "meta.json"))
+
+    meta = {"version" : __cache_version__,
+            "size"    : stat.st_size,
+            "mtime"   : stat.st_mtime,
+            "sha1"    : _fileHash(fileName),
+            "geoms"   : []}
+
+    for i, geom in enumerate(geoms):
+        arrays = []
+        geom.bounds = _bounds(geom.vertex)
+        for attr in __cache_arrays__ + ("bounds",):
+            value = getattr(geom, attr)
+            if value is not None and len(value) > 0:
+                numpy.save(os.path.join(path, "%d_%s.npy" % (i, attr)),
+                           numpy.ascontiguousarray(value))
+                arrays.append(attr)
+        meta["geoms"].append({"name": geom.name, "arrays": arrays})
+
+    _writeMeta(path, meta)
+    return meta
+
+
+def _restore(path, meta, geomIDs=None):
+    """
+    A geometriák visszatöltése a gyorsítótárból, memóriába leképezett
+    (csak olvasható) tömbökként
+
+    @param  geomIDs:    A visszatöltendő geometriák azonosítói, C{None}
+                        esetén mind
+    @type   geomIDs:    C{list}
+
+    @return:            A geometriák listája
+    @rtype:             C{list}
+    """
+    geoms = []
+    for i, item in enumerate(meta["geoms"]):
+        if geomIDs != None and item["name"] not in geomIDs:
+            continue
+        geom = ModelFile()
+        geom.name = item["name"]
+        for attr in item["arrays"]:
+            setattr(geom, attr, numpy.load(os.path.join(path, "%d_%s.npy" % (i, attr)),
+                                           mmap_mode="r"))
+        geoms.append(geom)
+    return geoms
+
+
+def isCached(fileName, format, cacheDir):
+    """
+    Van-e érvényes gyorsítótár bejegyzés a forrásfájlhoz?
+
+    @param  fileName:   A geometria fájl neve és elérési útvonala
+    @type   fileName:   C{string}
+    @param  format:     A geometria fájl formátuma (a kulcs része)
+    @type   format:     C{string}
+    @param  cacheDir:   A gyorsítótár könyvtára
+    @type   cacheDir:   C{string}
+
+    @return:            C{True} ha a betöltés a gyorsítótárból történne
+    @rtype:             C{bool}
+    """
+    if not cacheDir:
+        return False
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        return False
+    path = _cachePath(cacheDir, fileName, format)
+    return _isValid(_readMeta(path), fileName, stat, path)
+
+
+def loadCachedModel(fileName, format, loader, cacheDir, geomIDs=None):
+    """
+    Geometria fájl betöltése a gyorsítótáron keresztül
+
+    Érvényes gyorsítótár bejegyzés esetén a forrásfájlt nem dolgozzuk fel,
+    különben a C{loader} eredményét eltároljuk a következő indításhoz.
+    Ha csak néhány geometriát kérünk (C{geomIDs}), és nincs érvényes
+    bejegyzés, akkor is a teljes fájlt dolgozzuk fel és tároljuk el, majd
+    a kért geometriákat a gyorsítótárból adjuk vissza, így a következő
+    (akár más geometriákat kérő) betöltés már találatot ad.
+
+    @param  fileName:   A geometria fájl neve és elérési útvonala
+    @type   fileName:   C{string}
+    @param  format:     A geometria fájl formátuma (a kulcs része)
+    @type   format:     C{string}
+    @param  loader:     A fájlt feldolgozó függvény, C{(fileName, geomIDs)}
+                        paraméterekkel hívjuk, C{ModelFile} listát ad
+    @type   loader:     C{function}
+    @param  cacheDir:   A gyorsítótár könyvtára, C{None} esetén nincs
+                        gyorsítótárazás
+    @type   cacheDir:   C{string}
+    @param  geomIDs:    A betöltendő geometriák azonosítói, C{None} esetén
+                        mind
+    @type   geomIDs:    C{list}
+
+    @return:            A fájlban található (kért) geometriák listája
+    @rtype:             C{list}
+    """
+    if not cacheDir:
+        return loader(fileName, geomIDs)
+
+    try:
+        stat = os.stat(fileName)
+    except OSError:
+        raise IloError("A fajl nem talalhato: %s" % fileName)
+
+    path = _cachePath(cacheDir, fileName, format)
+    meta = _readMeta(path)
+    if _isValid(meta, fileName, stat, path):
+        try:
+            return _restore(path, meta, geomIDs)
+        except (IOError, ValueError) as err:
+            print "Serult gyorsitotar (%s): %s" % (fileName, err)
+
+    geoms = loader(fileName)
+    try:
+        meta = _store(path, fileName, stat, geoms)
+    except (IOError, OSError) as err:
+        print "Gyorsitotar irasi hiba (%s): %s" % (fileName, err)
+        meta = None
+
+    if geomIDs == None:
+        return geoms
+    if meta != None:
+        return _restore(path, meta, geomIDs)
+    return [geom for geom in geoms if geom.name in geomIDs]
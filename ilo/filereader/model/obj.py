@@ -4,48 +4,309 @@ __author__="Vadasz Laszlo"
 __date__ = "2009.07.20. 23:19:11"
 
 import os.path
+import numpy
 
-class ObjReader:
-    def __init__ (self, fileName):
-        self.__normalt = False
-        self.__texture = False
-        if os.path.exists(fileName) and os.path.isfile(fileName):
-            self.fileName = fileName
-
-    def load (self):
-        if self.fileName:
-            try:
-                file_in = open(self.fileName, "r", 0)
-                self.vertex = ()
-                self.face = ()
-                try:
-                    for line in file_in:
-                        if len(line) > 1:
-                            print len(line)
-                            line = line.strip()
-                            if   line[0] == "#":                                #comment
-                                pass
-                            elif line[0] == "v":                                #vertex
-                                if   line[1] == "n":                            #normal
-                                    self.__normal = True
-                                elif line[1] == "t":                            #texture
-                                    self.__texture = True
-                                else:
-                                    data = line.split(" ")[1:4]                 # split x,y,z coords
-                                    data = tuple([float(x) for x in data])      # convert to float
-                                    self.vertex += (data, )
-                            elif line[0] == "f":                                #face
-                                data = line.split(" ")[1:4]
-                                data = tuple([tuple([int(x) for x in v.split("/")]) for v in data])
-                                self.face += data
-                finally:
-                    file_in.close()
-            except IOError:
-                pass
+from ilo.messages.exceptios import IloError
+from ilo.structs.modelfile import ModelFile
+
+"""
+Wavefront OBJ fájlok beolvasása
+
+A fájlt egyben olvassuk be és egyetlen menetben soronként a típusjelölő
+(C{v}, C{vt}, C{vn}, C{f}, C{o}) szerint szétválogatjuk, majd az azonos
+típusú sorokat egyetlen C{numpy.fromstring} hívással alakítjuk tömbbé.
+A sokszögeket legyezőszerűen háromszögekre bontjuk, a fájl minden C{o}
+objektumából egy C{ModelFile} készül, saját, tömörített csúcspont listákkal.
+"""
+
+__obj_records__ = ("v", "vt", "vn", "f", "o")
+
+
+def _splitRecords(data):
+    """
+    A sorok szétválogatása típusjelölő szerint
+
+    A sorvégi C{#} megjegyzéseket elhagyjuk, így azok nem változtatják meg
+    a sorok oszlopainak számát.
+
+    @param  data:   Az OBJ fájl tartalma
+    @type   data:   C{string}
+
+    @return:        Típusonként a sorok tartalma (a jelölő nélkül) és a
+                    sorszámaik
+    @rtype:         C{tuple}
+    """
+    lines   = dict((key, []) for key in __obj_records__)
+    numbers = dict((key, []) for key in __obj_records__)
+    for number, line in enumerate(data.splitlines()):
+        if "#" in line:
+            line = line[:line.index("#")]
+        parts = line.split(None, 1)
+        if len(parts) == 2 and parts[0] in lines:
+            lines[parts[0]].append(parts[1].rstrip())
+            numbers[parts[0]].append(number)
+    for key in __obj_records__:
+        numbers[key] = numpy.array(numbers[key], dtype=numpy.int64)
+    return lines, numbers
+
+
+def _parseColumns(lines, columns, name):
+    """
+    Számsorok tömbbé alakítása, soronként legalább C{columns} értékkel
+
+    A fölös oszlopokat (pl. a C{w} koordinátát vagy a csúcsponthoz fűzött
+    színt) elhagyjuk. Az azonos számú értéket tartalmazó sorokat együtt
+    alakítjuk át, így a sorok hossza fájlon belül is eltérhet.
+
+    @return:    C{(len(lines), columns)} méretű tömb
+    @rtype:     C{numpy.ndarray}
+    """
+    if not lines:
+        return numpy.zeros((0, columns), dtype=numpy.float32)
+    width = numpy.array([len(line.split()) for line in lines], dtype=numpy.int32)
+    if width.min() < columns:
+        raise IloError("OBJ fajl hiba: hianyos %s sor" % name)
+
+    result = numpy.empty((len(lines), columns), dtype=numpy.float32)
+    for count in numpy.unique(width).tolist():
+        group = numpy.flatnonzero(width == count)
+        text  = " ".join(lines) if len(group) == len(lines) else \
+                " ".join([lines[i] for i in group])
+        values = numpy.fromstring(text, dtype=numpy.float32, sep=" ")
+        if len(values) != len(group) * count:
+            raise IloError("OBJ fajl hiba: hibas %s sor" % name)
+        result[group] = values.reshape(-1, count)[:, :columns]
+    return result
+
+
+def _resolve(index, defined, total, name):
+    """
+    OBJ indexek (1-től induló, illetve negatív, relatív) átalakítása
+    0-tól induló indexekké
+
+    @param  index:      A fájlban szereplő indexek
+    @type   index:      C{numpy.ndarray}
+    @param  defined:    Indexenként a sor előtt már megadott elemek száma
+    @type   defined:    C{numpy.ndarray}
+    @param  total:      Az elemek teljes száma
+    @type   total:      C{int}
+
+    @rtype:             C{numpy.ndarray}
+    """
+    index = numpy.where(index < 0, defined + index, index - 1)
+    if len(index) and (index.min() < 0 or index.max() >= total):
+        raise IloError("OBJ fajl hiba: hibas %s index" % name)
+    return index.astype(numpy.int32)
+
+
+def _parseFaces(lines):
+    """
+    A lapok csúcsainak C{v}, C{v/vt}, C{v//vn} vagy C{v/vt/vn} alakú
+    indexei
+
+    A csúcsok alakja lapról lapra változhat: a lapokat a csúcsonkénti
+    indexek száma szerint csoportosítjuk, és csoportonként alakítjuk át.
+
+    @return:    Soronként a csúcsok száma, és csúcsonként a három index
+                (a hiányzó index 0)
+    @rtype:     C{tuple}
+    """
+    if len(lines) == 0:
+        return numpy.zeros(0, dtype=numpy.int32), numpy.zeros((0, 3), dtype=numpy.int64)
+
+    text    = [line.replace("//", "/0/") for line in lines]
+    corners = numpy.array([len(line.split()) for line in text], dtype=numpy.int32)
+    slashes = numpy.array([line.count("/") for line in text], dtype=numpy.int64)
+    width   = slashes // numpy.maximum(corners, 1) + 1
+    if ((width - 1) * corners != slashes).any() or width.max() > 3:
+        raise IloError("OBJ fajl hiba: vegyes vagy hibas lap formatum")
+
+    index = numpy.zeros((corners.sum(), 3), dtype=numpy.int64)
+    cornerWidth = numpy.repeat(width, corners)
+    for count in numpy.unique(width).tolist():
+        group = numpy.flatnonzero(width == count)
+        values = numpy.fromstring(" ".join([text[i] for i in group]).replace("/", " "),
+                                  dtype=numpy.int64, sep=" ")
+        mask = cornerWidth == count
+        if len(values) != mask.sum() * count:
+            raise IloError("OBJ fajl hiba: hibas lap formatum")
+        index[mask, :count] = values.reshape(-1, count)
+    return corners, index
+
+
+def _triangulate(corners):
+    """
+    Sokszögek legyezőszerű háromszögekre bontása
+
+    @param  corners:    Sokszögenként a csúcsok száma
+    @type   corners:    C{numpy.ndarray}
+
+    @return:            Háromszögenként a három sarok indexe a sokszögek
+                        összefűzött csúcslistájában, és a sokszög indexe
+    @rtype:             C{tuple}
+    """
+    if len(corners) and corners.min() < 3:
+        raise IloError("OBJ fajl hiba: haromnal kevesebb csucsu lap")
+    triangles = corners - 2
+    start   = numpy.cumsum(corners) - corners
+    polygon = numpy.repeat(numpy.arange(len(corners)), triangles)
+    step    = numpy.arange(triangles.sum()) - numpy.repeat(numpy.cumsum(triangles) - triangles,
+                                                           triangles) + 1
+    base    = start[polygon]
+    return numpy.column_stack((base, base + step, base + step + 1)), polygon
+
+
+def _compact(index):
+    """
+    A ténylegesen használt elemek kiválasztása és az indexek átszámozása
+
+    @return:    A használt elemek (eredeti) indexei és az új indexek
+    @rtype:     C{tuple}
+    """
+    used, inverse = numpy.unique(index, return_inverse=True)
+    return used, inverse.reshape(index.shape).astype(numpy.int32)
+
+
+def _faceNormals(vertex, face):
+    """
+    Egységnyi hosszú lapnormálisok
+
+    @return:    Laponként a normálvektor és a lap területének kétszerese
+    @rtype:     C{tuple}
+    """
+    tri    = vertex[face]
+    normal = numpy.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = numpy.sqrt((normal * normal).sum(1))
+    return normal / numpy.where(length > 0, length, 1.0)[:, None], length
+
+
+def _vertexNormals(numVertex, face, faceNormal, faceArea):
+    """
+    Csúcsnormálisok a szomszédos lapok területtel súlyozott normálisaiból
+
+    @rtype:     C{numpy.ndarray}
+    """
+    weighted = faceNormal * faceArea[:, None]
+    corner   = face.ravel()
+    normals  = numpy.column_stack([numpy.bincount(corner, numpy.repeat(weighted[:, axis], 3),
+                                                  numVertex) for axis in xrange(3)])
+    length = numpy.sqrt((normals * normals).sum(1))
+    return (normals / numpy.where(length > 0, length, 1.0)[:, None]).astype(numpy.float32)
+
+
+def _buildGeometry(name, corner, position, uv, normal):
+    """
+    Egy objektum háromszögeinek C{ModelFile}-lá alakítása
+
+    @param  corner:     Háromszögenként a sarkok C{(v, vt, vn)} indexei,
+                        C{(n, 3, 3)} méretű tömb, a hiányzó index -1
+    @type   corner:     C{numpy.ndarray}
+
+    @rtype:             C{ModelFile}
+    """
+    geometry = ModelFile()
+    geometry.name = name
+
+    used, face = _compact(corner[:, :, 0])
+    geometry.vertex = position[used]
+    geometry.face = face
+
+    faceNormal, faceArea = _faceNormals(geometry.vertex.astype(numpy.float64), face)
+    geometry.faceNormal = faceNormal.astype(numpy.float32)
+
+    if len(uv) and (corner[:, :, 1] >= 0).all():
+        used, faceUV = _compact(corner[:, :, 1])
+        geometry.vertexUV = uv[used]
+        geometry.faceUV = faceUV
+
+    if len(normal) and (corner[:, :, 2] >= 0).all():
+        # egy csúcshoz több normálvektor is tartozhat, mindig az utolsó marad
+        normals = numpy.zeros((len(geometry.vertex), 3), dtype=numpy.float32)
+        normals[face.ravel()] = normal[corner[:, :, 2].ravel()]
+        geometry.vertexNormal = normals
+    else:
+        geometry.vertexNormal = _vertexNormals(len(geometry.vertex), face, faceNormal, faceArea)
+
+    return geometry
+
+
+def loadOBJFile(fileName, geomIDs=None):
+    """
+    Wavefront OBJ fájl feldolgozás
+
+    A fájl C{o} objektumaiból egy-egy C{ModelFile} készül, az első C{o} sor
+    előtti lapok a fájl nevét kapják. Hiányzó C{vn} adatok esetén a
+    csúcsnormálisokat a lapokból számoljuk.
+
+    @param  fileName:   Az OBJ fájl neve és elérési útvonala
+    @type   fileName:   C{string}
+    @param  geomIDs:    A feldolgozandó objektumok azonosítói, C{None} esetén
+                        mindet feldolgozza
+    @type   geomIDs:    C{list}
+
+    @return:            A fájlban található (kért) geometriák listája
+    @rtype:             C{list}
+    """
+    if not (os.path.exists(fileName) and os.path.isfile(fileName)):
+        raise IloError("OBJ fajl megnyitasi hiba %s" % fileName)
+
+    try:
+        file_in = open(fileName, "r")
+        try:
+            data = file_in.read()
+        finally:
+            file_in.close()
+    except IOError as e:
+        raise IloError("OBJ fajl (%s) olvasasi hiba: %s" % (fileName, e))
+
+    lines, numbers = _splitRecords(data)
+    position = _parseColumns(lines["v"], 3, "v")
+    uv       = _parseColumns(lines["vt"], 2, "vt")
+    normal   = _parseColumns(lines["vn"], 3, "vn")
+    corners, index = _parseFaces(lines["f"])
+    objects  = lines["o"]
+
+    # a relatív indexek a lap sora előtt megadott elemekre hivatkoznak
+    for column, key, items in ((0, "v", position), (1, "vt", uv), (2, "vn", normal)):
+        values  = index[:, column]
+        present = values != 0 if column else numpy.ones(len(values), dtype=bool)
+        defined = len(items)
+        if (values < 0).any():
+            defined = numpy.searchsorted(numbers[key],
+                                         numpy.repeat(numbers["f"], corners)[present])
+        index[present, column] = _resolve(values[present], defined, len(items), key)
+        index[~present, column] = -1
+
+    triangle, polygon = _triangulate(corners)
+    corner = index[triangle]
+    owner = numpy.zeros(len(polygon), dtype=numpy.int64) - 1
+    if objects:
+        owner = numpy.searchsorted(numbers["o"], numbers["f"], side="right")[polygon] - 1
+
+    defaultName = os.path.splitext(os.path.basename(fileName))[0]
+    names = [defaultName] + [name.strip() for name in objects]
+
+    geometris = []
+    for obj in numpy.unique(owner):
+        if geomIDs != None and names[obj + 1] not in geomIDs:
+            continue
+        geometris.append(_buildGeometry(names[obj + 1], corner[owner == obj],
+                                        position, uv, normal))
+
+    print "File is loaded %s" % (fileName)
+    return geometris
 
 
 if __name__ == "__main__":
-    obj = ObjReader("../resources/test/box.obj")
-    obj.load()
-    print obj.vertex
-    print obj.face
+    # Futtatás a projekt gyökeréből:
+    #   python -m ilo.filereader.model.obj fájl.obj
+    import sys
+    from timeit import default_timer as clock
+
+    for fileName in sys.argv[1:]:
+        t = clock()
+        geoms = loadOBJFile(fileName)
+        t = clock() - t
+        for geom in geoms:
+            print "%-20s %8d vertex %8d face" % (geom.name, geom.numOfVertex, geom.numOfFace)
+        print "%s: %.3f ms" % (fileName, t * 1000.0)
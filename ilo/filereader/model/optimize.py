@@ -0,0 +1,244 @@
+# -*- coding: utf -*-
+
+__author__="Vadasz Laszlo"
+__date__ = "2010.04.20. 21:37:02"
+
+import numpy
+
+from ilo.structs.simplify import simplifyLevels
+
+"""
+Geometriák előkészítése a GPU csúcspont gyorsítótárához
+
+A háromszögek sorrendjét Tipsify módszerrel (Sander, Nehab, Barczak:
+I{Fast Triangle Reordering for Vertex Locality and Reduced Overdraw}, 2007)
+rendezzük át, majd a csúcsokat az első felhasználásuk sorrendjében
+számozzuk újra, így a csúcsok beolvasása is közel sorfolytonos. A
+feldolgozás a fájl betöltésekor, a gyorsítótárba írás előtt fut, a
+hatásosságát az ACMR (háromszögenkénti átlagos gyorsítótár hiány) mutatja.
+"""
+
+
+def acmr(face, cacheSize=32):
+    """
+    Az átlagos gyorsítótár hiány (ACMR) egy FIFO csúcspont gyorsítótárra
+
+    @param  face:       A háromszögek csúcsindexeinek C{(m, 3)} tömbje
+    @type   face:       C{numpy.ndarray}
+    @param  cacheSize:  A gyorsítótár mérete
+    @type   cacheSize:  C{int}
+
+    @return:            A háromszögenkénti hiányok átlaga (0.5 és 3 között)
+    @rtype:             C{float}
+    """
+    if len(face) == 0:
+        return 0.0
+    corner = numpy.asarray(face).ravel().tolist()
+    stamp  = [-cacheSize - 1] * (max(corner) + 1)
+    time   = 0
+    for v in corner:
+        if time - stamp[v] > cacheSize:
+            stamp[v] = time
+            time += 1
+    return float(time) / len(face)
+
+
+def tipsify(face, numVertex=None, cacheSize=32):
+    """
+    A háromszögek gyorsítótár barát sorrendje (Tipsify)
+
+    A háromszögeket csúcspontok körüli legyezőkben bocsátjuk ki. A
+    következő legyező csúcsa az éppen kibocsátott háromszögek csúcsai közül
+    az, amelyik a gyorsítótárban a legrégebben van, de a maradék
+    háromszögei kibocsátása után is benne marad; ha nincs ilyen, a
+    zsákutca veremből, végül csúcsindex szerint választunk.
+
+    @param  face:       A háromszögek csúcsindexeinek C{(m, 3)} tömbje
+    @type   face:       C{numpy.ndarray}
+    @param  numVertex:  A csúcspontok száma, C{None} esetén a lapokból
+    @type   numVertex:  C{int}
+    @param  cacheSize:  A gyorsítótár mérete
+    @type   cacheSize:  C{int}
+
+    @return:            A háromszögek új sorrendje (indexek)
+    @rtype:             C{numpy.ndarray}
+    """
+    face = numpy.asarray(face, dtype=numpy.int64).reshape(-1, 3)
+    if len(face) == 0:
+        return numpy.zeros(0, dtype=numpy.int64)
+    if numVertex == None:
+        numVertex = int(face.max()) + 1
+
+    # csúcsonként a hozzá tartozó háromszögek (CSR)
+    corner   = face.ravel()
+    valence  = numpy.bincount(corner, minlength=numVertex)
+    offset   = numpy.concatenate(([0], numpy.cumsum(valence))).tolist()
+    adjacent = (numpy.argsort(corner, kind="mergesort") // 3).tolist()
+
+    faces   = face.tolist()
+    live    = valence.tolist()
+    stamp   = [-cacheSize - 1] * numVertex
+    emitted = [False] * len(faces)
+    deadEnd = []
+    output  = []
+    time    = 0
+    cursor  = 0
+    fan     = int(corner[0])
+
+    while fan >= 0:
+        candidates = []
+        for tri in adjacent[offset[fan]:offset[fan + 1]]:
+            if emitted[tri]:
+                continue
+            for v in faces[tri]:
+                deadEnd.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamp[v] > cacheSize:
+                    stamp[v] = time
+                    time += 1
+            emitted[tri] = True
+            output.append(tri)
+
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - stamp[v] + 2 * live[v] <= cacheSize:
+                    priority = time - stamp[v]
+                if priority > best:
+                    best = priority
+                    fan = v
+
+        if fan < 0:
+            while deadEnd:
+                v = deadEnd.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+        if fan < 0:
+            while cursor < numVertex:
+                if live[cursor] > 0:
+                    fan = cursor
+                    break
+                cursor += 1
+
+    return numpy.array(output, dtype=numpy.int64)
+
+
+def _firstUse(index, count):
+    """
+    Az elemek új sorszáma az első felhasználásuk sorrendjében, a fel nem
+    használt elemek a végére kerülnek
+
+    @param  index:  A lapok indexei az új lapsorrendben
+    @type   index:  C{numpy.ndarray}
+    @param  count:  Az elemek száma
+    @type   count:  C{int}
+
+    @return:        Az elemek új sorrendje (régi indexek) és a régi
+                    indexből az újba képező tömb
+    @rtype:         C{tuple}
+    """
+    used, first = numpy.unique(index.ravel(), return_index=True)
+    unused = numpy.setdiff1d(numpy.arange(count), used)
+    order  = numpy.concatenate((used[numpy.argsort(first)], unused))
+    remap  = numpy.empty(count, dtype=numpy.int32)
+    remap[order] = numpy.arange(count, dtype=numpy.int32)
+    return order, remap
+
+
+def optimizeVertexCache(geom, cacheSize=32):
+    """
+    A geometria háromszögeinek és csúcsainak átrendezése a csúcspont
+    gyorsítótárhoz
+
+    A laponkénti tömbök (lap, lapnormális, textúra és szín lap, simítási
+    csoport) a Tipsify sorrendet kapják, a csúcs, textúra és szín tömbök az
+    első felhasználásuk sorrendjét.
+
+    @param  geom:       Az átrendezendő geometria
+    @type   geom:       C{ModelFile}
+    @param  cacheSize:  A gyorsítótár mérete
+    @type   cacheSize:  C{int}
+
+    @return:            Az ACMR értéke az átrendezés előtt és után
+    @rtype:             C{tuple}
+    """
+    face = numpy.asarray(geom.face)
+    if len(face) == 0:
+        return 0.0, 0.0
+    numVertex = len(geom.vertex)
+    before = acmr(face, cacheSize)
+
+    order = tipsify(face, numVertex, cacheSize)
+    for attr in ("face", "faceNormal", "faceUV", "faceColor", "faceSmoothing"):
+        value = getattr(geom, attr)
+        if value is not None and len(value) == len(order):
+            setattr(geom, attr, numpy.asarray(value)[order])
+
+    for faceAttr, vertexAttrs in (("face", ("vertex", "vertexNormal")),
+                                  ("faceUV", ("vertexUV",)),
+                                  ("faceColor", ("vertexColor",))):
+        index = getattr(geom, faceAttr)
+        if index is None or len(index) == 0:
+            continue
+        items = getattr(geom, vertexAttrs[0])
+        vertexOrder, remap = _firstUse(numpy.asarray(index), len(items))
+        setattr(geom, faceAttr, remap[numpy.asarray(index)])
+        for attr in vertexAttrs:
+            value = getattr(geom, attr)
+            if value is not None and len(value) == len(vertexOrder):
+                setattr(geom, attr, numpy.asarray(value)[vertexOrder])
+
+    return before, acmr(geom.face, cacheSize)
+
+
+def buildLevels(geom, numLevels, minFaces):
+    """
+    A részletességi szintek előkészítése a geometriában
+
+    Az egyszerűsítés a betöltéskor, az átrendezés után fut, a szintek a
+    geometriával együtt a lemezes gyorsítótárba kerülnek, így a C{Mesh}
+    létrehozásakor nem kell újra számolni őket.
+
+    @param  geom:       A geometria
+    @type   geom:       C{ModelFile}
+    @param  numLevels:  A szintek száma az eredeti hálóval együtt
+    @type   numLevels:  C{int}
+    @param  minFaces:   Ennél kevesebb lapú hálót nem egyszerűsítünk
+    @type   minFaces:   C{int}
+
+    @return:            Az egyszerűsített szintek száma
+    @rtype:             C{int}
+    """
+    if geom.face is None:
+        return 0
+    faceUV = geom.faceUV if geom.hasVertexUV else None
+    levels = simplifyLevels(numpy.asarray(geom.vertex, numpy.float64), numpy.asarray(geom.face),
+                            faceUV, numLevels, minFaces)
+    geom.lodCount = numpy.array([len(face) for face, faceUV, origin in levels], numpy.int32)
+    if levels:
+        geom.lodFace   = numpy.concatenate([face for face, faceUV, origin in levels])
+        geom.lodOrigin = numpy.concatenate([origin for face, faceUV, origin in levels])
+        if faceUV is not None:
+            geom.lodFaceUV = numpy.concatenate([faceUV for face, faceUV, origin in levels])
+    return len(levels)
+
+
+if __name__ == "__main__":
+    # Futtatás a projekt gyökeréből:
+    #   python -m ilo.filereader.model.optimize data/model/map.ase
+    import sys
+    from timeit import default_timer as clock
+    from ilo.filereader.model.ase import loadASEFile
+    from ilo.filereader.model.obj import loadOBJFile
+
+    for fileName in sys.argv[1:]:
+        loader = loadOBJFile if fileName.lower().endswith(".obj") else loadASEFile
+        for geom in loader(fileName):
+            t = clock()
+            before, after = optimizeVertexCache(geom)
+            print "%-20s %8d face %.3f ms ACMR %.3f -> %.3f" % \
+                  (geom.name, geom.numOfFace, (clock() - t) * 1000.0, before, after)
@@ -4,17 +4,160 @@ __author__="Vadasz Laszlo"
 __date__ ="2009.10.25. 15:56:30"
 
 import os.path
+import mmap
+import ctypes
+import numpy
 
 from struct import *
+from OpenGL.GL import *
 
-from ilo.tools.strtool import fullstrip
 from ilo.messages.exceptios import IloError
-from ilo.structs.modelfile import ModelFile
-from numpy import array as Vector
-from numpy import matrix as Matrix
+from ilo.config import Config
+from ilo.system.gfx import GLContext
 
 from ilo.tools.ooptools import *
 
+"""
+Quake 3 BSP (IBSP v46) pályafájlok beolvasása
+
+A fájlt memóriába képezzük le (C{mmap}), és minden adatblokkot (I{lump})
+egy C{numpy} strukturált tömbként teszünk elérhetővé a C{numpy.frombuffer}
+segítségével, így rekordonként nem keletkezik Python objektum.
+
+Leképezéskor a nézőpontot tartalmazó levél clusteréből a visdata (PVS) alapján
+csak a potenciálisan látható clusterek leveleinek lapjait rajzoljuk ki.
+"""
+
+
+def _expandRanges(first, count):
+    """
+    C{(kezdet, darab)} párokkal megadott index tartományok kifejtése
+
+    @param  first:  A tartományok első indexei
+    @type   first:  C{numpy.ndarray}
+    @param  count:  A tartományok hossza
+    @type   count:  C{numpy.ndarray}
+
+    @return:        A tartományok összefűzött indexei
+    @rtype:         C{numpy.ndarray}
+    """
+    count = numpy.asarray(count, dtype=numpy.int32)
+    total = int(count.sum())
+    if total == 0:
+        return numpy.zeros(0, dtype=numpy.int32)
+    starts = numpy.asarray(first, dtype=numpy.int32) - (numpy.cumsum(count) - count)
+    return (numpy.repeat(starts, count) + numpy.arange(total)).astype(numpy.int32)
+
+
+def _packLightmaps(lightmaps, maxSize):
+    """
+    Lightmapek elhelyezése négyzet alakú atlaszokban
+
+    Az atlaszok oldalhossza kettő hatvány: egy atlaszba legfeljebb
+    C{(maxSize / 128)^2} lightmap kerül, az utolsó atlasz a maradékhoz
+    igazodó, kisebb méretű.
+
+    @param  lightmaps:  A lightmapek C{(n, 128, 128, 3)} méretű tömbje
+    @type   lightmaps:  C{numpy.ndarray}
+    @param  maxSize:    Az atlasz legnagyobb oldalhossza képpontban
+    @type   maxSize:    C{int}
+
+    @return:            Az atlaszok képeinek listája, valamint lightmapenként
+                        az atlasz indexe, a csempe oszlopa és sora, és az
+                        atlasz oldalhossza csempében
+    @rtype:             C{tuple}
+    """
+    tile    = Q3BSP.LIGHTMAP_SIZE
+    perSide = max(maxSize // tile, 1)
+    count   = len(lightmaps)
+
+    atlas   = numpy.arange(count) // (perSide * perSide)
+    slot    = numpy.arange(count) % (perSide * perSide)
+    side    = numpy.empty(count, dtype=numpy.int32)
+
+    images = []
+    for first in xrange(0, count, perSide * perSide):
+        group = lightmaps[first:first + perSide * perSide]
+        n = 1
+        while n * n < len(group):
+            n *= 2
+        tiles = numpy.zeros((n * n, tile, tile, 3), dtype=numpy.uint8)
+        tiles[:len(group)] = group
+        images.append(tiles.reshape(n, n, tile, tile, 3).transpose(0, 2, 1, 3, 4)
+                           .reshape(n * tile, n * tile, 3))
+        side[first:first + len(group)] = n
+
+    return images, atlas, slot % side, slot // side, side
+
+
+def _mergeRanges(first, count, group):
+    """
+    Egymás után következő index tartományok összevonása
+
+    Két tartomány akkor vonható össze, ha a második pontosan az első után
+    kezdődik és azonos csoportba tartoznak.
+
+    @param  first:  A tartományok kezdetei, növekvő sorrendben
+    @type   first:  C{numpy.ndarray}
+    @param  count:  A tartományok hossza
+    @type   count:  C{numpy.ndarray}
+    @param  group:  A tartományok csoportja
+    @type   group:  C{numpy.ndarray}
+
+    @return:        Az összevont tartományok kezdete, hossza és csoportja
+    @rtype:         C{tuple}
+    """
+    if len(first) == 0:
+        return first, count, group
+    start = numpy.ones(len(first), dtype=bool)
+    start[1:] = (first[1:] != first[:-1] + count[:-1]) | (group[1:] != group[:-1])
+    begin = numpy.flatnonzero(start)
+    return first[begin], numpy.add.reduceat(count, begin), group[begin]
+
+
+def _uniqueRows(keys):
+    """
+    Egész értékű kulcs párok egyedi sorai
+
+    @param  keys:   C{(n, 2)} méretű kulcs tömb
+    @type   keys:   C{numpy.ndarray}
+
+    @return:        Az egyedi sorok (rendezve) és soronként az egyedi sor indexe
+    @rtype:         C{tuple}
+    """
+    keys = numpy.asarray(keys, dtype=numpy.int64).reshape(-1, 2)
+    packed = (keys[:, 0] << 32) + (keys[:, 1] & 0xffffffff)
+    unique, first, inverse = numpy.unique(packed, return_index=True, return_inverse=True)
+    return keys[first], inverse.astype(numpy.int32)
+
+
+def _bezierBasis(segments, level):
+    """
+    Másodfokú Bézier súlyok egy C{segments} darab részpatchből álló sor
+    C{segments * level + 1} mintavételi pontjára
+
+    @return:    A mintánkénti első vezérlőpont indexe (a teljes rácsban) és
+                a három súly, C{(n,)} és C{(n, 3)} méretű tömbök
+    @rtype:     C{tuple}
+    """
+    count = segments * level + 1
+    seg   = numpy.minimum(numpy.arange(count) // level, segments - 1)
+    t     = numpy.arange(count, dtype=numpy.float32) / level - seg
+    s     = 1.0 - t
+    return 2 * seg, numpy.column_stack((s * s, 2.0 * s * t, t * t)).astype(numpy.float32)
+
+
+def _gridIndices(rows, columns):
+    """
+    Egy C{rows * columns} méretű csúcspontrács háromszögeinek indexei
+
+    @rtype:     C{numpy.ndarray}
+    """
+    v00 = (numpy.arange(rows - 1)[:, None] * columns + numpy.arange(columns - 1)).ravel()
+    v01, v10 = v00 + 1, v00 + columns
+    return numpy.column_stack((v00, v10, v01, v01, v10, v10 + 1)).ravel().astype(numpy.uint32)
+
+
 class Q3BSP(Object):
 
     (Entities,              #Játékkal kapcsolatos leíró objektmok
@@ -35,200 +178,825 @@ class Q3BSP(Object):
     Lightvols,              #helyi illumination adatok
     Visdata) = xrange(17)   #Láthatósági adatok
 
+    HEADER = numpy.dtype([("magic",   "S4"),
+                          ("version", "<i4"),
+                          ("lumps",   "<i4", (17, 2))])                         #:@cvar: Fejléc: azonosító, verzió, (eltolás, hossz) párok
+
+    LUMP_TYPES = {
+        Textures    : numpy.dtype([("src",      "S64"),                         #Név - textúra elérési útvonal
+                                   ("flag",     "<i4"),                         #Flag - jelzők
+                                   ("cont",     "<i4")]),                       #Tartalom
+        Planes      : numpy.dtype([("norm",     "<f4", 3),                      #Plane normál
+                                   ("dist",     "<f4")]),                       #Távolság az origótol
+        Nodes       : numpy.dtype([("plane",    "<i4"),                         #Plane index
+                                   ("child",    "<i4", 2),                      #Gyerekek: pozitív: node; negatív: leaf = -(leaf+1)
+                                   ("minbb",    "<i4", 3),                      #Min Bounding Box
+                                   ("maxbb",    "<i4", 3)]),                    #Max Bounding Box
+        Leafs       : numpy.dtype([("cluster",  "<i4"),                         #Visdata cluster index
+                                   ("area",     "<i4"),                         #Areaportal area
+                                   ("minbb",    "<i4", 3),                      #Integer bounding box min coord
+                                   ("maxbb",    "<i4", 3),                      #Integer bounding box max coord
+                                   ("leaff",    "<i4"),                         #First leafface for leaf
+                                   ("leaffn",   "<i4"),                         #Number of leaffaces for leaf
+                                   ("leafb",    "<i4"),                         #First leafbrush for leaf
+                                   ("leafbn",   "<i4")]),                       #Number of leafbrushes for leaf
+        Leaffaces   : numpy.dtype("<i4"),
+        Leafbrushes : numpy.dtype("<i4"),
+        Models      : numpy.dtype([("minbb",    "<f4", 3),
+                                   ("maxbb",    "<f4", 3),
+                                   ("facef",    "<i4"),
+                                   ("facen",    "<i4"),
+                                   ("brushf",   "<i4"),
+                                   ("brushn",   "<i4")]),
+        Brushes     : numpy.dtype([("first",    "<i4"),
+                                   ("numof",    "<i4"),
+                                   ("texti",    "<i4")]),
+        Brushsides  : numpy.dtype([("plane",    "<i4"),
+                                   ("texti",    "<i4")]),
+        Vertexes    : numpy.dtype([("pos",      "<f4", 3),
+                                   ("texc",     "<f4", (2, 2)),                 #Felület és lightmap textúra koordináták
+                                   ("norm",     "<f4", 3),
+                                   ("color",    "u1",  4)]),
+        Meshverts   : numpy.dtype("<i4"),
+        Effects     : numpy.dtype([("src",      "S64"),
+                                   ("brush",    "<i4"),
+                                   ("unkw",     "<i4")]),
+        Faces       : numpy.dtype([("texti",    "<i4"),
+                                   ("effi",     "<i4"),
+                                   ("type",     "<i4"),                         #1: poligon, 2: patch, 3: mesh, 4: billboard
+                                   ("vertf",    "<i4"),
+                                   ("vertn",    "<i4"),
+                                   ("meshf",    "<i4"),
+                                   ("meshn",    "<i4"),
+                                   ("lmapi",    "<i4"),
+                                   ("lmstr",    "<i4", 2),
+                                   ("lmsize",   "<i4", 2),
+                                   ("lmorig",   "<f4", 3),
+                                   ("lmvecs",   "<f4", (2, 3)),
+                                   ("norm",     "<f4", 3),
+                                   ("size",     "<i4", 2)]),
+        Lightmaps   : numpy.dtype(("u1", (128, 128, 3))),                       #128*128*3 (RGB)
+        Lightvols   : numpy.dtype([("ambient",      "u1", 3),
+                                   ("directional",  "u1", 3),
+                                   ("dir",          "u1", 2)]),
+    }                                                                           #:@cvar: Az adatblokkok rekord típusai
+
+    LIGHTMAP_SIZE   = 128                                                       #:@cvar: A lightmapek oldalhossza képpontban
+    PATCH_MIN_LEVEL = 1                                                         #:@cvar: A legkisebb patch felbontás (részpatchenként és irányonként)
+
+    __public__ = ["version", "entities"]
+
     def __init__(self):
         self.__data = {}
+        self.__lumps = {}                                                       #:@ivar: Adatblokkok strukturált tömbjei
+        self.__mmap = None                                                      #:@ivar: A memóriába képezett fájl
+
+        self.__nodeNorm     = None                                              #:@ivar: Csomópontonként a vágósík normálvektora
+        self.__nodeDist     = None                                              #:@ivar: Csomópontonként a vágósík távolsága
+        self.__nodeChild    = None                                              #:@ivar: Csomópontonként az (elülső, hátsó) gyerek
+        self.__nodeList     = []                                                #:@ivar: Ugyanezek Python listában az egyedi kereséshez
+
+        self.__numClusters  = 0                                                 #:@ivar: A visdata clustereinek száma
+        self.__visCluster   = None                                              #:@ivar: Az utoljára kiértékelt nézőpont cluster
+        self.__visFaces     = None                                              #:@ivar: Az utoljára látható lapok indexei
+
+        self.__vertex       = None                                              #:@ivar: Csúcspontok az atlaszhoz igazított lightmap koordinátákkal
+        self.__atlasImages  = []                                                #:@ivar: A lightmap atlaszok képei
+        self.__atlasTex     = []                                                #:@ivar: A lightmap atlaszok textúra azonosítói
+        self.__faceAtlas    = None                                              #:@ivar: Lapok: a lightmap atlasz indexe, -1 ha nincs
+
+        self.__vbo_vertex   = None                                              #:@ivar: Csúcspontok Vertex Buffer Objektum-a
+        self.__vbo_index    = None                                              #:@ivar: Háromszög indexek Buffer Objektum-a
+        self.__faceFirst    = None                                              #:@ivar: A lapok első indexe az index bufferben
+        self.__faceCount    = None                                              #:@ivar: A lapok indexeinek száma
+        self.__faceGroup    = None                                              #:@ivar: Lapok: a (textúra, lightmap atlasz) csoport indexe
+        self.__groups       = []                                                #:@ivar: A csoportok (textúra, atlasz) párjai
+        self.__batchSource  = None                                              #:@ivar: A kötegek alapjául szolgáló láthatósági lista
+        self.__batches      = []                                                #:@ivar: Csoportonként (atlasz, kezdetek, hosszak)
+
+        self.__isPatch      = None                                              #:@ivar: Lapok: Bézier patch-e
+        self.__patchCenter  = None                                              #:@ivar: Lapok: a vezérlőpontok középpontja
+        self.__patchCache   = {}                                                #:@ivar: (lap, felbontás) - (VBO, IBO, indexszám)
 
     @publicmethod
     def glInit__(self):
-        pass
+        """
+        A csúcspontok és a lapok háromszög indexeinek feltöltése
+        Buffer Object-ekbe
+
+        A csúcsponttömb rekordjai (pozíció, textúra koordináták, normálvektor,
+        szín) változtatás nélkül kerülnek a videókártyára, a poligon és mesh
+        lapok indexei a meshvert lista és a lap első csúcsának összegei.
+
+        Az index bufferben a lapok (textúra, lightmap atlasz) csoportonként
+        egymás után következnek, így egy csoport látható lapjai néhány
+        összefüggő tartományként rajzolhatók ki.
+        """
+        faces     = self.__lumps[Q3BSP.Faces]
+        meshverts = self.__lumps[Q3BSP.Meshverts]
+
+        drawable  = (faces["type"] == 1) | (faces["type"] == 3)
+        count     = numpy.where(drawable, faces["meshn"], 0).astype(numpy.int32)
+
+        keys   = numpy.column_stack((faces["texti"], self.__faceAtlas))
+        groups, faceGroup = _uniqueRows(keys)
+        order  = numpy.lexsort((numpy.arange(len(faces)), faceGroup))
+        first  = numpy.empty(len(faces), dtype=numpy.int32)
+        first[order] = numpy.cumsum(count[order]) - count[order]
+
+        indices = meshverts[_expandRanges(faces["meshf"][order], count[order])] + \
+                  numpy.repeat(faces["vertf"][order], count[order])
+
+        self.__faceCount   = count
+        self.__faceFirst   = first
+        self.__faceGroup   = faceGroup
+        self.__groups      = [tuple(group) for group in groups.tolist()]
+        self.__batchSource = None
+
+        self.__vbo_vertex = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_vertex)
+        glBufferData(GL_ARRAY_BUFFER, self.__vertex.view(numpy.uint8), GL_STATIC_DRAW)
+
+        self.__vbo_index = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__vbo_index)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.astype(numpy.uint32),
+                     GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        self.__atlasTex = []
+        for image in self.__atlasImages:
+            texID = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, texID)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, image.shape[1], image.shape[0], 0,
+                         GL_RGB, GL_UNSIGNED_BYTE, image)
+            self.__atlasTex.append(texID)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        self.__isPatch = (faces["type"] == 2) & (faces["size"] >= 3).all(1) & \
+                         (faces["size"] % 2 == 1).all(1)
+        self.__patchCenter = numpy.zeros((len(faces), 3), dtype=numpy.float32)
+        pos = self.__vertex["pos"]
+        for face in numpy.flatnonzero(self.__isPatch):
+            first, count = faces["vertf"][face], faces["vertn"][face]
+            self.__patchCenter[face] = pos[first:first + count].mean(0)
+
+    @publicmethod
+    def tessellatePatch(self, face, level):
+        """
+        Bézier patch lap háromszögekre bontása
+
+        A vezérlőpontrács minden 3x3-as részpatchét irányonként C{level}
+        szakaszra osztjuk. A súlyozás szétválasztható, ezért előbb a sorokat,
+        majd az oszlopokat keverjük tömbműveletekkel, a szomszédos
+        részpatchek a közös élükön osztoznak a csúcspontokon.
+
+        @param  face:   A lap indexe (C{type == 2})
+        @type   face:   C{int}
+        @param  level:  Felbontás részpatchenként és irányonként
+        @type   level:  C{int}
+
+        @return:        A csúcspontok (a C{Vertexes} adatblokkal azonos
+                        rekordtípusú) és a háromszögek indexeinek tömbje
+        @rtype:         C{tuple}
+        """
+        f = self.__lumps[Q3BSP.Faces][face]
+        width, height = int(f["size"][0]), int(f["size"][1])
+        if f["type"] != 2 or width < 3 or height < 3 or not width % 2 or not height % 2 or \
+           f["vertn"] != width * height:
+            raise IloError("Hibas Q3 BSP patch (%d. lap)" % face)
+        level = max(int(level), 1)
+
+        ctrl = self.__vertex[f["vertf"]:f["vertf"] + f["vertn"]]
+        grid = numpy.concatenate((ctrl["pos"], ctrl["texc"].reshape(-1, 4), ctrl["norm"],
+                                  ctrl["color"]), axis=1).astype(numpy.float32)
+        grid = grid.reshape(height, width, -1)
+
+        rowFirst, rowWeight = _bezierBasis((height - 1) // 2, level)
+        colFirst, colWeight = _bezierBasis((width - 1) // 2, level)
+        pick = numpy.arange(3)
+        rows = numpy.einsum("ra,rawk->rwk", rowWeight, grid[rowFirst[:, None] + pick])
+        full = numpy.einsum("cb,rcbk->rck", colWeight, rows[:, colFirst[:, None] + pick])
+
+        numRows, numColumns = full.shape[:2]
+        full = full.reshape(numRows * numColumns, -1)
+
+        vertex = numpy.empty(len(full), Q3BSP.LUMP_TYPES[Q3BSP.Vertexes])
+        vertex["pos"]  = full[:, 0:3]
+        vertex["texc"] = full[:, 3:7].reshape(-1, 2, 2)
+        norm   = full[:, 7:10]
+        length = numpy.sqrt((norm * norm).sum(1))[:, None]
+        vertex["norm"]  = norm / numpy.where(length > 0, length, 1.0)
+        vertex["color"] = numpy.clip(numpy.rint(full[:, 10:14]), 0, 255)
+
+        return vertex, _gridIndices(numRows, numColumns)
+
+    def __buildLightmapAtlas(self):
+        """
+        A lightmapek atlaszba rendezése és a lapok lightmap koordinátáinak
+        átszámítása
+
+        A lapok saját csúcspont tartományaiban a lightmap koordinátákat a
+        csempe helyére toljuk és az atlasz méretére skálázzuk, így a pálya
+        lightmapjei atlaszonként egyetlen textúrából rajzolhatók. Az
+        adatblokk csak olvasható, ezért a csúcspontokról másolat készül.
+        """
+        faces  = self.__lumps[Q3BSP.Faces]
+        vertex = self.__lumps[Q3BSP.Vertexes].copy()
+
+        images, atlas, column, row, side = _packLightmaps(self.__lumps[Q3BSP.Lightmaps],
+                                                          Config.getValue("render.lightmapatlas"))
+
+        lmap = faces["lmapi"]
+        lit  = (lmap >= 0) & (lmap < len(atlas))
+        self.__faceAtlas = numpy.where(lit, atlas[numpy.where(lit, lmap, 0)], -1) \
+                           if len(atlas) else numpy.zeros(len(faces), dtype=numpy.int32) - 1
+
+        if lit.any():
+            owner = numpy.repeat(lmap[lit], faces["vertn"][lit])
+            verts = _expandRanges(faces["vertf"][lit], faces["vertn"][lit])
+            valid = verts < len(vertex)
+            verts, owner = verts[valid], owner[valid]
+            uv = vertex["texc"][verts, 1]
+            offset = numpy.column_stack((column[owner], row[owner]))
+            vertex["texc"][verts, 1] = (uv + offset) / side[owner][:, None].astype(numpy.float32)
+
+        self.__vertex = vertex
+        self.__atlasImages = images
+
+    @publicmethod
+    def lightmapAtlas(self):
+        """
+        A lightmap atlaszok és a lapok atlasz indexei
+
+        @return:    Az atlaszok képeinek listája és lapokként az atlasz
+                    indexe (-1, ha a lapnak nincs lightmapje)
+        @rtype:     C{tuple}
+        """
+        return self.__atlasImages, self.__faceAtlas
+
+    def __patchLevel(self, face, eye):
+        """
+        A patch felbontása a nézőponttól mért távolság alapján
+
+        A C{render.patchdistance} távolságon belül a C{render.patchlevel}
+        felbontást használjuk, a távolság minden duplázásakor feleződik.
+        A felbontás így kettő hatvány, a gyorsítótár lapokként legfeljebb
+        néhány változatot tárol.
+
+        @rtype:     C{int}
+        """
+        maxLevel = Config.getValue("render.patchlevel")
+        distance = numpy.sqrt(((self.__patchCenter[face] - eye) ** 2).sum())
+        ratio    = distance / Config.getValue("render.patchdistance")
+        if ratio <= 1.0:
+            return maxLevel
+        return max(maxLevel >> int(numpy.log2(ratio)), Q3BSP.PATCH_MIN_LEVEL)
+
+    def __setPointers(self, vbo):
+        """
+        A csúcspont tömbök beállítása a C{Vertexes} rekordtípusú bufferre
+        """
+        stride = Q3BSP.LUMP_TYPES[Q3BSP.Vertexes].itemsize
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glVertexPointer(3, GL_FLOAT, stride, None)
+        glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(28))
+        if self.__atlasTex:
+            glClientActiveTexture(GL_TEXTURE1)
+            glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(20))
+            glClientActiveTexture(GL_TEXTURE0)
+        glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(12))
+
+    def __renderPatch(self, face, level):
+        """
+        A patch adott felbontású változatának kirajzolása
+
+        A felbontott geometria első használatkor kerül Buffer Object-ekbe, a
+        további képkockák a gyorsítótárból rajzolnak.
+        """
+        key = (int(face), level)
+        if key not in self.__patchCache:
+            vertex, indices = self.tessellatePatch(face, level)
+            vbo, ibo = glGenBuffers(2)
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, vertex.view(numpy.uint8), GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+            self.__patchCache[key] = (vbo, ibo, len(indices))
+
+        vbo, ibo, count = self.__patchCache[key]
+        self.__setPointers(vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ibo)
+        glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, None)
 
     @publicmethod
     def load (self, fileName):
         """
             Quake 3 BSP fájl feldogozás
-        """
 
-        def readStruct(s, offset = None):
-            if offset != None:
-                file_in.seek(offset)
-            return s.unpack(file_in.read(s.size))
-
-        def iterStruct(name, s):
-            for i in xrange(dir[name][0], dir[name][1]+dir[name][0], s.size):
-                yield readStruct(s,  i)
-
-        sHeader         = Struct("<4si")
-        sDirentry       = Struct("<ii")
-        sTexture        = Struct("<64sii")
-        sPlane          = Struct("<f3f")
-        sNode           = Struct("<iiiiiiiii")
-        sLeaf           = Struct("<iiiiiiiiiiii")
-        sLeafface       = Struct("<i")
-        sLeafbrush      = Struct("<i")
-        sModel          = Struct("<ffffffiiii")
-        sBrush          = Struct("<iii")
-        sBrushsid       = Struct("<ii")
-        sVertex         = Struct("<ffffffffffBBBB")
-        sMeshvert       = Struct("<i")
-        sEffect         = Struct("<64sii")
-        sFace           = Struct("<iiiiiiiiiiiiffffffffffffii")
-        sLightmap       = Struct("<49152s")                                         #128*128*3()RGB
-        sLightvol       = Struct("BBBBBBBB")
-        sVisdata        = Struct("ii")                                             #TODO n_vecs*sz_vecs
-
-        dir, textures, planes, nodes, leafs, leafFaces, leafBrushes,\
-        models, brushes, brushsides, vertexes, meshverts, effects, faces,\
-        lightmaps, lightvols, visdata = \
-        [],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[]
-        # @type
+            Az adatblokkok a C{lump} metódussal kérdezhetők le, a tömbök a
+            memóriába képezett fájlra mutatnak, ezért csak olvashatók.
+
+            @param  fileName:   A BSP fájl neve és elérési útvonala
+            @type   fileName:   C{string}
 
+            @return:            A fájlból készült geometriák listája
+            @rtype:             C{list}
+        """
         geometris = []
-        try:
-            if os.path.exists(fileName) and os.path.isfile(fileName):
-                file_in = open(fileName, "rb", 0)
-            else:
-                raise IOError("A fájl nem található: "+fileName)
 
+        if not (os.path.exists(fileName) and os.path.isfile(fileName)):
+            raise IloError("Q3 BSP fájl megnyitási hiba: %s" % fileName)
+
+        try:
+            file_in = open(fileName, "rb")
             try:
+                data = mmap.mmap(file_in.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                file_in.close()
+        except (IOError, EnvironmentError) as e:
+            raise IloError("Q3 BSP fájl (%s) olvasási hiba: %s" % (fileName, e))
+
     # ADATOK BEOLVASÁSA ########################################################
 
         #>-[ Fejléc ]-----------------------------------------------------------
-                _, self.__data["version"] = readStruct(sHeader)
-                for i in xrange(17):
-                    dir.append(readStruct(sDirentry))
-
-        #>-[ Texture ]----------------------------------------------------------
-                for item in iterStruct(Q3BSP.Textures, sTexture):
-                    tex, flag, cont = item
-                    textures.append({"src" :tex.rstrip('\0'),                       #Név - textúra elérési útvonal
-                                     "flag":flag,                                   #Flag - jelzők
-                                     "cont":cont})                                  #Tartalom
-
-        #>-[ Plane ]------------------------------------------------------------
-                for item in iterStruct(Q3BSP.Planes, sPlane):
-                    a1,a2, a3, b = item
-                    planes.append({"norm": [a1,a2,a3],                              #Plane normál
-                                   "dist": b})                                      #Távolság az origótol
-
-        #>-[ Nodes ]------------------------------------------------------------
-                for item in iterStruct(Q3BSP.Nodes, sNode):
-                    a, b1,b2, c1,c2,c3, d1,d2,d3 = item
-                    nodes.append({"plane":a,                                        #Plane index
-                                  "child":[b1,b2],                                  #Gyerekek: pozitaív: node; negatív: leaf = -(leaf+1)
-                                  "minbb":[c1,c2,c3],                               #Min Bounding Box
-                                  "maxbb":[d1,d2,d3]})                              #Max Bounding Box
-
-        #>-[ Leaf ]-------------------------------------------------------------
-                for item in iterStruct(Q3BSP.Leafs, sLeaf):
-                    a, b, c1,c2,c3, d1,d2,d3, e, f, g, h = item
-                    leafs.append({"clast" :a,                                       #Visdata cluster index.
-                                  "area"  :b,                                       #Areaportal area.
-                                  "minbb" :[c1,c2,c3],                              #Integer bounding box min coord.
-                                  "maxbb" :[d1,d2,d3],                              #Integer bounding box max coord.
-                                  "leaff" :e,                                       #First leafface for leaf.
-                                  "leaffn":f,                                       #Number of leaffaces for leaf.
-                                  "leafb" :g,                                       #First leafbrush for leaf.
-                                  "leafbn":h})                                      #Number of leafbrushes for leaf.
-
-        #>-[ LeafFace ]---------------------------------------------------------
-                for item in iterStruct(Q3BSP.Leaffaces, sLeafface):
-                    leafFaces.append(*item)
-
-        #>-[ LeafFace ]---------------------------------------------------------
-                for item in iterStruct(Q3BSP.Leafbrushes, sLeafbrush):
-                    leafBrushes.append(*item)
-
-        #>-[ Model ]------------------------------------------------------------
-                for item in iterStruct(Q3BSP.Models, sModel):
-                    a1,a2,a3, b1,b2,b3, c, d, e, f = item
-                    models.append({"minbb":[a1,a2,a3],
-                                   "maxbb":[b1,b2,b3],
-                                   "facef":c,
-                                   "facen":d,
-                                   "brushf":e,
-                                   "brushn":f})
-                                   
-        #>-[ Brushes ]----------------------------------------------------------
-                for item in iterStruct(Q3BSP.Brushes , sBrush):
-                    a, b, c = item
-                    brushes.append({"first":a,
-                                    "numof":b,
-                                    "texti":c})
-        
-        #>-[ Brushsides ]-------------------------------------------------------
-                for item in iterStruct(Q3BSP.Brushsides, sBrushsid):
-                    a, b = item
-                    brushsides.append({"plane":a,
-                                       "texti":c})
-                                       
-        #>-[ Vertexes ]---------------------------------------------------------
-                for item in iterStruct(Q3BSP.Vertexes, sVertex):
-                    a1,a2,a3, b1,b2,b3,b4, c1,c2,c3, d1,d2,d3,d4 = item
-                    vertexes.append({"pos"  :[a1,a2,a3],
-                                     "texc" :[[b1,b2],[b3,b4]],
-                                     "norm" :[c1,c2,c3],
-                                     "color":[d1,d2,d3,d4]})
-
-        #>-[ Meshverts ]--------------------------------------------------------
-                for item in iterStruct(Q3BSP.Meshverts, sMeshvert):
-                    meshverts.append(*item)
-
-        #>-[ Effects ]----------------------------------------------------------
-                for item in iterStruct(Q3BSP.Effects , sEffect):
-                    a, b, c = item
-                    effects.append({"src"  :a,
-                                    "brush":b,
-                                    "unkw" :c})
-
-        #>-[ Faces ]------------------------------------------------------------
-                for item in iterStruct(Q3BSP.Faces, sFace):
-                    a, b, c, d, e, f, g, h, i1,i2, j1,j2, k1,k2,k3, \
-                    l1,l2,l3,l4,l5,l6, m1,m2,m3, n1,n2 = item
-                    faces.append({"texti" :a,
-                                  "effi"  :b,
-                                  "type"  :c,
-                                  "vertf" :d,
-                                  "vertn" :e,
-                                  "meshf" :f,
-                                  "meshn" :g,
-                                  "lmapi" :h,
-                                  "lmstr" :[i1, i2],
-                                  "lmsize":[j1, j2],
-                                  "lmorig":[k1,k2,k3],
-                                  "lmvecs":[[l1,l2,l3],[l4,l5,l6]],
-                                  "norm"  :[m1,m2,m3],
-                                  "size"  :[n1,n2]})
-
-        #>-[ Lightmaps ]--------------------------------------------------------
-                for item in iterStruct(Q3BSP.Lightmaps, sLightmap):
-                    lightmaps.append(item)
-
-        #>-[ Lightvols ]--------------------------------------------------------
-                for item in iterStruct(Q3BSP.Lightvols , sLightvol):
-                    a1,a2,a3, b1,b2,b3, c1,c2 = item
-                    lightvols.append({"ambient"    :[a1,a2,a3],
-                                      "directional":[b1,b2,b3],
-                                      "dir"        :[c1,c2]})
-        
+        if len(data) < Q3BSP.HEADER.itemsize:
+            raise IloError("Hibás Q3 BSP fájl: %s" % fileName)
+        header = numpy.frombuffer(data, Q3BSP.HEADER, 1)[0]
+        if header["magic"] != "IBSP":
+            raise IloError("Hibás Q3 BSP fájl azonosító: %s" % fileName)
+        self.__data["version"] = int(header["version"])
+
+        for index, (offset, length) in enumerate(header["lumps"]):
+            if offset < 0 or length < 0 or offset + length > len(data):
+                raise IloError("Hibás Q3 BSP adatblokk (%d): %s" % (index, fileName))
+
+        #>-[ Rekord alapú adatblokkok ]-----------------------------------------
+            if index in Q3BSP.LUMP_TYPES:
+                dtype = Q3BSP.LUMP_TYPES[index]
+                if length % dtype.itemsize:
+                    raise IloError("Hibás Q3 BSP adatblokk méret (%d): %s" % (index, fileName))
+                if length == 0:
+                    self.__lumps[index] = numpy.zeros(0, dtype)
+                else:
+                    self.__lumps[index] = numpy.frombuffer(data, dtype,
+                                                           length // dtype.itemsize,
+                                                           offset)
+
+        #>-[ Entities ]---------------------------------------------------------
+            elif index == Q3BSP.Entities:
+                self.__data["entities"] = data[offset:offset + length].rstrip('\0')
+
         #>-[ Visdata  ]---------------------------------------------------------
-#                for item in iterStruct(Q3BSP.Visdata  , sVisdata ):
-#                    a, b = item
-#                    data = readStruct(Struct("<B"+str(a*b)))
-#                    visdata.append({"nvecs":a,
-#                                     "svecs":b,
-#                                     "dir"  :data})
+            elif index == Q3BSP.Visdata:
+                if length >= 8:
+                    nvecs, svecs = numpy.frombuffer(data, "<i4", 2, offset)
+                    if 8 + nvecs * svecs > length:
+                        raise IloError("Hibás Q3 BSP visdata: %s" % fileName)
+                    self.__lumps[index] = numpy.frombuffer(data, "u1",
+                                                           nvecs * svecs,
+                                                           offset + 8).reshape(nvecs, svecs)
+                else:
+                    self.__lumps[index] = numpy.zeros((0, 0), "u1")
+
+        self.__mmap = data
+
+        #>-[ BSP fa ]-----------------------------------------------------------
+        nodes  = self.__lumps[Q3BSP.Nodes]
+        planes = self.__lumps[Q3BSP.Planes]
+        if len(nodes) and (nodes["plane"].min() < 0 or nodes["plane"].max() >= len(planes)):
+            raise IloError("Hibás Q3 BSP csomópont sík index: %s" % fileName)
+        self.__nodeNorm  = planes["norm"][nodes["plane"]].astype(numpy.float64)
+        self.__nodeDist  = planes["dist"][nodes["plane"]].astype(numpy.float64)
+        self.__nodeChild = nodes["child"].astype(numpy.int32)
+        self.__nodeList  = zip(self.__nodeNorm.tolist(),
+                               self.__nodeDist.tolist(),
+                               self.__nodeChild.tolist())
+
+        self.__buildLightmapAtlas()
+
+        vis = self.__lumps[Q3BSP.Visdata]
+        self.__numClusters = len(vis)
+        if self.__numClusters == 0 and len(self.__lumps[Q3BSP.Leafs]):
+            self.__numClusters = int(self.__lumps[Q3BSP.Leafs]["cluster"].max() + 1)
+
+        return geometris
 
-                #print faces
+    @publicmethod
+    def lump(self, index):
+        """
+        Egy adatblokk lekérdezése
 
-            except IOError as e:
-                raise IloError("Q3 BSP fájl (",fileName,") olvasási hiba:" + e)
-            finally:
-                file_in.close()
+        @param  index:  Az adatblokk azonosítója, pl. C{Q3BSP.Faces}
+        @type   index:  C{int}
 
-            for geom in geometris :
-                geom.convert()
+        @return:        Az adatblokk rekordjainak (csak olvasható) tömbje, a
+                        C{Visdata} esetén C{(clusterek, sorhossz)} méretű
+                        bájttömb
+        @rtype:         C{numpy.ndarray}
+        """
+        if index not in self.__lumps:
+            raise IloError("Nem letezo vagy be nem toltott adatblokk: %s" % index)
+        return self.__lumps[index]
 
-            return geometris
+    @publicmethod
+    def findLeaf(self, point):
+        """
+        A pontot tartalmazó BSP levél megkeresése a csomópontok síkjai alapján
+
+        A síkon fekvő pont az elülső oldalhoz tartozik.
 
-        except IOError:
-            raise IloError("ASE fájl megnyitási hiba" + fileName)
\ No newline at end of file
+        @param  point:  Egy pont a pálya koordinátarendszerében
+        @type   point:  C{Vector3}
+
+        @return:        A levél indexe
+        @rtype:         C{int}
+        """
+        if not self.__nodeList:
+            return 0
+        nodes = self.__nodeList
+        x, y, z = [float(c) for c in point[:3]]
+
+        index = 0
+        while index >= 0:
+            (nx, ny, nz), dist, child = nodes[index]
+            index = child[nx * x + ny * y + nz * z < dist]
+        return -(index + 1)
+
+    @publicmethod
+    def findLeaves(self, points):
+        """
+        Több pont BSP levelének egyidejű megkeresése
+
+        A fát szintenként járjuk be: minden lépésben az összes, még
+        csomóponton álló pontot egyszerre soroljuk a vágósík megfelelő
+        oldalára.
+
+        @param  points: A pontok a pálya koordinátarendszerében
+        @type   points: C{(n, 3)} méretű C{numpy.ndarray}
+
+        @return:        A pontok leveleinek indexei
+        @rtype:         C{numpy.ndarray}
+        """
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+        index  = numpy.zeros(len(points), dtype=numpy.int32)
+        if len(self.__nodeChild) == 0:
+            return index
+
+        active = numpy.arange(len(points))
+        while len(active):
+            node  = index[active]
+            side  = numpy.einsum("ij,ij->i", self.__nodeNorm[node], points[active]) < \
+                    self.__nodeDist[node]
+            index[active] = self.__nodeChild[node, side.astype(numpy.int32)]
+            active = active[index[active] >= 0]
+        return -(index + 1)
+
+    @publicmethod
+    def findCluster(self, point):
+        """
+        A pontot tartalmazó levél visdata clustere
+
+        @param  point:  Egy pont a pálya koordinátarendszerében
+        @type   point:  C{Vector3}
+
+        @return:        A cluster indexe, negatív ha a pont a pályán kívül van
+        @rtype:         C{int}
+        """
+        return int(self.__lumps[Q3BSP.Leafs]["cluster"][self.findLeaf(point)])
+
+    @publicmethod
+    def findClusters(self, points):
+        """
+        Több pont visdata clusterének egyidejű megkeresése
+
+        @param  points: A pontok a pálya koordinátarendszerében
+        @type   points: C{(n, 3)} méretű C{numpy.ndarray}
+
+        @return:        A pontok clustereinek indexei
+        @rtype:         C{numpy.ndarray}
+        """
+        return self.__lumps[Q3BSP.Leafs]["cluster"][self.findLeaves(points)]
+
+    @publicmethod
+    def isClusterVisible(self, fromCluster, toCluster):
+        """
+        Látható-e a C{toCluster} a C{fromCluster}-ből a visdata szerint?
+
+        Negatív cluster (pl. a pályán kívüli vagy falban álló nézőpont) vagy
+        hiányzó visdata esetén minden látható.
+
+        @param  fromCluster:    A nézőpont clustere
+        @type   fromCluster:    C{int}
+        @param  toCluster:      A vizsgált cluster
+        @type   toCluster:      C{int}
+
+        @return:                C{True} ha potenciálisan látható
+        @rtype:                 C{bool}
+        """
+        vis = self.__lumps[Q3BSP.Visdata]
+        if fromCluster < 0 or len(vis) == 0:
+            return True
+        return bool(vis[fromCluster, toCluster >> 3] & (1 << (toCluster & 7)))
+
+    @publicmethod
+    def visibleClusters(self, cluster):
+        """
+        A megadott clusterből látható clusterek
+
+        A visdata sorai tömörített bitsorok (clusterenként egy bit, bájton
+        belül a legkisebb helyiértéktől kezdve), ezekből csak a kért sort
+        bontjuk ki.
+
+        @param  cluster:    A nézőpont clustere
+        @type   cluster:    C{int}
+
+        @return:            Clusterenkénti logikai tömb
+        @rtype:             C{numpy.ndarray}
+        """
+        vis = self.__lumps[Q3BSP.Visdata]
+        if cluster < 0 or len(vis) == 0:
+            return numpy.ones(self.__numClusters, dtype=bool)
+        bits = numpy.unpackbits(vis[cluster]).reshape(-1, 8)[:, ::-1]
+        return bits.ravel()[:self.__numClusters].astype(bool)
+
+    @publicmethod
+    def visibleFaces(self, point):
+        """
+        A megadott nézőpontból potenciálisan látható lapok
+
+        Az eredményt a nézőpont clusteréhez gyorsítótárazzuk, így csak
+        clusterváltáskor számolunk újra.
+
+        @param  point:  A nézőpont a pálya koordinátarendszerében
+        @type   point:  C{Vector3}
+
+        @return:        A látható lapok (rendezett, ismétlődés nélküli) indexei
+        @rtype:         C{numpy.ndarray}
+        """
+        leafs   = self.__lumps[Q3BSP.Leafs]
+        cluster = self.findCluster(point)
+
+        if self.__visFaces is None or cluster != self.__visCluster:
+            clusters = leafs["cluster"]
+            visible  = self.visibleClusters(cluster)
+            leafMask = (clusters >= 0) & visible[numpy.clip(clusters, 0, len(visible) - 1)]
+            entries  = _expandRanges(leafs["leaff"][leafMask], leafs["leaffn"][leafMask])
+
+            self.__visFaces   = numpy.unique(self.__lumps[Q3BSP.Leaffaces][entries])
+            self.__visCluster = cluster
+
+        return self.__visFaces
+
+    @publicmethod
+    def renderMesh(self, frontFaces=[]):
+        """
+        A nézőpontból potenciálisan látható lapok leképezése
+
+        A nézőpontot az aktuális modelview mátrixból számoljuk, így a pálya
+        objektum tetszőlegesen mozgatható, forgatható és méretezhető.
+        """
+        eye = GLContext.getInstance().matrix.eyePosition()
+        visible = self.visibleFaces(eye)
+
+        # a mesh-ek VAO-ja kötve maradhat, a mutatók nem írhatják felül
+        glBindVertexArray(0)
+
+        if self.__atlasTex:
+            glActiveTexture(GL_TEXTURE1)
+            glClientActiveTexture(GL_TEXTURE1)
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glTexEnvi(GL_TEXTURE_ENV, GL_TEXTURE_ENV_MODE, GL_MODULATE)
+            glActiveTexture(GL_TEXTURE0)
+            glClientActiveTexture(GL_TEXTURE0)
+
+        self.__setPointers(self.__vbo_vertex)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__vbo_index)
+        bound = None
+        for atlas, first, count in self.__drawBatches(visible):
+            if atlas != bound:
+                self.__bindLightmap(atlas)
+                bound = atlas
+            if len(first) == 1:
+                glDrawElements(GL_TRIANGLES, int(count[0]), GL_UNSIGNED_INT,
+                               ctypes.c_void_p(int(first[0])))
+            else:
+                glMultiDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, first, len(first))
+
+        eye = numpy.array(eye[:3], dtype=numpy.float32)
+        patches = visible[self.__isPatch[visible]]
+        for face in patches[numpy.argsort(self.__faceAtlas[patches], kind="mergesort")]:
+            if self.__faceAtlas[face] != bound:
+                self.__bindLightmap(self.__faceAtlas[face])
+                bound = self.__faceAtlas[face]
+            self.__renderPatch(face, self.__patchLevel(face, eye))
+
+        if self.__atlasTex:
+            self.__bindLightmap(-1)
+            glClientActiveTexture(GL_TEXTURE1)
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+            glClientActiveTexture(GL_TEXTURE0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def __drawBatches(self, visible):
+        """
+        A látható poligon és mesh lapok rajzolási kötegei
+
+        A látható lapok index tartományait csoportonként összevonjuk, így
+        csoportonként egy C{glDrawElements} vagy C{glMultiDrawElements}
+        hívás marad. A láthatósági lista csak clusterváltáskor cserélődik,
+        addig a kötegeket újrahasznosítjuk.
+
+        @param  visible:    A látható lapok indexei
+        @type   visible:    C{numpy.ndarray}
+
+        @return:            Csoportonként a lightmap atlasz indexe, valamint a
+                            tartományok bájt eltolásai és index számai
+        @rtype:             C{list}
+        """
+        if visible is self.__batchSource:
+            return self.__batches
+
+        faces = visible[self.__faceCount[visible] > 0]
+        faces = faces[numpy.argsort(self.__faceFirst[faces])]
+        first, count, group = _mergeRanges(self.__faceFirst[faces], self.__faceCount[faces],
+                                           self.__faceGroup[faces])
+
+        self.__batches = []
+        bounds = numpy.flatnonzero(numpy.diff(group)) + 1
+        for part in numpy.split(numpy.arange(len(group)), bounds):
+            if len(part):
+                self.__batches.append((self.__groups[group[part[0]]][1],
+                                       (first[part] * 4).astype(numpy.uintp),
+                                       count[part].astype(numpy.int32)))
+        self.__batchSource = visible
+        return self.__batches
+
+    def __bindLightmap(self, atlas):
+        """
+        A lightmap atlasz kötése a második textúra egységre
+
+        @param  atlas:  Az atlasz indexe, negatív érték esetén a lightmap
+                        textúrázás kikapcsol
+        @type   atlas:  C{int}
+        """
+        if not self.__atlasTex:
+            return
+        glActiveTexture(GL_TEXTURE1)
+        if atlas < 0:
+            glDisable(GL_TEXTURE_2D)
+        else:
+            glEnable(GL_TEXTURE_2D)
+            glBindTexture(GL_TEXTURE_2D, self.__atlasTex[atlas])
+        glActiveTexture(GL_TEXTURE0)
+
+    @publicmethod
+    def remove(self):
+        """
+        A Buffer Object-ek törlése
+        """
+        if self.__vbo_vertex != None:
+            glDeleteBuffers(2, [self.__vbo_vertex, self.__vbo_index])
+            self.__vbo_vertex = self.__vbo_index = None
+        if self.__atlasTex:
+            glDeleteTextures(self.__atlasTex)
+            self.__atlasTex = []
+        for vbo, ibo, count in self.__patchCache.itervalues():
+            glDeleteBuffers(2, [vbo, ibo])
+        self.__patchCache = {}
+
+    @property
+    def version(self):
+        """A BSP fájl verziója"""
+        return self.__data.get("version")
+
+    @property
+    def entities(self):
+        """Az entitás leíró szöveg"""
+        return self.__data.get("entities", "")
+
+
+def loadQ3BSPByRecord(fileName):
+    """
+    Quake 3 BSP fájl rekordonkénti feldolgozása
+
+    A korábbi, C{Struct.unpack}-et rekordonként hívó és szótárakat építő
+    olvasó. Csak összehasonlításra (lásd a modul C{__main__} részét) maradt
+    meg, a motor a C{Q3BSP.load} metódust használja.
+
+    @return:    Adatblokk azonosító - szótár lista párok
+    @rtype:     C{dict}
+    """
+    def readStruct(s, offset = None):
+        if offset != None:
+            file_in.seek(offset)
+        return s.unpack(file_in.read(s.size))
+
+    def iterStruct(name, s):
+        for i in xrange(dir[name][0], dir[name][1]+dir[name][0], s.size):
+            yield readStruct(s,  i)
+
+    sHeader         = Struct("<4si")
+    sDirentry       = Struct("<ii")
+    sTexture        = Struct("<64sii")
+    sPlane          = Struct("<f3f")
+    sNode           = Struct("<iiiiiiiii")
+    sLeaf           = Struct("<iiiiiiiiiiii")
+    sInt            = Struct("<i")
+    sVertex         = Struct("<ffffffffffBBBB")
+    sFace           = Struct("<iiiiiiiiiiiiffffffffffffii")
+    sLightmap       = Struct("<49152s")
+
+    dir, lumps = [], {}
+    file_in = open(fileName, "rb", 0)
+    try:
+        readStruct(sHeader)
+        for i in xrange(17):
+            dir.append(readStruct(sDirentry))
+
+        lumps[Q3BSP.Textures] = [{"src":tex.rstrip('\0'), "flag":flag, "cont":cont}
+                                 for tex, flag, cont in iterStruct(Q3BSP.Textures, sTexture)]
+        lumps[Q3BSP.Planes] = [{"norm":[a1,a2,a3], "dist":b}
+                               for a1,a2,a3, b in iterStruct(Q3BSP.Planes, sPlane)]
+        lumps[Q3BSP.Nodes] = [{"plane":a, "child":[b1,b2], "minbb":[c1,c2,c3], "maxbb":[d1,d2,d3]}
+                              for a, b1,b2, c1,c2,c3, d1,d2,d3 in iterStruct(Q3BSP.Nodes, sNode)]
+        lumps[Q3BSP.Leafs] = [{"cluster":a, "area":b, "minbb":[c1,c2,c3], "maxbb":[d1,d2,d3],
+                               "leaff":e, "leaffn":f, "leafb":g, "leafbn":h}
+                              for a, b, c1,c2,c3, d1,d2,d3, e, f, g, h in iterStruct(Q3BSP.Leafs, sLeaf)]
+        lumps[Q3BSP.Leaffaces] = [item[0] for item in iterStruct(Q3BSP.Leaffaces, sInt)]
+        lumps[Q3BSP.Vertexes] = [{"pos":[a1,a2,a3], "texc":[[b1,b2],[b3,b4]], "norm":[c1,c2,c3],
+                                  "color":[d1,d2,d3,d4]}
+                                 for a1,a2,a3, b1,b2,b3,b4, c1,c2,c3, d1,d2,d3,d4
+                                 in iterStruct(Q3BSP.Vertexes, sVertex)]
+        lumps[Q3BSP.Meshverts] = [item[0] for item in iterStruct(Q3BSP.Meshverts, sInt)]
+        lumps[Q3BSP.Faces] = [{"texti":a, "effi":b, "type":c, "vertf":d, "vertn":e, "meshf":f,
+                               "meshn":g, "lmapi":h, "lmstr":[i1, i2], "lmsize":[j1, j2],
+                               "lmorig":[k1,k2,k3], "lmvecs":[[l1,l2,l3],[l4,l5,l6]],
+                               "norm":[m1,m2,m3], "size":[n1,n2]}
+                              for a, b, c, d, e, f, g, h, i1,i2, j1,j2, k1,k2,k3,
+                                  l1,l2,l3,l4,l5,l6, m1,m2,m3, n1,n2
+                              in iterStruct(Q3BSP.Faces, sFace)]
+        lumps[Q3BSP.Lightmaps] = list(iterStruct(Q3BSP.Lightmaps, sLightmap))
+    finally:
+        file_in.close()
+    return lumps
+
+
+if __name__ == "__main__":
+    # Sebességmérés: a leképezett tömbös és a rekordonkénti olvasó
+    # összehasonlítása. Futtatás a projekt gyökeréből:
+    #   python -m ilo.filereader.model.q3bsp [fájl.bsp]
+    import sys
+    from timeit import default_timer as clock
+
+    fileName = (sys.argv[1:] or ["data/model/maps/Level.bsp"])[0]
+    Config.loadConfigXML("data/config.xml")
+
+    def bench(function, repeat=20):
+        best = None
+        for i in xrange(repeat):
+            t = clock()
+            result = function()
+            t = clock() - t
+            best = t if best == None else min(best, t)
+        return best, result
+
+    def loadMapped():
+        bsp = Q3BSP()
+        bsp.load(fileName)
+        return bsp
+
+    oldTime, lumps = bench(lambda: loadQ3BSPByRecord(fileName))
+    newTime, bsp = bench(loadMapped)
+
+    for index, records in lumps.iteritems():
+        array = bsp.lump(index)
+        assert len(array) == len(records), index
+    faces = bsp.lump(Q3BSP.Faces)
+    assert [f["vertf"] for f in lumps[Q3BSP.Faces]] == faces["vertf"].tolist()
+    assert numpy.allclose([v["pos"] for v in lumps[Q3BSP.Vertexes]],
+                          bsp.lump(Q3BSP.Vertexes)["pos"])
+
+    print "%s: version %d, %d faces, %d vertexes, %d lightmaps" % (
+        fileName, bsp.version, len(faces), len(bsp.lump(Q3BSP.Vertexes)),
+        len(bsp.lump(Q3BSP.Lightmaps)))
+    print "record [ms]: %8.3f" % (oldTime * 1000.0)
+    print "mapped [ms]: %8.3f" % (newTime * 1000.0)
+    print "speedup:     %7.1fx" % (oldTime / newTime)
+
+    # Pont - levél keresés: egyenkénti és kötegelt bejárás
+    leafs = bsp.lump(Q3BSP.Leafs)
+    lo, hi = leafs["minbb"].min(0), leafs["maxbb"].max(0)
+    points = numpy.random.uniform(lo, hi, (10000, 3))
+
+    scalarTime, scalar = bench(lambda: [bsp.findLeaf(p) for p in points.tolist()], 5)
+    batchTime, batch = bench(lambda: bsp.findLeaves(points), 5)
+    assert scalar == batch.tolist()
+
+    print "findLeaf   [ms]: %8.3f  (%d points)" % (scalarTime * 1000.0, len(points))
+    print "findLeaves [ms]: %8.3f" % (batchTime * 1000.0)
@@ -10,6 +10,9 @@ from ilo.structs.vector import *
 from ilo.messages.events import *
 from ilo.messages.exceptios import *
 from ilo.system.material import Texture
+from ilo.system.mesh import Mesh
+from ilo.system.gfx import GLContext
+from ilo.render.shadow import createShadowVolume
 
 
 """
@@ -28,7 +31,8 @@ class RenderObject(EventDispatcher):
     __slots__ = EventDispatcher.__slots__ + \
                 ('_id', '_name', '_parent', '_scene',
                  '_coord', '_scale', '_angle',
-                 '_geometry', '_material',
+                 '_geometry', '_material', '_lodLevel',
+                 '_castShadow', '_shadowVolumes',
                  '_showNormals', 'visible')
 
     def __init__(self, name="", geometry=None, material=None):
@@ -54,6 +58,9 @@ class RenderObject(EventDispatcher):
 
         self._geometry      = geometry                                          #:@ivar: Mesh objektum
         self._material      = material                                          #:@ivar: A geometrea anyagmintája
+        self._lodLevel      = 0                                                 #:@ivar: A geometria legutóbb használt részletességi szintje
+        self._castShadow    = False                                             #:@ivar: Vet-e árnyékot az objektum
+        self._shadowVolumes = {}                                                #:@ivar: Az objektum árnyéktérfogatai fényforrásonként, első használatkor készülnek
 
         self._showNormals   = False                                             #:@ivar: Mesh normálvektorok megjelenítése
         self.visible        = True                                              #:@ivar: Láthatóság
@@ -81,7 +88,7 @@ class RenderObject(EventDispatcher):
             else:
                 Texture.unbindTexture()
 
-            self._geometry.renderMesh()
+            self._renderGeometry()
 
             if self._showNormals:
                 self._geometry.renderNormalVectors()
@@ -90,6 +97,21 @@ class RenderObject(EventDispatcher):
                 self.dispatchEvent(Event(Event.RENDERED))
         glPopMatrix()
 
+    def _renderGeometry(self):
+        """
+        A geometria leképezése, C{Mesh} esetén a nézőpont távolságához illő
+        részletességi szinten
+
+        A nézőpontot az aktuális modelview mátrixból számoljuk, így az az
+        objektum saját koordináta-rendszerében van.
+        """
+        if isinstance(self._geometry, Mesh) and self._geometry.numOfLevels > 1:
+            eye = GLContext.getInstance().matrix.eyePosition()
+            self._lodLevel = self._geometry.selectLevel(eye, self._lodLevel)
+            self._geometry.renderMesh(level=self._lodLevel)
+        else:
+            self._geometry.renderMesh()
+
     @property
     def id(self):
         """Egyedi objektum azonosító"""
@@ -158,6 +180,56 @@ class RenderObject(EventDispatcher):
         """Az objektum anyagjellemzői"""
         return self._material
 
+    @property
+    def lodLevel(self):
+        """A geometria legutóbb leképezett részletességi szintje"""
+        return self._lodLevel
+
+    @property
+    def castShadow(self):
+        """Vet-e árnyékot az objektum"""
+        return self._castShadow
+
+    @castShadow.setter
+    def castShadow(self, value):
+        self._castShadow = bool(value)
+        if not value:
+            self._removeShadowVolume()
+
+    def getShadowVolume(self, lightId):
+        """
+        Az objektum árnyéktérfogata egy fényforráshoz
+
+        Fényforrásonként külön térfogat készül, így több árnyékot vető fény
+        esetén sem számoljuk újra képkockánként. A fénytől független
+        térfogatot (C{ShadowMesh}) a fények közösen használják.
+
+        @param  lightId:    A fényforrás OpenGL-es azonosítója
+        @type   lightId:    C{GLuint}
+
+        @return:            A térfogat, vagy C{None} ha az objektum nem vet
+                            árnyékot, vagy a geometriájának már nincsenek
+                            meg a CPU oldali adatai
+        @rtype:             C{ShadowVolume} vagy C{ShadowMesh}
+        """
+        volume = self._shadowVolumes.get(lightId)
+        if volume is None and self._castShadow and \
+           isinstance(self._geometry, Mesh) and self._geometry.hasData:
+            shared = [item for item in self._shadowVolumes.values()
+                      if not item.LIGHT_DEPENDENT]
+            volume = shared[0] if shared else createShadowVolume(self._geometry)
+            self._shadowVolumes[lightId] = volume
+        return volume
+
+    def _removeShadowVolume(self):
+        """
+        Az árnyéktérfogatok buffereinek törlése, a következő használatkor
+        újra elkészülnek
+        """
+        for volume in dict((id(item), item) for item in self._shadowVolumes.values()).values():
+            volume.remove()
+        self._shadowVolumes = {}
+
     @property
     def showNormals(self):
         """Az objektum normál vektorjainak megjelenítése"""
@@ -165,6 +237,11 @@ class RenderObject(EventDispatcher):
 
     @showNormals.setter
     def showNormals(self, value):
+        if value and isinstance(self._geometry, Mesh) and not self._geometry.hasData:
+            # a vonalakhoz a CPU oldali tömbök kellenek (resource.keepmeshdata)
+            print "A normalvektorok nem jelenithetok meg, a mesh CPU adatai " \
+                  "fel vannak szabaditva: %s" % self._name
+            return
         self._showNormals = value
 
         if self._geometry != None:
@@ -194,6 +271,7 @@ class RenderObject(EventDispatcher):
         """
         Az elemet töröltük az elemkonténerből
         """
+        self._removeShadowVolume()
         if self.hasEventListener(Event.REMOVE):
             self.dispatchEvent(Event(Event.REMOVE))
 
@@ -201,6 +279,7 @@ class RenderObject(EventDispatcher):
         """
         Az elemet törötltük a főszínről
         """
+        self._removeShadowVolume()
         if self.hasEventListener(Event.REMOVED_FROM_SCENE):
             self.dispatchEvent(Event(Event.REMOVED_FROM_SCENE))
 
@@ -334,7 +413,7 @@ class RenderObjectContainer(RenderObject):
             else:
                 Texture.unbindTexture()
 
-            self._geometry.renderMesh()
+            self._renderGeometry()
 
         glPopMatrix()
 
@@ -6,10 +6,12 @@ __date__ = "2009.07.20. 22:42:06"
 from PyQt4.QtOpenGL import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
+from ilo.config import Config
 from ilo.messages.events import *
 from ilo.system.gfx import *
 from ilo.system.camera import Camera
 from ilo.system.lights import LightLibraly
+from ilo.render.shadow import renderStencilShadows, renderShadowMap
 from ilo.structs.vector import Vector2
 
 class GLWidget(QGLWidget):
@@ -66,6 +68,8 @@ class GLWidget(QGLWidget):
         """
         Aktuális képkocka leképezése
         """
+        # a stencil árnyékokhoz végtelen távoli hátsó vágósík kell
+        self.gfx.viewport.infiniteFrustum = Config.getValue("render.shadows") == "stencil"
         self.gfx.beginRendering()
 
         #self.camera.updateFrustum()
@@ -76,11 +80,42 @@ class GLWidget(QGLWidget):
         self.__scene.render__()
         self.gfx.endMeshRenderPass()
 
+        self.__shadowPass()
+
         self.gfx.textRenderPass()
 
         self.gfx.endRendering()
 
 
+    def __shadowPass(self):
+        """
+        Árnyékok leképezése a C{render.shadows} beállítás szerint
+        (C{stencil}: árnyéktérfogatok, C{map}: árnyéktérképek)
+
+        Az árnyékot a bekapcsolt, C{castShadows} jelzésű fényforrások vetik,
+        ha egyik sem jelzett, a legkisebb azonosítójú bekapcsolt fényforrás.
+        A fények helyzetét a színben legutóbb beállított C{GL_POSITION} adja
+        (kamera koordinátákban).
+        """
+        mode = Config.getValue("render.shadows")
+        if mode not in ("stencil", "map"):
+            return
+        lights = [light for light in self.lights.getLinkedLightObjects() if light.active]
+        casting = [light for light in lights if light.castShadows]
+        if not casting and lights:
+            casting = [min(lights, key=lambda item: item.lightId)]
+
+        for light in casting:
+            lightEye = glGetLightfv(light.lightId, GL_POSITION)
+            if mode == "stencil":
+                renderStencilShadows(self.__scene, lightEye, light.lightId)
+            else:
+                spotDirection = None
+                if light.isSpot:
+                    spotDirection = glGetLightfv(light.lightId, GL_SPOT_DIRECTION)
+                renderShadowMap(self.__scene, light, lightEye, spotDirection)
+
+
     def resizeGL(self, width, height):
         """
         Ablakátméretezés
@@ -92,7 +127,8 @@ class GLWidget(QGLWidget):
         @param  height: Az ablak új magassága
         @type   height: C{int}
         """
-        self.gfx.viewport.setViewport(0, 0, width, height)
+        self.gfx.viewport.setViewport(0, 0, width, height,
+                                      Config.getValue("render.shadows") == "stencil")
         self.gfx.matrix.setMatrixMode(Gfx.MODELVIEW)
 
         self.disp.dispatchEvent(WindowEvent(WindowEvent.RESIZE, 0, 0, width, height))
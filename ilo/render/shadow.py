@@ -1,157 +1,931 @@
-# To change this template, choose Tools | Templates
-# and open the template in the editor.
+# -*- coding: utf -*-
 
 __author__="max"
 __date__ ="$2009.10.29. 13:50:50$"
 
-from ilo.tools.ilomath import *
+import ctypes
+import numpy
 from OpenGL.GL import *
 from OpenGL.raw.GL.VERSION.GL_3_0 import *
 
-from ilo.config import *
+from ilo.config import Config
 from ilo.messages.exceptios import IloError
-from ilo.structs.vector import *
+from ilo.system.material import Shader
+from ilo.system.mesh import Mesh
 
+"""
+Árnyékok: stencil árnyéktérfogatok (z-fail) és árnyéktérképek
 
-def drawShadowVolume(geom, renderObj, light ):
+Az árnyéktérfogatot a fény felé néző lapok (elülső fedőlap), ugyanezek a
+végtelenbe vetítve, fordított körüljárással (hátsó fedőlap), és a
+sziluett élekből a végtelenbe húzott oldallapok alkotják. A végtelen
+távoli pontok homogén koordinátája 0, ezért a leképezéshez végtelen
+távoli hátsó vágósíkú vetítés kell (lásd C{Viewport.setViewport}).
+
+A térfogat kétféleképpen készülhet:
+ - C{ShadowVolume}: a CPU számolja a fény minden elmozdulásakor és
+   feltölti a háromszögeit
+ - C{ShadowMesh}: egyszer előkészített, minden élén elfajuló négyszöget
+   tartalmazó háló, a kihúzást a vertex shader végzi a fény helyzete
+   alapján, így képkockánként csak egy rajzolás kell
+
+Everitt, Kilgard: I{Practical and Robust Stenciled Shadow Volumes for
+Hardware-Accelerated Rendering}, 2002.
+Brabec, Seidel: I{Shadow Volumes on Programmable Graphics Hardware}, 2003.
+
+A C{render.shadows = "map"} beállításnál a térfogatok helyett
+fényforrásonként egy árnyéktérkép (C{ShadowMap}) készül.
+"""
+
+__extrude_vertex_shader__ = """
+uniform vec4 light;
+
+void main()
+{
+    // gl_MultiTexCoord0: a csucs lapjanak sikja
+    if (dot(gl_MultiTexCoord0, light) > 0.0)
+        gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+    else
+        gl_Position = gl_ModelViewProjectionMatrix *
+                      vec4(gl_Vertex.xyz * light.w - light.xyz, 0.0);
+}
+"""
+
+__extrude_fragment_shader__ = """
+void main()
+{
+    gl_FragColor = vec4(0.0);
+}
+"""
+
+
+def _facePlanes(vertex, face):
+    """
+    A lapok körüljárásból számolt síkjai
+
+    @return:    C{(m, 4)} tömb, a normálisok egységnyiek
+    @rtype:     C{numpy.ndarray}
+    """
+    tri    = vertex[face]
+    normal = numpy.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = numpy.sqrt((normal * normal).sum(1))
+    normal = normal / numpy.where(length > 0, length, 1.0)[:, None]
+    return numpy.column_stack((normal, -(normal * tri[:, 0]).sum(1)))
+
+
+def _lightKey(light):
+    """
+    A fény objektumkoordinátáinak kulcsa a gyorsítótárhoz
+
+    @rtype: C{numpy.ndarray}
+    """
+    light = numpy.asarray(light, dtype=numpy.float64)
+    if light[3] != 0.0:
+        return light / light[3]
+    return light / max(numpy.sqrt((light[:3] * light[:3]).sum()), 1e-12)
+
+
+class ShadowVolume(object):
+    """
+    Egy mesh árnyéktérfogata egy fényforráshoz
+
+    A térfogatot a fény objektumkoordinátáira számoljuk, és csak akkor
+    számoljuk újra, ha ezek megváltoznak (mozog a fény vagy az objektum). A
+    fény felé néző lapokat egyetlen skaláris szorzattal, a sziluett éleket
+    az élek két lapjának kizáró vagyával választjuk ki.
+    """
+
+    __slots__ = ('__mesh', '__planes', '__light', '__vao', '__vbo', '__count')
+
+    VOLUME_EPSILON = 1e-6                                                       #:@cvar: Ekkora eltérésig a fény helyzetét változatlannak tekintjük
+    LIGHT_DEPENDENT = True                                                      #:@cvar: A térfogat egy fényforráshoz tartozik
+
+    def __init__(self, mesh):
+        """
+        Árnyéktérfogat inicializálása
+
+        @param  mesh:   Az árnyékot vető mesh, a CPU oldali tömbjeivel
+        @type   mesh:   C{Mesh}
+        """
+        vertex = mesh.vertexArray.astype(numpy.float64)
+
+        self.__mesh     = mesh                                                  #:@ivar: Az árnyékot vető mesh
+        self.__planes   = _facePlanes(vertex, mesh.faceArray)                   #:@ivar: A lapok síkjai a körüljárásból C{(m, 4)}
+        self.__light    = None                                                  #:@ivar: A legutóbbi fény helyzet objektumkoordinátákban
+        self.__vao      = None                                                  #:@ivar: A térfogat Vertex Array Objektum-a
+        self.__vbo      = None                                                  #:@ivar: A térfogat homogén csúcsainak buffere
+        self.__count    = 0                                                     #:@ivar: A térfogat csúcsainak száma
+
+
+    def build(self, light):
+        """
+        Az árnyéktérfogat háromszögeinek számítása
+
+        @param  light:  A fény homogén koordinátái az objektum
+                        koordináta-rendszerében (C{w = 0} irányfény)
+        @type   light:  C{numpy.ndarray}
+
+        @return:        A háromszögek homogén csúcsai C{(k, 4)} C{float32}
+                        tömbben
+        @rtype:         C{numpy.ndarray}
+        """
+        light  = numpy.asarray(light, dtype=numpy.float64)
+        vertex = self.__mesh.vertexArray.astype(numpy.float64)
+        face   = self.__mesh.faceArray
+        edge   = self.__mesh.edgeArray
+
+        lit = numpy.dot(self.__planes, light) > 0.0
+        f0, f1 = edge[:, 2], edge[:, 3]
+        lit0 = lit[f0]
+        lit1 = numpy.where(f1 >= 0, lit[numpy.maximum(f1, 0)], False)
+        silhouette = lit0 ^ lit1
+
+        # az él iránya az első lap körüljárása, a megvilágított lapé kell
+        v0, v1 = edge[silhouette, 0], edge[silhouette, 1]
+        forward = lit0[silhouette]
+        a, b = numpy.where(forward, v0, v1), numpy.where(forward, v1, v0)
+
+        def extrude(points):
+            return numpy.column_stack((points * light[3] - light[:3],
+                                       numpy.zeros(len(points))))
+
+        def finite(points):
+            return numpy.column_stack((points, numpy.ones(len(points))))
+
+        pa, pb = vertex[a], vertex[b]
+        sides = numpy.concatenate((finite(pb), finite(pa), extrude(pa),
+                                   finite(pb), extrude(pa), extrude(pb)), 1)
+
+        caps = vertex[face[lit]].reshape(-1, 3)
+        parts = [sides.reshape(-1, 4), finite(caps)]
+        if light[3] != 0.0:
+            # irányfénynél a hátsó fedőlap egyetlen végtelen távoli pont
+            parts.append(extrude(caps).reshape(-1, 3, 4)[:, ::-1].reshape(-1, 4))
+        return numpy.concatenate(parts).astype(numpy.float32)
+
+
+    def update(self, light):
+        """
+        A térfogat frissítése, ha a fény helyzete megváltozott
+
+        @param  light:  A fény homogén koordinátái az objektum
+                        koordináta-rendszerében
+        @type   light:  C{numpy.ndarray}
+
+        @return:        C{True} ha újra kellett számolni
+        @rtype:         C{bool}
+        """
+        key = _lightKey(light)
+        if self.__light is not None and \
+           numpy.abs(key - self.__light).max() <= ShadowVolume.VOLUME_EPSILON:
+            return False
+        self.__light = key
+
+        data = self.build(light)
+        if self.__vao is None:
+            vao = numpy.zeros(1, numpy.uint32)
+            glGenVertexArrays(1, vao)
+            self.__vao = int(vao[0])
+            self.__vbo = glGenBuffers(1)
+            glBindVertexArray(self.__vao)
+            glBindBuffer(GL_ARRAY_BUFFER, self.__vbo)
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glVertexPointer(4, GL_FLOAT, 0, None)
+            glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo)
+        glBufferData(GL_ARRAY_BUFFER, data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.__count = len(data)
+        return True
+
+
+    def render(self):
+        """
+        A térfogat háromszögeinek kirajzolása
+        """
+        if self.__count:
+            glBindVertexArray(self.__vao)
+            glDrawArrays(GL_TRIANGLES, 0, self.__count)
+
+
+    def remove(self):
+        """
+        A térfogat buffereinek törlése
+        """
+        if self.__vao is not None:
+            glDeleteVertexArrays(1, numpy.array([self.__vao], numpy.uint32))
+            glDeleteBuffers([self.__vbo])
+            self.__vao = self.__vbo = None
+            self.__light = None
+            self.__count = 0
+
+    @property
+    def numOfTriangles(self):
+        """A térfogat háromszögeinek száma"""
+        return self.__count // 3
+
+
+class ShadowMesh(object):
+    """
+    Vertex shaderrel kihúzott árnyéktérfogat
+
+    Minden lap saját csúcsokat kap, a csúcsok a lap síkját is hordozzák
+    (C{gl_MultiTexCoord0}). Minden él mentén a két lap csúcsai közé
+    elfajuló (nulla területű) négyszöget teszünk. Nyitott hálónál a lapok
+    fordított körüljárású párjait is hozzávesszük, így a nyitott él másik
+    oldala a lap párja. A shader a fénytől elforduló lapok csúcsait
+    a végtelenbe húzza: ezek adják a hátsó fedőlapot, a sziluett élek
+    négyszögei pedig az oldallapokat. A háló a fénytől független, ezért
+    egyszer töltjük fel.
+    """
+
+    __slots__ = ('__vao', '__vbo', '__ibo', '__count', '__indexType', '__light')
+
+    VERTEX_TYPE = numpy.dtype([("position", numpy.float32, 3),
+                               ("plane",    numpy.float32, 4)])                 #:@cvar: A csúcs rekordok típusa
+    LIGHT_DEPENDENT = False                                                     #:@cvar: A háló a fényforrásoktól független, közösen használható
+
+    __shader  = None
+    __lightLocation = -1
+
+    def __init__(self, mesh):
+        """
+        Az árnyékháló előkészítése és feltöltése
+
+        @param  mesh:   Az árnyékot vető mesh, a CPU oldali tömbjeivel
+        @type   mesh:   C{Mesh}
+        """
+        data, indices = ShadowMesh.build(mesh.vertexArray, mesh.faceArray, mesh.edgeArray)
+        indexType = GL_UNSIGNED_INT
+        if len(data) <= 0x10000:
+            indices = indices.astype(numpy.uint16)
+            indexType = GL_UNSIGNED_SHORT
+
+        vao = numpy.zeros(1, numpy.uint32)
+        glGenVertexArrays(1, vao)
+        self.__vao       = int(vao[0])                                          #:@ivar: Az árnyékháló Vertex Array Objektum-a
+        self.__vbo       = glGenBuffers(1)                                      #:@ivar: A csúcs rekordok buffere
+        self.__ibo       = glGenBuffers(1)                                      #:@ivar: A háromszögek index buffere
+        self.__count     = len(indices)                                         #:@ivar: Az indexek száma
+        self.__indexType = indexType                                            #:@ivar: Az index buffer elemtípusa
+        self.__light     = None                                                 #:@ivar: A fény helyzete objektumkoordinátákban
+
+        glBindVertexArray(self.__vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.view(numpy.uint8), GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+
+        stride = ShadowMesh.VERTEX_TYPE.itemsize
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, None)
+        glTexCoordPointer(4, GL_FLOAT, stride,
+                          ctypes.c_void_p(ShadowMesh.VERTEX_TYPE.fields["plane"][1]))
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+
+    @staticmethod
+    def build(vertex, face, edge):
+        """
+        Az árnyékháló csúcsainak és háromszögeinek számítása
+
+        @param  vertex: Csúcs koordináták C{(n, 3)} tömbje
+        @type   vertex: C{numpy.ndarray}
+        @param  face:   A háromszögek csúcsindexeinek C{(m, 3)} tömbje
+        @type   face:   C{numpy.ndarray}
+        @param  edge:   Élek C{(v0, v1, f0, f1)} sorai (C{Mesh.edgeArray})
+        @type   edge:   C{numpy.ndarray}
+
+        @return:        A csúcs rekordok (C{VERTEX_TYPE}) és a háromszögek
+                        indexei
+        @rtype:         C{tuple}
+        """
+        vertex = numpy.asarray(vertex, dtype=numpy.float64)
+        face   = numpy.asarray(face, dtype=numpy.int64)
+        edge   = numpy.asarray(edge, dtype=numpy.int64)
+
+        # az él iránya az első lap körüljárása
+        a, b, f0, f1 = edge[:, 0], edge[:, 1], edge[:, 2], edge[:, 3]
+        closed = f1 >= 0
+        if not closed.all():
+            # nyitott hálónál a lapok fordított párjaival zárt, kétoldalú
+            # héjat képzünk: a nyitott él két oldala a lap és a párja
+            m = len(face)
+            face = numpy.concatenate((face, face[:, ::-1]))
+            edge = numpy.concatenate((edge[closed],
+                                      numpy.column_stack((b, a, f0 + m, f1 + m))[closed],
+                                      numpy.column_stack((a, b, f0, f0 + m))[~closed]))
+            a, b, f0, f1 = edge[:, 0], edge[:, 1], edge[:, 2], edge[:, 3]
+
+        def corner(f, v):
+            return 3 * f + numpy.argmax(face[f] == v[:, None], axis=1)
+
+        data = numpy.zeros(len(face) * 3, ShadowMesh.VERTEX_TYPE)
+        data["position"] = vertex[face].reshape(-1, 3)
+        data["plane"]    = numpy.repeat(_facePlanes(vertex, face), 3, axis=0)
+
+        quads = numpy.column_stack((corner(f0, b), corner(f0, a), corner(f1, a),
+                                    corner(f0, b), corner(f1, a), corner(f1, b)))
+        indices = numpy.concatenate((numpy.arange(len(face) * 3), quads.ravel()))
+        return data, indices.astype(numpy.uint32)
+
+
+    @classmethod
+    def shader(cls):
+        """
+        A kihúzást végző, közös shader program (első használatkor fordul)
+
+        @rtype: C{Shader}
+        """
+        if cls.__shader is None:
+            cls.__shader = Shader(__extrude_vertex_shader__, __extrude_fragment_shader__)
+            cls.__lightLocation = cls.__shader.getUniformLocation("light")
+        return cls.__shader
+
+
+    def update(self, light):
+        """
+        A fény helyzetének megjegyzése a következő rajzoláshoz, a háló nem
+        változik
+
+        @param  light:  A fény homogén koordinátái az objektum
+                        koordináta-rendszerében
+        @type   light:  C{numpy.ndarray}
+
+        @return:        Mindig C{False}, nincs újraszámolás
+        @rtype:         C{bool}
+        """
+        self.__light = numpy.asarray(light, dtype=numpy.float32)
+        return False
+
+
+    def render(self):
+        """
+        Az árnyékháló kirajzolása a kihúzó shaderrel
+        """
+        if self.__light is None:
+            return
+        ShadowMesh.shader().bindShader()
+        glUniform4f(ShadowMesh.__lightLocation, *self.__light.tolist())
+        glBindVertexArray(self.__vao)
+        glDrawElements(GL_TRIANGLES, self.__count, self.__indexType, None)
+
+
+    def remove(self):
+        """
+        Az árnyékháló buffereinek törlése
+        """
+        if self.__vao is not None:
+            glDeleteVertexArrays(1, numpy.array([self.__vao], numpy.uint32))
+            glDeleteBuffers([self.__vbo, self.__ibo])
+            self.__vao = self.__vbo = self.__ibo = None
+            self.__count = 0
+
+    @property
+    def numOfTriangles(self):
+        """Az árnyékháló háromszögeinek száma (az elfajulókkal együtt)"""
+        return self.__count // 3
+
+
+def createShadowVolume(mesh):
+    """
+    Árnyéktérfogat készítése egy mesh-hez
+
+    Ha a shaderek engedélyezettek (C{render.shader}) és a
+    C{render.shadowshader} be van kapcsolva, a vertex shaderrel kihúzott
+    C{ShadowMesh}, különben a CPU-n számolt C{ShadowVolume} készül.
+
+    @param  mesh:   Az árnyékot vető mesh, a CPU oldali tömbjeivel
+    @type   mesh:   C{Mesh}
+
+    @rtype:         C{ShadowVolume} vagy C{ShadowMesh}
+    """
+    if Config.getValue("render.shader") and Config.getValue("render.shadowshader"):
+        return ShadowMesh(mesh)
+    return ShadowVolume(mesh)
+
+
+def objectLight(lightEye, modelview):
+    """
+    A fény helyzete egy objektum koordináta-rendszerében
+
+    @param  lightEye:   A fény homogén koordinátái a kamera
+                        koordináta-rendszerében (C{GL_POSITION})
+    @type   lightEye:   C{list}
+    @param  modelview:  Az objektum modelview mátrixa (C{glGetDoublev}
+                        alakban)
+    @type   modelview:  C{numpy.ndarray}
+
+    @rtype:             C{numpy.ndarray}
+    """
+    return numpy.dot(numpy.asarray(lightEye, numpy.float64),
+                     numpy.linalg.inv(numpy.asarray(modelview, numpy.float64)))
+
+
+def collectGeometries(element, castersOnly=False, result=None):
+    """
+    A látható mesh geometriájú objektumok összegyűjtése a hierarchia
+    bejárásával, a leképezéssel azonos transzformációkkal
+
+    @param  element:        A bejárás kezdő eleme
+    @type   element:        C{RenderObject}
+    @param  castersOnly:    Csak az árnyékot vető objektumok
+    @type   castersOnly:    C{bool}
+    @param  result:         Ide kerülnek a C{(modelview, RenderObject)} párok
+    @type   result:         C{list}
+
+    @return:                A C{result} lista
+    @rtype:                 C{list}
+    """
+    if result is None:
+        result = []
     glPushMatrix()
-    #glLoadIdentity()
-    light = light[0].link
-    coord = Vector3([-100.0,-50.0,100.0])
+    glTranslate(*element.coord)
+    glRotate(element.angle[0], 1.0, 0.0, 0.0)
+    glRotate(element.angle[1], 0.0, 1.0, 0.0)
+    glRotate(element.angle[2], 0.0, 0.0, 1.0)
+    glScale(*element.scale)
+
+    for child in getattr(element, "elementList", ()):
+        collectGeometries(child, castersOnly, result)
 
+    if element.visible and isinstance(element.geometry, Mesh) and \
+       (element.castShadow or not castersOnly):
+        result.append((glGetDoublev(GL_MODELVIEW_MATRIX), element))
+    glPopMatrix()
+    return result
 
-    #light.coord = light.coord + renderObj.coord* renderObj.scale
-    glBegin(GL_POINTS)
-    glColor(1.,1.,0.)
-    glVertex(coord)
 
-    glColor(1.,1.,1.)
-    glVertex(coord *10)
-    glEnd()
+def renderStencilShadows(scene, lightEye, lightId=0):
+    """
+    Stencil árnyékok leképezése (z-fail) a már kirajzolt szín fölé
+
+     1. a térfogatok hátsó lapjai növelik, az elülső lapjai csökkentik a
+        stencil értéket, ahol a mélységteszt nem teljesül
+     2. a nem nulla stencil értékű pixeleket a C{render.shadowdarkness}
+        mértékben elsötétítjük
 
-    
-
-    if False:
-        # extrude vertices
-
-        # NOTE that for directional lights all vertices will be extruded
-        # to the same point, so in that case you do not need to
-        # calculate this array.  We do not implement this optimization.
-        def directionToPoint(light, vertex):
-            if light.isDirectionalLight:
-                return Vector3(coord) * -1
-            else:
-                return (vertex.vert - Vector3(coord))
-
-
-        def extrudVertex(item):
-            return directionToPoint(light, item)
-
-        def backFace(item):
-            #print item.norm,  extrudedVertex[item.verts[0].index], item.norm * extrudedVertex[item.verts[0].index]
-            return ((item.norm * extrudedVertex[item.verts[0].index]) > 0).any()
-        
-        def getEdge(item):
-            return isBackface[item.faces[0]] ^ isBackface[item.faces[1]]
-
-        extrudedVertex = map(extrudVertex, geom.vertexes)
-        isBackface = map(backFace,geom.faces)
-        silhouetteEdge = filter(getEdge, geom.edges)
-
-        #print "---------------------------------------"
-
-        for x in extrudedVertex:
-            glBegin(GL_LINES)
-            glColor(0.0, 1.0,0.0)
-            glVertex(coord)
-            glVertex(coord + x)
-            glEnd()
-
-
-    #geom.extrusionDirty = False
-
-    if False:
-        # find silhouette edges and extrude them into faces
-        glBegin(GL_LINES)
-        for edge in silhouetteEdge:
-            reg0 = (edge.verts[0].vert.tolist() + [1.0])
-            reg1 = (edge.verts[1].vert.tolist() + [1.0])
-            ext0 = (edge.verts[0].vert.tolist() + [0.0])
-            ext1 = (edge.verts[1].vert.tolist() + [0.0])
-
-            glColor(1.,1.,0.)
-            glVertex(edge.verts[0].vert)
-            glVertex(edge.verts[1].vert)
-
-#            if isBackface[edge.faces[0]]:
-#                glColor(1.0, 0.0,0.0)
-#                glVertex(reg0)
-#                glVertex(ext1)
-#                glVertex(reg1)
-#                glVertex(ext0)
-#            else:
-#                glColor(0.0,1.0,1.0)
-#                glVertex(reg1)
-#                glVertex(ext0)
-#                glVertex(reg0)
-#                glVertex(ext1)
-        glEnd()
+    @param  scene:      A fő szín
+    @type   scene:      C{RenderScene}
+    @param  lightEye:   Az árnyékot vető fény homogén koordinátái a kamera
+                        koordináta-rendszerében
+    @type   lightEye:   C{list}
+    @param  lightId:    Az árnyékot vető fény OpenGL-es azonosítója, ehhez
+                        tartoznak az objektumok árnyéktérfogatai
+    @type   lightId:    C{GLuint}
+
+    @return:            Az árnyékot vető objektumok száma
+    @rtype:             C{int}
+    """
+    casters = []
+    for modelview, element in collectGeometries(scene, True):
+        volume = element.getShadowVolume(lightId)
+        if volume is not None:
+            volume.update(objectLight(lightEye, modelview))
+            casters.append((modelview, volume))
+    if not casters:
+        return 0
+
+    glPushAttrib(GL_ALL_ATTRIB_BITS)
+    glDisable(GL_LIGHTING)
+    glDisable(GL_TEXTURE_2D)
+    glStencilMask(0xff)
+    glClear(GL_STENCIL_BUFFER_BIT)
+
+    glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+    glDepthMask(GL_FALSE)
+    glDepthFunc(GL_LESS)
+    glEnable(GL_STENCIL_TEST)
+    glStencilFunc(GL_ALWAYS, 0, 0xff)
+    glEnable(GL_POLYGON_OFFSET_FILL)
+    glPolygonOffset(0.0, 1.0)
+    glEnable(GL_CULL_FACE)
+
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    for cullFace, stencilOp in ((GL_FRONT, GL_INCR_WRAP), (GL_BACK, GL_DECR_WRAP)):
+        glCullFace(cullFace)
+        glStencilOp(GL_KEEP, stencilOp, GL_KEEP)
+        for modelview, volume in casters:
+            glLoadMatrixd(modelview)
+            volume.render()
+    glBindVertexArray(0)
+    Shader.unbindShader()
+
+    # elsötétítés a teljes képernyőn, ahol a stencil nem nulla
+    glColorMask(GL_TRUE, GL_TRUE, GL_TRUE, GL_TRUE)
+    glDisable(GL_CULL_FACE)
+    glDisable(GL_DEPTH_TEST)
+    glStencilFunc(GL_NOTEQUAL, 0, 0xff)
+    glStencilOp(GL_KEEP, GL_KEEP, GL_KEEP)
+    glEnable(GL_BLEND)
+    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    glColor4f(0.0, 0.0, 0.0, Config.getValue("render.shadowdarkness"))
+
+    glLoadIdentity()
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glBegin(GL_TRIANGLE_STRIP)
+    glVertex2f(-1.0, -1.0)
+    glVertex2f( 1.0, -1.0)
+    glVertex2f(-1.0,  1.0)
+    glVertex2f( 1.0,  1.0)
+    glEnd()
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
     glPopMatrix()
-        # draw front cap
-#        if frontCap:
-#            glBegin(GL_TRIANGLES)
-#            for i in xrange(len(geom.__face)):
-#                if not isBackface[i]:
-#                    for j in xrange(3):
-#                        glVertex(geom.__vertex[geom.__face[i][j]])
-#                    polyCount += 1
-#            glEnd()
-#
-#        useBackCapOptimization = False
-#
-#        if light.isDirectionalLight:
-#            # we can actually skip the back cap entirely
-#            # in this case
-#            useBackCapOptimization = True
-#        else:
-#            # if we have a point light and we are doing shadow
-#            # optimizations then we can use the fan optimization
-#            # if the point light is outside of the bounding sphere
-#            # of the model, (the OpenGL specifications do not require
-#            # correct rendering of triangles at inifinity that span
-#            # larger then 180 degrees)
-#            lightPos = Vector3(light.coord[0:3])
-#
-#            # light and lightPos are in object space
-#            useBackCapOptimization = ((lightPos - geom.boundingSphere.center).length() > geom.boundingSphere.radius)
-
-        # draw back cap
-        # if we are using a directional light the end cap
-        # will be infinitely small and we don't have to draw it
-#        if endCap and not light.isDirectionalLight:
-#            # draw back cap
-#            if useBackCapOptimization:
-#                # optimized triangle fan for back cap
-#                firstPoint = extrudedVertex[geom.__edge[0].vertex[0]] + [0]
-#                glBegin(GL_TRIANGLES)
-#                for edge in silhouetteEdge:
-#                    vIndex0 = edge.vertex[0]
-#                    vIndex1 = edge.vertex[1]
-#                    glVertex(firstPoint)
-#                    if isBackface[edge.face[0]]:
-#                        glVertex(extrudedVertex[vIndex0] + [0])
-#                        glVertex(extrudedVertex[vIndex1] + [0])
-#                    else:
-#                        glVertex(extrudedVertex[vIndex1] + [0])
-#                        glVertex(extrudedVertex[vIndex0] + [0])
-#                    polyCount += 1
-#                glEnd()
-#            else:
-#                # unoptimized back faces for back cap
-#                glBegin(GL_TRIANGLES)
-#                for i in xrange(len(geom.__face)):
-#                    if isBackface[i]:
-#                        for j in xrange(3):
-#                            glVertex(geom.__vertex[geom.__face[i][j]] + [0])
-#                        polyCount += 1
-#                glEnd()
\ No newline at end of file
+
+    glPopAttrib()
+    return len(casters)
+
+
+__shadowmap_vertex_shader__ = """
+uniform mat4 shadowMatrix;
+varying vec4 shadowCoord;
+
+void main()
+{
+    // shadowMatrix: kamera koordinatakbol az arnyekterkep terebe
+    shadowCoord = shadowMatrix * (gl_ModelViewMatrix * gl_Vertex);
+    gl_Position = ftransform();
+}
+"""
+
+__shadowmap_fragment_shader__ = """
+uniform sampler2DShadow shadowMap;
+uniform float texelSize;
+uniform int kernel;
+uniform float darkness;
+varying vec4 shadowCoord;
+
+void main()
+{
+    if (shadowCoord.w <= 0.0)
+        discard;
+    vec3 coord = shadowCoord.xyz / shadowCoord.w;
+    // a fenytol a terkep tavoli vagosikjanal messzebb levo pontok is
+    // arnyekban lehetnek
+    coord.z = min(coord.z, 1.0);
+
+    float lit = 0.0;
+    for (int y = -kernel; y <= kernel; y++)
+        for (int x = -kernel; x <= kernel; x++)
+            lit += shadow2D(shadowMap, coord + vec3(float(x), float(y), 0.0) * texelSize).r;
+    float taps = float((2 * kernel + 1) * (2 * kernel + 1));
+    gl_FragColor = vec4(0.0, 0.0, 0.0, darkness * (1.0 - lit / taps));
+}
+"""
+
+__shadowmap_bias__ = numpy.array([[0.5, 0.0, 0.0, 0.5],
+                                  [0.0, 0.5, 0.0, 0.5],
+                                  [0.0, 0.0, 0.5, 0.5],
+                                  [0.0, 0.0, 0.0, 1.0]])
+
+
+def _lookAt(eye, target):
+    """
+    A C{gluLookAt}-nak megfelelő nézeti mátrix (oszlopvektoros alak)
+
+    A felfelé mutató irány a nézési iránnyal legkevésbé párhuzamos
+    koordináta-tengely.
+
+    @rtype: C{numpy.ndarray}
+    """
+    forward = target - eye
+    forward = forward / max(numpy.sqrt((forward * forward).sum()), 1e-12)
+    up      = numpy.eye(3)[numpy.argmin(numpy.abs(forward))]
+    side    = numpy.cross(forward, up)
+    side    = side / numpy.sqrt((side * side).sum())
+    up      = numpy.cross(side, forward)
+
+    view = numpy.eye(4)
+    view[0, :3], view[1, :3], view[2, :3] = side, up, -forward
+    view[:3, 3] = -numpy.dot(view[:3, :3], eye)
+    return view
+
+
+def _perspective(fov, near, far):
+    """
+    A C{gluPerspective}-nek megfelelő négyzetes vetítés (oszlopvektoros alak)
+
+    @rtype: C{numpy.ndarray}
+    """
+    f = 1.0 / numpy.tan(numpy.radians(fov) * 0.5)
+    return numpy.array([[f,   0.0, 0.0, 0.0],
+                        [0.0, f,   0.0, 0.0],
+                        [0.0, 0.0, (far + near) / (near - far), 2.0 * far * near / (near - far)],
+                        [0.0, 0.0, -1.0, 0.0]])
+
+
+def _ortho(size, near, far):
+    """
+    A C{glOrtho}-nak megfelelő, origóra szimmetrikus vetítés
+
+    @rtype: C{numpy.ndarray}
+    """
+    return numpy.array([[1.0 / size, 0.0, 0.0, 0.0],
+                        [0.0, 1.0 / size, 0.0, 0.0],
+                        [0.0, 0.0, -2.0 / (far - near), -(far + near) / (far - near)],
+                        [0.0, 0.0, 0.0, 1.0]])
+
+
+def lightFrustum(lightEye, spheres, spotDirection=None, spotCutOff=None):
+    """
+    Az árnyéktérkép nézeti és vetítési mátrixa
+
+    A frustum az árnyékot vetők befoglaló gömbjeit fogja közre, így a
+    térkép felbontása a vetőkre jut. Spot fénynél a fény kúpja, irányfénynél
+    párhuzamos vetítés a vetítés alapja.
+
+    @param  lightEye:       A fény homogén koordinátái a kamera
+                            koordináta-rendszerében
+    @type   lightEye:       C{list}
+    @param  spheres:        A vetők befoglaló gömbjei kamera koordinátákban,
+                            C{(középpont, sugár)} párok
+    @type   spheres:        C{list}
+    @param  spotDirection:  A spot fény iránya kamera koordinátákban, vagy
+                            C{None}
+    @type   spotDirection:  C{list}
+    @param  spotCutOff:     A spot fény nyílásszöge fokban
+    @type   spotCutOff:     C{float}
+
+    @return:                A C{(view, projection)} mátrixok oszlopvektoros
+                            alakban
+    @rtype:                 C{tuple}
+    """
+    light   = numpy.asarray(lightEye, numpy.float64)
+    centers = numpy.array([center for center, radius in spheres], numpy.float64)
+    radii   = numpy.array([radius for center, radius in spheres], numpy.float64)
+    center  = centers.mean(0)
+    radius  = max((numpy.sqrt(((centers - center) ** 2).sum(1)) + radii).max(), 1e-3)
+
+    if light[3] == 0.0:
+        direction = light[:3] / max(numpy.sqrt((light[:3] * light[:3]).sum()), 1e-12)
+        eye = center + direction * 2.0 * radius
+        return _lookAt(eye, center), _ortho(radius, radius, 3.0 * radius)
+
+    eye = light[:3] / light[3]
+    if spotDirection is not None:
+        target = eye + numpy.asarray(spotDirection, numpy.float64)[:3]
+        fov    = min(2.0 * spotCutOff, 170.0)
+    else:
+        target = center
+        distance = numpy.sqrt(((center - eye) ** 2).sum())
+        fov = 150.0
+        if distance > radius * 1.01:
+            fov = min(2.0 * numpy.degrees(numpy.arcsin(radius / distance)), fov)
+
+    view  = _lookAt(eye, target)
+    depth = -numpy.dot(numpy.column_stack((centers, numpy.ones(len(centers)))), view[2])
+    far   = max((depth + radii).max(), 1e-2)
+    near  = max((depth - radii).min(), far * 1e-3)
+    return view, _perspective(fov, near, far)
+
+
+class ShadowMap(object):
+    """
+    Egy fényforrás árnyéktérképe
+
+    Az árnyékot vetők mélységét a fény nézőpontjából egy mélység textúrába
+    (framebuffer objektum) képezzük le. A fő leképezés után a látható
+    objektumokat még egyszer kirajzoljuk egy shaderrel, ami a pixelek
+    fénytől mért mélységét a térképpel hasonlítja össze, a
+    C{render.shadowpcf} méretű szűrőablakban (percentage-closer filtering),
+    és az árnyékos arányban sötétít. A mélységet a C{ftransform} azonos
+    módon számolja, így a második menet C{GL_LEQUAL} mélységteszttel
+    pontosan a látható felületekre kerül.
+
+    Williams: I{Casting Curved Shadows on Curved Surfaces}, 1978.
+    Reeves, Salesin, Cook: I{Rendering Antialiased Shadows with Depth Maps},
+    1987.
+    """
+
+    __slots__ = ('__size', '__fbo', '__texture', '__matrix')
+
+    __shader    = None
+    __locations = {}
+
+    def __init__(self, size):
+        """
+        Az árnyéktérkép mélység textúrájának és framebuffer objektumának
+        létrehozása
+
+        @param  size:   A térkép felbontása pixelben
+        @type   size:   C{int}
+
+        @raise  IloError:   Ha a framebuffer nem használható
+        """
+        self.__size     = int(size)                                             #:@ivar: A térkép felbontása pixelben
+        self.__texture  = glGenTextures(1)                                      #:@ivar: A mélység textúra
+        self.__matrix   = None                                                  #:@ivar: A kamera koordinátákból a térkép terébe képező mátrix
+
+        glBindTexture(GL_TEXTURE_2D, self.__texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_DEPTH_COMPONENT24, self.__size, self.__size, 0,
+                     GL_DEPTH_COMPONENT, GL_UNSIGNED_INT, None)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_BORDER)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_BORDER)
+        glTexParameterfv(GL_TEXTURE_2D, GL_TEXTURE_BORDER_COLOR, [1.0, 1.0, 1.0, 1.0])
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_COMPARE_MODE, GL_COMPARE_R_TO_TEXTURE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_COMPARE_FUNC, GL_LEQUAL)
+        glTexParameteri(GL_TEXTURE_2D, GL_DEPTH_TEXTURE_MODE, GL_INTENSITY)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        fbo = numpy.zeros(1, numpy.uint32)
+        glGenFramebuffers(1, fbo)
+        self.__fbo = int(fbo[0])                                                #:@ivar: A mélység textúrát tartalmazó framebuffer
+        glBindFramebuffer(GL_FRAMEBUFFER, self.__fbo)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_TEXTURE_2D,
+                               self.__texture, 0)
+        glDrawBuffer(GL_NONE)
+        glReadBuffer(GL_NONE)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.remove()
+            raise IloError("Hianyos arnyekterkep framebuffer: 0x%x" % status)
+
+
+    @classmethod
+    def shader(cls):
+        """
+        Az árnyéktérképet mintavételező, közös shader program (első
+        használatkor fordul)
+
+        @rtype: C{Shader}
+        """
+        if cls.__shader is None:
+            cls.__shader = Shader(__shadowmap_vertex_shader__, __shadowmap_fragment_shader__)
+            for name in ("shadowMatrix", "shadowMap", "texelSize", "kernel", "darkness"):
+                cls.__locations[name] = cls.__shader.getUniformLocation(name)
+        return cls.__shader
+
+
+    def renderDepth(self, casters, lightEye, spotDirection=None, spotCutOff=None):
+        """
+        Az árnyékot vetők mélységének leképezése a térképbe
+
+        @param  casters:        Az árnyékot vetők C{(modelview, RenderObject)}
+                                párjai (C{collectGeometries})
+        @type   casters:        C{list}
+        @param  lightEye:       A fény homogén koordinátái a kamera
+                                koordináta-rendszerében
+        @type   lightEye:       C{list}
+        @param  spotDirection:  A spot fény iránya kamera koordinátákban
+        @type   spotDirection:  C{list}
+        @param  spotCutOff:     A spot fény nyílásszöge fokban
+        @type   spotCutOff:     C{float}
+        """
+        spheres = []
+        for modelview, element in casters:
+            matrix = numpy.asarray(modelview, numpy.float64)
+            sphere = element.geometry.boundingSphere
+            center = numpy.dot(list(sphere.center) + [1.0], matrix)[:3]
+            scale  = numpy.sqrt((matrix[:3, :3] ** 2).sum(1)).max()
+            spheres.append((center, sphere.radius * scale))
+
+        view, projection = lightFrustum(lightEye, spheres, spotDirection, spotCutOff)
+        self.__matrix = numpy.dot(__shadowmap_bias__, numpy.dot(projection, view))
+
+        glPushAttrib(GL_ALL_ATTRIB_BITS)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.__fbo)
+        glViewport(0, 0, self.__size, self.__size)
+        glDepthMask(GL_TRUE)
+        glClear(GL_DEPTH_BUFFER_BIT)
+        glColorMask(GL_FALSE, GL_FALSE, GL_FALSE, GL_FALSE)
+        glEnable(GL_DEPTH_TEST)
+        glDepthFunc(GL_LESS)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_TEXTURE_2D)
+        glDisable(GL_CULL_FACE)
+        glEnable(GL_POLYGON_OFFSET_FILL)
+        glPolygonOffset(2.0, 4.0)
+        Shader.unbindShader()
+
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadMatrixd(projection.T)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        for modelview, element in casters:
+            glLoadMatrixd(numpy.dot(view, numpy.asarray(modelview, numpy.float64).T).T)
+            element.geometry.renderMesh(level=element.lodLevel)
+        glBindVertexArray(0)
+        glPopMatrix()
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glPopAttrib()
+
+
+    def renderReceivers(self, receivers):
+        """
+        A látható objektumok elsötétítése az árnyékos arányukban
+
+        @param  receivers:  A látható objektumok C{(modelview, RenderObject)}
+                            párjai (C{collectGeometries})
+        @type   receivers:  C{list}
+        """
+        if self.__matrix is None:
+            return
+        kernel = max(int(Config.getValue("render.shadowpcf")), 1) // 2
+
+        glPushAttrib(GL_ALL_ATTRIB_BITS)
+        glDisable(GL_LIGHTING)
+        glDepthMask(GL_FALSE)
+        glDepthFunc(GL_LEQUAL)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        ShadowMap.shader().bindShader()
+        locations = ShadowMap.__locations
+        glUniformMatrix4fv(locations["shadowMatrix"], 1, GL_FALSE,
+                           numpy.ascontiguousarray(self.__matrix.T, numpy.float32))
+        glUniform1i(locations["shadowMap"], 0)
+        glUniform1f(locations["texelSize"], 1.0 / self.__size)
+        glUniform1i(locations["kernel"], kernel)
+        glUniform1f(locations["darkness"], Config.getValue("render.shadowdarkness"))
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.__texture)
+
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        for modelview, element in receivers:
+            glLoadMatrixd(modelview)
+            element.geometry.renderMesh(level=element.lodLevel)
+        glBindVertexArray(0)
+        glPopMatrix()
+
+        glBindTexture(GL_TEXTURE_2D, 0)
+        Shader.unbindShader()
+        glPopAttrib()
+
+
+    def remove(self):
+        """
+        A mélység textúra és a framebuffer törlése
+        """
+        if self.__fbo is not None:
+            glDeleteFramebuffers(1, numpy.array([self.__fbo], numpy.uint32))
+            self.__fbo = None
+        if self.__texture is not None:
+            glDeleteTextures([self.__texture])
+            self.__texture = None
+        self.__matrix = None
+
+    @property
+    def size(self):
+        """A térkép felbontása pixelben"""
+        return self.__size
+
+    @property
+    def shadowMatrix(self):
+        """A kamera koordinátákból a térkép terébe képező mátrix
+        (oszlopvektoros alak), vagy C{None} az első leképezés előtt"""
+        return self.__matrix
+
+
+def renderShadowMap(scene, light, lightEye, spotDirection=None):
+    """
+    Árnyéktérképes árnyékok leképezése a már kirajzolt szín fölé
+
+    A fény árnyéktérképe első használatkor, C{render.shadowmapsize}
+    felbontással készül, és a fényforrás C{shadowMap} attribútumába kerül.
+
+    @param  scene:          A fő szín
+    @type   scene:          C{RenderScene}
+    @param  light:          Az árnyékot vető fényforrás
+    @type   light:          C{LightObject}
+    @param  lightEye:       A fény homogén koordinátái a kamera
+                            koordináta-rendszerében
+    @type   lightEye:       C{list}
+    @param  spotDirection:  A spot fény iránya kamera koordinátákban, vagy
+                            C{None}
+    @type   spotDirection:  C{list}
+
+    @return:                Az árnyékot vető objektumok száma
+    @rtype:                 C{int}
+    """
+    receivers = collectGeometries(scene)
+    casters = [item for item in receivers if item[1].castShadow]
+    if not casters:
+        return 0
+
+    size = Config.getValue("render.shadowmapsize")
+    if light.shadowMap is not None and light.shadowMap.size != size:
+        light.shadowMap.remove()
+        light.shadowMap = None
+    if light.shadowMap is None:
+        light.shadowMap = ShadowMap(size)
+
+    cutOff = light.spotCutOff if spotDirection is not None else None
+    light.shadowMap.renderDepth(casters, lightEye, spotDirection, cutOff)
+    light.shadowMap.renderReceivers(receivers)
+    return len(casters)
@@ -35,7 +35,7 @@ class Vertex(object):
         self.vert   = Vector3(vertex)                                           #:@ivar: Csúcspont koordinátái [x,y,z]
         self.norm   = None                                                      #:@ivar: A Normálvektor iránya [x,y,z]
 
-        if normal != None: self.norm = Vector3 (normal)
+        if normal is not None: self.norm = Vector3 (normal)
 
 
 
@@ -124,7 +124,7 @@ class Face(object):
         self.uvs      = uvs                                                     #:@ivar: A csúcspontok textúra koordinátái
         self.norm     = faceNormal                                              #:@ivar: A lap normálvektora
 
-        if self.norm == None:
+        if self.norm is None:
             A, B, C   = verteces
             norm = Vector3(np.cross((B.vert - A.vert), (C.vert - A.vert)))
             self.norm =  norm.normal
@@ -135,40 +135,145 @@ class Face(object):
 
 
 
-class BoundBox():
+def buildEdges(face, numVertex=None):
     """
-    Befoglaló doboz
+    Élek és a hozzájuk kapcsolódó lapok (szomszédság) meghatározása
+
+    A lapok irányított éleit rendezett csúcspárokká alakítjuk, a párokat
+    egy C{int64} kulcsba tömörítve C{np.unique}-kal csoportosítjuk. Az él
+    iránya és első lapja az első előfordulásé, a második lap a következő
+    előfordulásé. Nyitott élnél (egy lap) a második lap -1, kettőnél több
+    lapnál az él nem sokaság (non-manifold), ilyenkor a további lapok
+    elvesznek.
+
+    @param  face:       A háromszöglapok csúcsindexeinek C{(m, 3)} tömbje
+    @type   face:       C{numpy.ndarray}
+    @param  numVertex:  A csúcspontok száma, C{None} esetén a lapokból
+    @type   numVertex:  C{int}
+
+    @return:            Élenként a C{(v0, v1, f0, f1)} indexek C{(e, 4)}
+                        tömbje és az élhez kapcsolódó lapok száma
+    @rtype:             C{tuple}
     """
+    face = np.asarray(face, dtype=np.int64).reshape(-1, 3)
+    if len(face) == 0:
+        return np.zeros((0, 4), dtype=np.int32), np.zeros(0, dtype=np.int32)
+    if numVertex == None:
+        numVertex = int(face.max()) + 1
 
-    __slots__ = ('__minPoint', '__maxpoint', 'minpoint', 'maxpoint')
+    start = face.ravel()
+    end   = face[:, [1, 2, 0]].ravel()
+    keys  = np.minimum(start, end) * numVertex + np.maximum(start, end)
+
+    order = np.argsort(keys, kind="mergesort")
+    keys  = keys[order]
+    first = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    count = np.diff(np.append(first, len(keys)))
+
+    half  = order[first]
+    other = np.where(count > 1, order[np.minimum(first + 1, len(order) - 1)], -1)
+
+    edges = np.column_stack((start[half], end[half], half // 3,
+                             np.where(other >= 0, other // 3, -1)))
+    return edges.astype(np.int32), count.astype(np.int32)
+
+
+
+################################################################################
+
+
+
+def _pointArray(data):
+    """
+    Csúcspont koordináták C{(n, 3)} méretű tömbbé alakítása
+
+    @param  data:   Csúcspont koordináta tömb vagy Vertex lista
+    @type   data:   C{numpy.ndarray} vagy C{list}
+
+    @rtype:         C{numpy.ndarray}
+    """
+    if isinstance(data, list):
+        data = [v.vert for v in data]
+    return np.asarray(data, dtype=np.float64).reshape(-1, 3)
+
+
+def _farthest(points, origin):
+    """
+    Az C{origin}-tól legtávolabbi pont indexe és távolságának négyzete
+
+    @rtype:     C{tuple}
+    """
+    offset = points - origin
+    dist   = (offset * offset).sum(1)
+    index  = int(dist.argmax())
+    return index, dist[index]
+
+
+def _ritterSphere(points):
+    """
+    Közel minimális befoglaló gömb Ritter módszerével
+
+    Egy tetszőleges ponttól legtávolabbi, majd attól legtávolabbi pont
+    adja a kezdő átmérőt. Ezután mindig a gömbtől legtávolabbi kívül eső
+    pontot vesszük fel, úgy hogy az új gömb a régit is tartalmazza. Egy
+    lépés egy tömbművelet, a lépések száma a gyakorlatban néhány.
+
+    @param  points: A pontok C{(n, 3)} tömbje, C{n > 0}
+    @type   points: C{numpy.ndarray}
+
+    @return:        A gömb középpontja és sugara
+    @rtype:         C{tuple}
+    """
+    y = points[_farthest(points, points[0])[0]]
+    z = points[_farthest(points, y)[0]]
+    center = (y + z) * 0.5
+    radius = np.sqrt(((z - y) ** 2).sum()) * 0.5
+
+    while True:
+        index, dist = _farthest(points, center)
+        dist = np.sqrt(dist)
+        if dist <= radius * (1.0 + 1e-9):
+            break
+        newRadius = (radius + dist) * 0.5
+        center    = center + (points[index] - center) * ((dist - newRadius) / dist)
+        radius    = newRadius
+
+    return center, np.sqrt(_farthest(points, center)[1])
+
+
+
+################################################################################
+
+
+
+class BoundBox(object):
+    """
+    Tengelyekkel párhuzamos befoglaló doboz
+    """
+
+    __slots__ = ('__minPoint', '__maxPoint')
 
     def __init__(self, data):
         """
         BoundBox inicializálása
 
-        @param  data:   Vertex lista vagy (minPoint, maxPoint) tuple
-        @type   data:   C{list} vagy C{tuple}
+        @param  data:   Csúcspont koordináta tömb, Vertex lista vagy
+                        (minPoint, maxPoint) tuple
+        @type   data:   C{numpy.ndarray}, C{list} vagy C{tuple}
         """
         self.__minPoint = Vector3.zeros()                                       #:@ivar: A befoglaló kocka minimális csúcsa
         self.__maxPoint = Vector3.zeros()                                       #:@ivar: A befoglaló kocka maximális csúcsa
 
-        if isinstance(data, list):
-            def compar (x,y):
-                if (x.vert > y.vert).any():
-                    return 1
-                elif (x.vert < y.vert).any():
-                    return -1
-                else:
-                    return 0
-
-            sortVert = sorted(data, compar)
-            self.__minPoint = sortVert[0]
-            self.__maxPoint = sortVert[-1]
+        if isinstance(data, (np.ndarray, list)):
+            points = _pointArray(data)
+            if len(points):
+                self.__minPoint = Vector3(points.min(0))
+                self.__maxPoint = Vector3(points.max(0))
         elif isinstance(data, tuple):
             self.__minPoint = data[0]
             self.__maxPoint = data[1]
         else:
-            raise TypeError("Parameter is tuple (min, max) or list[vertex1, ...]")
+            raise TypeError("Parameter is ndarray, tuple (min, max) or list[vertex1, ...]")
 
     @property
     def minPoint(self):
@@ -180,50 +285,53 @@ class BoundBox():
         """A befoglaló doboz maximum pontja"""
         return self.__maxPoint
 
+    @property
+    def center(self):
+        """A befoglaló doboz középpontja"""
+        return Vector3((np.asarray(self.__minPoint) + np.asarray(self.__maxPoint)) * 0.5)
+
 
 
 ################################################################################
 
 
 
-class BoundShpere():
+class BoundShpere(object):
     """
     Befoglaló gömb
+
+    Csúcspontokból Ritter módszerével közel minimális gömböt számol, és ha a
+    súlypont köré írt gömb kisebb, azt tartja meg.
     """
 
-    __slots__ = ('__center', '__radius', 'center', 'radius')
+    __slots__ = ('__center', '__radius')
 
     def __init__(self, data):
         """
         BoundShpere inicializálása
 
-        @param  data:   Vertex lista vagy (centerPoint, radius) tuple
-        @type   data:   C{list} vagy C{tuple}
+        @param  data:   Csúcspont koordináta tömb, Vertex lista vagy
+                        (centerPoint, radius) tuple
+        @type   data:   C{numpy.ndarray}, C{list} vagy C{tuple}
         """
         self.__center = Vector3.zeros()                                         #:@ivar: A bfeoglaló gömb középpontja
         self.__radius = 0                                                       #:@ivar: A befoglaló göm sugara
 
-        if isinstance(data, list):
-            center = Vector3([0,0,0])
-
-            # average points to get approximate center
-            for v in data:
-                center += v.vert
-            center /= len(data)
-
-            # find maximum distance from center (sphere radius)
-            maxDistance = -1.0
-            for v in data:
-                centerToVector = v.vert - center
-                maxDistance = max(maxDistance, centerToVector.length)
-
-            self.__center = center
-            self.__radius = maxDistance
+        if isinstance(data, (np.ndarray, list)):
+            points = _pointArray(data)
+            if len(points):
+                center, radius = _ritterSphere(points)
+                centroid = points.mean(0)
+                distance = np.sqrt(_farthest(points, centroid)[1])
+                if distance < radius:
+                    center, radius = centroid, distance
+                self.__center = Vector3(center)
+                self.__radius = float(radius)
         elif isinstance(data, tuple):
             self.__center = data[0]
             self.__radius = data[1]
         else:
-            raise TypeError("Parameter is tuple (center, radius) or list[vertex1, ...]")
+            raise TypeError("Parameter is ndarray, tuple (center, radius) or list[vertex1, ...]")
 
     @property
     def center(self):
@@ -233,4 +341,70 @@ class BoundShpere():
     @property
     def radius(self):
         """A befoglaló gömb sugara"""
-        return self.__radius
\ No newline at end of file
+        return self.__radius
+
+
+
+################################################################################
+
+
+
+class BoundOrientedBox(object):
+    """
+    Tetszőleges irányítású befoglaló doboz
+
+    A tengelyek a pontok kovarianciamátrixának sajátvektorai (főkomponensei),
+    a doboz ezek mentén a vetületek minimumától a maximumáig tart.
+    """
+
+    __slots__ = ('__center', '__axes', '__extents')
+
+    def __init__(self, data):
+        """
+        BoundOrientedBox inicializálása
+
+        @param  data:   Csúcspont koordináta tömb, Vertex lista vagy
+                        (center, axes, extents) tuple
+        @type   data:   C{numpy.ndarray}, C{list} vagy C{tuple}
+        """
+        self.__center  = np.zeros(3)                                            #:@ivar: A doboz középpontja
+        self.__axes    = np.identity(3)                                         #:@ivar: A doboz tengelyei (soronként egységvektorok)
+        self.__extents = np.zeros(3)                                            #:@ivar: A doboz fél élhosszai a tengelyek mentén
+
+        if isinstance(data, (np.ndarray, list)):
+            points = _pointArray(data)
+            if len(points):
+                mean = points.mean(0)
+                axes = np.linalg.eigh(np.cov((points - mean).T, bias=True).reshape(3, 3))[1].T
+                projected = np.dot(points - mean, axes.T)
+                low, high = projected.min(0), projected.max(0)
+                self.__center  = mean + np.dot((low + high) * 0.5, axes)
+                self.__axes    = axes
+                self.__extents = (high - low) * 0.5
+        elif isinstance(data, tuple):
+            self.__center  = np.asarray(data[0], dtype=np.float64)
+            self.__axes    = np.asarray(data[1], dtype=np.float64)
+            self.__extents = np.asarray(data[2], dtype=np.float64)
+        else:
+            raise TypeError("Parameter is ndarray, tuple (center, axes, extents) or list[vertex1, ...]")
+
+    @property
+    def center(self):
+        """A doboz középpontja"""
+        return self.__center
+
+    @property
+    def axes(self):
+        """A doboz tengelyei C{(3, 3)} tömbben, soronként"""
+        return self.__axes
+
+    @property
+    def extents(self):
+        """A doboz fél élhosszai a tengelyek mentén"""
+        return self.__extents
+
+    @property
+    def corners(self):
+        """A doboz nyolc csúcspontja C{(8, 3)} tömbben"""
+        signs = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)])
+        return self.__center + np.dot(signs * self.__extents, self.__axes)
@@ -5,19 +5,101 @@ __date__ ="2010.02.23. 7:14:16"
 
 
 import os.path
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from xml.dom.minidom import *
 
+from ilo.config import Config
 from ilo.system.mesh import Mesh
 from ilo.system.material import *
 from ilo.render.display import *
 from ilo.structs.vector import *
 from ilo.messages.exceptios import *
 from ilo.filereader.model.ase import loadASEFile
+from ilo.filereader.model.obj import loadOBJFile
+from ilo.filereader.model.cache import loadCachedModel, isCached
+from ilo.filereader.model.optimize import optimizeVertexCache, buildLevels
 
 """
 A grefikai erőforrás kezeléssel foglalkozó osztályokat tartalamzó modul
 """
 
+
+def _cacheFormat(format, vertexCache, levels=(1, 0)):
+    """
+    A geometria fájl gyorsítótár kulcsában szereplő formátum
+
+    @return:    A formátum, a csúcspont gyorsítótár méretével és a
+                részletességi szintek beállításával kiegészítve
+    @rtype:     C{string}
+    """
+    if vertexCache > 0:
+        format = "%s:vcache%d" % (format, vertexCache)
+    if levels[0] > 1:
+        format = "%s:lod%d-%d" % (format, levels[0], levels[1])
+    return format
+
+
+def _loadGeometryFile(fileName, format, geomIDs, cacheDir, vertexCache=0, levels=(1, 0)):
+    """
+    Geometria fájl feldolgozása OpenGL hívások nélkül
+
+    Modulszintű függvény, hogy folyamatkészletben (C{multiprocessing.Pool})
+    is futtatható legyen. A frissen beolvasott geometriákat a csúcspont
+    gyorsítótárhoz rendezzük át, majd elkészítjük a részletességi
+    szintjeiket, így a gyorsítótárba már az előkészített változat kerül (a
+    beállítások a gyorsítótár kulcsának részei).
+
+    @param  vertexCache:    A csúcspont gyorsítótár mérete, 0 esetén nincs
+                            átrendezés
+    @type   vertexCache:    C{int}
+    @param  levels:         A részletességi szintek száma és a legkisebb
+                            egyszerűsítendő lapszám (C{render.lodlevels},
+                            C{render.lodminfaces})
+    @type   levels:         C{tuple}
+
+    @return:    A beolvasott C{ModelFile}-ok listája
+    @rtype:     C{list}
+    """
+    if format not in Libraly.GEOMETRY_LOADERS:
+        raise IloError("Ismeretlen fajlformatum!" + format)
+    loader = Libraly.GEOMETRY_LOADERS[format]
+    if vertexCache <= 0 and levels[0] <= 1:
+        return loadCachedModel(fileName, format, loader, cacheDir, geomIDs)
+
+    def cookedLoader(fileName, geomIDs=None):
+        geoms = loader(fileName, geomIDs)
+        for geom in geoms:
+            if vertexCache > 0:
+                optimizeVertexCache(geom, vertexCache)
+            if levels[0] > 1:
+                buildLevels(geom, *levels)
+        return geoms
+
+    return loadCachedModel(fileName, _cacheFormat(format, vertexCache, levels),
+                           cookedLoader, cacheDir, geomIDs)
+
+
+def _ximTextureFiles(ximFile, matIDList=None):
+    """
+    A XIM fájl (kért) anyagmintáinak textúra fájljai
+
+    @return:    A textúra fájlok elérési útvonalai
+    @rtype:     C{list}
+    """
+    if not (os.path.exists(ximFile) and os.path.isfile(ximFile)):
+        raise IloError("A fajl nem talalhato: %s" % ximFile)
+    xData = parse(ximFile)
+    files = []
+    for mat in xData.getElementsByTagName("material"):
+        if (not bool(matIDList)) or (mat.getAttribute("id") in matIDList):
+            for texture in mat.getElementsByTagName("texture"):
+                src = texture.getAttribute("src")
+                if src not in files:
+                    files.append(src)
+    xData.unlink()
+    return files
+
 class Libraly (object):
     """
     Grafikai erőforrás kezelő
@@ -36,6 +118,9 @@ class Libraly (object):
 
     _instance = None                                                            #:@cvar: Az osztály egyetelen példánya
 
+    GEOMETRY_LOADERS = {"ase" : loadASEFile,
+                        "obj" : loadOBJFile}                                    #:@cvar: Geometria fájl formátumok és beolvasó függvényeik
+
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(Libraly, cls).__new__( cls, *args, **kwargs)
@@ -136,16 +221,21 @@ class Libraly (object):
 
     def addGeometryFromFile(self, fileName, format="ase", geomIDs=None):
         """
-        Geometriák beolvasása (ASE) fájlból
+        Geometriák beolvasása (ASE vagy OBJ) fájlból
+        Ha a C{resource.meshcache} konfigurációs érték meg van adva, akkor a
+        feldolgozott geometriák az ott megadott könyvtárba kerülnek, és a
+        változatlan fájlokat a következő betöltéskor onnan olvassuk.
         Egy geometria fájl több objektumot is tárolhat. A metódus a `geomIDs`-
         ban felsorol azonosítók alapján olvassa be az objektumokat, ha ez nincs
         meg adva, vagy a listában szerepel a '*' karakter akkor az összes
-        objektumot beolvassa.
+        objektumot beolvassa. ASE fájlokból ilyenkor csak a kért objektumok
+        blokkjait dolgozzuk fel (lásd C{indexASEFile}).
         Minden objektum a fájlban található objetumazonosítóval érhető el.
 
         @param  fileName:   A geometria fájl neve és elérési útvonala
         @type   fileName:   C{string}
-        @param  format:     A beolvasandó geometria fájl formátuma
+        @param  format:     A beolvasandó geometria fájl formátuma, a
+                            C{GEOMETRY_LOADERS} egyik kulcsa
         @type   format:     C{string}
         @param  geomIDs:    A fálból kilvasandó modellek azonosítója
                             Az alpértelmezett C{None} esetén mindet beolvassa
@@ -154,21 +244,82 @@ class Libraly (object):
         @return:            A betöltött objektmok azonosítóinak a listája
         @rtype:             C{list}
         """
-        if format == "ase":
-            geoms = loadASEFile(fileName)
-        else:
-            raise IloError("Ismeretlen fajlformatum!" + format)
+        if geomIDs != None and '*' in geomIDs: geomIDs = None
+
+        geoms = _loadGeometryFile(fileName, format, geomIDs, self.__meshCacheDir(),
+                                  self.__vertexCacheSize(), self.__detailLevels())
+        return self.__addGeometries(geoms, geomIDs)
+
+
+    def __meshCacheDir(self):
+        """
+        A geometria gyorsítótár könyvtára, C{None} ha nincs beállítva
+        """
+        if Config.hasValue("resource.meshcache"):
+            return Config.getValue("resource.meshcache")
+        return None
 
-        if '*' in geomIDs: geomIDs = None
 
+    def __detailLevels(self):
+        """
+        A részletességi szintek száma és a legkisebb egyszerűsítendő
+        lapszám, C{(1, 0)} ha nincsenek szintek
+        """
+        if Config.hasValue("render.lodlevels") and Config.hasValue("render.lodminfaces"):
+            return (Config.getValue("render.lodlevels"), Config.getValue("render.lodminfaces"))
+        return (1, 0)
+
+
+    def __vertexCacheSize(self):
+        """
+        A csúcspont gyorsítótár mérete az átrendezéshez, 0 ha kikapcsolt
+        """
+        if Config.hasValue("resource.vertexcache"):
+            return Config.getValue("resource.vertexcache")
+        return 0
+
+
+    def __addGeometries(self, geoms, geomIDs=None, keepIDs=None):
+        """
+        A beolvasott geometriák felvétele a tárolóba (OpenGL bufferek
+        létrehozása), csak a fő szálon hívható
+
+        A C{keepIDs} geometriák CPU oldali adatai a feltöltés után is
+        megmaradnak (árnyékvetés, ütközésvizsgálat), a többinél a
+        C{resource.keepmeshdata} beállítás dönt.
+
+        @return:            A felvett objektmok azonosítóinak a listája
+        @rtype:             C{list}
+        """
         addedIDs = []
 
         for geom in geoms:
             if geomIDs  == None or geom.name in geomIDs:
-                self.addGeometry(geom.name, Mesh(geom))
+                keepData = None
+                if keepIDs and geom.name in keepIDs:
+                    keepData = True
+                self.addGeometry(geom.name, Mesh(geom, keepData=keepData))
                 addedIDs.append(geom.name)
 
         return addedIDs
+
+
+    def memoryUsage(self):
+        """
+        A tárolt geometriák memóriafoglalása
+
+        @return:    Összesítve és geometriánként a CPU és GPU oldali bájtok
+                    száma: C{{"cpu": ..., "gpu": ..., "geometris": {id: {...}}}}
+        @rtype:     C{dict}
+        """
+        usage = {"cpu": 0, "gpu": 0, "geometris": {}}
+        for id, geom in self.__geometryLib.iteritems():
+            if isinstance(geom, Mesh):
+                item = geom.memoryUsage()
+                usage["geometris"][id] = item
+                usage["cpu"] += item["cpu"]
+                usage["gpu"] += item["gpu"]
+        return usage
 #}
 
 
@@ -249,7 +400,7 @@ class Libraly (object):
         return id in self.__materialLib
 
 
-    def addXIMMatlib(self, ximFile, matIDList = None):
+    def addXIMMatlib(self, ximFile, matIDList = None, bitmaps = None):
         """
         Anyagminták betöltése XIM (Xml Ilo Matlib) fájlból
 
@@ -259,7 +410,14 @@ class Libraly (object):
                             C{None} esetben mindet betölti
                             C{default: None}
         @type   matIDList:  C{List}
+        @param  bitmaps:    Már dekódolt képek a textúra fájlok nevével
+                            indexelve (lásd C{loadBitmap}), a hiányzókat
+                            itt töltjük be
+        @type   bitmaps:    C{Dict}
         """
+        if bitmaps == None:
+            bitmaps = {}
+
         if os.path.exists(ximFile) and os.path.isfile(ximFile):
             file_in = open(ximFile, "r", 0)
             xData = parse(file_in)
@@ -283,7 +441,8 @@ class Libraly (object):
 
                 material.setTexture(Texture(
                     texture.getAttribute("src"),
-                    texture.getAttribute("filter")
+                    texture.getAttribute("filter"),
+                    bitmap = bitmaps.get(texture.getAttribute("src"))
                 ))
 
                 try:    vertShader = mat.getElementsByTagName("vertexshader")[0].firstChild.wholeText.strip()
@@ -304,6 +463,92 @@ class Libraly (object):
 #}
 
 
+    def __loadSceneResources(self, geometryLibs, materialLibs, keepIDs=None):
+        """
+        A jelenet geometria és anyagminta fájljainak párhuzamos betöltése
+
+        A textúrák dekódolása szálkészletben fut, a geometria fájloké
+        közben a fő szálon. Folyamatkészletet csak akkor indítunk, ha
+        legalább két, a gyorsítótárban nem szereplő geometria fájlt kell
+        feldolgozni: a gyorsítótárból a tömbök memóriába leképezve, a fő
+        folyamatban töltődnek be. Az OpenGL objektumok (bufferek,
+        textúrák) létrehozása a fő szálon történik. A munkások számát a
+        C{resource.loadworkers} adja meg, 0 esetén a processzormagok száma,
+        1 esetén minden a fő szálon töltődik be.
+
+        @param  geometryLibs:   A geometria fájlok (C{file}, C{format},
+                                C{geoIDs}) leírói
+        @type   geometryLibs:   C{list}
+        @param  materialLibs:   Az anyagminta fájlok (C{file}, C{matIDs})
+                                leírói
+        @type   materialLibs:   C{list}
+        @param  keepIDs:        A CPU oldali adataikat megtartó geometriák
+        @type   keepIDs:        C{list}
+        """
+        workers = 0
+        if Config.hasValue("resource.loadworkers"):
+            workers = Config.getValue("resource.loadworkers")
+        if workers <= 0:
+            workers = multiprocessing.cpu_count()
+
+        cacheDir    = self.__meshCacheDir()
+        vertexCache = self.__vertexCacheSize()
+        levels      = self.__detailLevels()
+        for data in geometryLibs:
+            if data["geoIDs"] != None and '*' in data["geoIDs"]:
+                data["geoIDs"] = None
+
+        parsed     = []
+        imageFiles = []
+        if workers > 1:
+            parsed = [data for data in geometryLibs
+                      if not isCached(data["file"],
+                                      _cacheFormat(data["format"], vertexCache, levels),
+                                      cacheDir)]
+            if len(parsed) < 2:
+                parsed = []
+            for data in materialLibs:
+                imageFiles += [src for src in _ximTextureFiles(data["file"], data["matIDs"])
+                               if src not in imageFiles]
+
+        processes = None
+        threads   = None
+        try:
+            results = {}
+            if parsed:
+                processes = multiprocessing.Pool(min(workers, len(parsed)))
+                for data in parsed:
+                    results[id(data)] = processes.apply_async(
+                        _loadGeometryFile, (data["file"], data["format"],
+                                            data["geoIDs"], cacheDir, vertexCache, levels))
+            images = None
+            if imageFiles:
+                threads = ThreadPool(min(workers, len(imageFiles)))
+                images  = threads.map_async(loadBitmap, imageFiles)
+
+            for data in geometryLibs:
+                if id(data) in results:
+                    geoms = results[id(data)].get()
+                else:
+                    geoms = _loadGeometryFile(data["file"], data["format"],
+                                              data["geoIDs"], cacheDir, vertexCache, levels)
+                self.__addGeometries(geoms, data["geoIDs"], keepIDs)
+
+            bitmaps = {}
+            if images is not None:
+                bitmaps = dict(zip(imageFiles, images.get()))
+            if processes is not None:
+                processes.close()
+        finally:
+            if processes is not None:
+                processes.terminate()
+            if threads is not None:
+                threads.terminate()
+
+        for data in materialLibs:
+            self.addXIMMatlib(data["file"], data["matIDs"], bitmaps)
+
+
     def loadSceneXML(self, xisFile):
         """
         XIS (Xml Ilo Scene) fájl beöltése
@@ -381,13 +626,14 @@ class Libraly (object):
                                 element[attr] = [float(x) for x in value.split(";")]
                     sceneObj[element["id"]] = element
 
-                #Modellek betöltése a modeltárba
-                for data in geometryLibs.values():
-                    self.addGeometryFromFile(data["file"], data["format"], data["geoIDs"])
+                #Árnyékot vető és ütközésvizsgálatban részt vevő modellek
+                #CPU oldali adatai megmaradnak
+                keepIDs = [element["geometry"] for element in sceneObj.values()
+                           if element["shadow"] or element["hittest"]]
 
-                #Anyagminták betöltése az anyagtárba
-                for data in materialLibs.values():
-                    self.addXIMMatlib(data["file"], data["matIDs"])
+                #Modellek és anyagminták betöltése a tárolókba
+                self.__loadSceneResources(geometryLibs.values(), materialLibs.values(),
+                                          keepIDs)
 
                 #RenderObjetc szerkezet felépítése
 
@@ -398,6 +644,7 @@ class Libraly (object):
                     obj.scale  = element["scale"]
                     obj.coord  = element["coord"]
                     obj.angle  = element["angle"]
+                    obj.castShadow = element["shadow"] == True
 
                     return obj
 
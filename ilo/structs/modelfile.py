@@ -5,13 +5,19 @@ __date__ ="2009.10.01. 19:12:32"
 
 import numpy
 
-class ModelFile:
+class ModelFile(object):
 
     __slots__ = ('__model',)
 
     def __init__(self):
         self.__model = {}
         self.__model["name"] = ""
+        self.__model["bounds"] = None
+        for key in ["lodFace",
+                    "lodFaceUV",
+                    "lodOrigin",
+                    "lodCount"]:
+            self.__model[key] = None
         for key in ["numVertex",
                     "numFace",
                     "numColorVertex",
@@ -27,15 +33,18 @@ class ModelFile:
                     "listTexVertex",
                     "listTexFace",
                     "listVertexNormal",
-                    "listFaceNormal"]:
+                    "listFaceNormal",
+                    "listFaceSmoothing"]:
             self.__model[key] = []
 
     def convert(self):
         for key, item in self.__model.iteritems() :
             if key in ["listVertex", "listColorVertex", "listTexVertex", "listVertexNormal", "listFaceNormal"]:
-                self.__model[key] = numpy.array(item, dtype=numpy.float32)
+                self.__model[key] = numpy.asarray(item, dtype=numpy.float32)
             elif key in ["listFace", "listColorFace", "listTexFace"] :
-                self.__model[key] = numpy.array(item, dtype=numpy.int16)
+                self.__model[key] = numpy.asarray(item, dtype=numpy.int32)
+            elif key == "listFaceSmoothing":
+                self.__model[key] = numpy.asarray(item, dtype=numpy.uint32)
 
     @property
     def numOfVertex(self):
@@ -67,6 +76,15 @@ class ModelFile:
     def name(self, value):
         self.__model["name"] = value
 
+    @property
+    def bounds(self):
+        """A csúcspontok befoglaló dobozának C{[min, max]} sarokpontjai"""
+        return self.__model["bounds"]
+
+    @bounds.setter
+    def bounds(self, value):
+        self.__model["bounds"] = value
+
     #Vertex-------------------------------------------
     @property
     def vertex(self):
@@ -82,7 +100,7 @@ class ModelFile:
         self.__model["listVertex"].append(value)
 
     def getVertexByIndex(self, index):
-        if self.vertex != None:
+        if self.vertex is not None:
             return self.vertex[index]
         return None
 
@@ -101,7 +119,7 @@ class ModelFile:
         self.__model["listVertexNormal"].append(value)
 
     def getVertexNormalByIndex(self, index):
-        if self.vertexNormal != None:
+        if self.vertexNormal is not None:
             return self.vertexNormal[index]
         return None
 
@@ -120,7 +138,7 @@ class ModelFile:
         self.__model["listTexVertex"].append(value)
 
     def getVertexUVByIndex(self, index):
-        if self.vertexUV != None:
+        if self.vertexUV is not None:
             return self.vertexUV[index]
         return None
 
@@ -140,7 +158,7 @@ class ModelFile:
         self.__model["listColorVertex"].append(value)
 
     def getVertexColorByIndex(self, index):
-        if self.vertexColor != None:
+        if self.vertexColor is not None:
             return self.vertexColor[index]
         return None
 
@@ -159,7 +177,7 @@ class ModelFile:
         self.__model["listFace"].append(value)
 
     def getFaceByIndex(self, index):
-        if self.face != None:
+        if self.face is not None:
             return self.face[index]
         return None
 
@@ -178,7 +196,7 @@ class ModelFile:
         self.__model["listFaceNormal"].append(value)
 
     def getFaceNormalByIndex(self, index):
-        if self.faceNormal != None:
+        if self.faceNormal is not None:
             return self.faceNormal[index]
         return None
 
@@ -197,7 +215,7 @@ class ModelFile:
         self.__model["listTexFace"].append(value)
 
     def getFaceUVByIndex(self, index):
-        if self.faceUV != None:
+        if self.faceUV is not None:
             return self.faceUV[index]
         return None
 
@@ -216,10 +234,87 @@ class ModelFile:
         self.__model["listColorFace"].append(value)
 
     def getFaceColorByIndex(self, index):
-        if self.faceColor != None:
+        if self.faceColor is not None:
             return self.faceColor[index]
         return  None
 
+    #Face Smoothing -------------------------------------------
+    @property
+    def faceSmoothing(self):
+        """Laponként a simítási csoportok bitmaszkja (az I{n}. csoport az I{n-1}. bit)"""
+        if len(self.__model["listFaceSmoothing"]) > 0:
+            return self.__model["listFaceSmoothing"]
+        return None
+
+    @faceSmoothing.setter
+    def faceSmoothing(self, value):
+        self.__model["listFaceSmoothing"] = value
+
+    def addFaceSmoothing(self, value):
+        self.__model["listFaceSmoothing"].append(value)
+
+    def getFaceSmoothingByIndex(self, index):
+        if self.faceSmoothing is not None:
+            return self.faceSmoothing[index]
+        return None
+
+    #Detail levels -------------------------------------------
+    @property
+    def lodFace(self):
+        """Az egyszerűsített részletességi szintek lapjai egymás után"""
+        return self.__model["lodFace"]
+
+    @lodFace.setter
+    def lodFace(self, value):
+        self.__model["lodFace"] = value
+
+    @property
+    def lodFaceUV(self):
+        """Az egyszerűsített szintek lapjainak textúra koordináta indexei"""
+        return self.__model["lodFaceUV"]
+
+    @lodFaceUV.setter
+    def lodFaceUV(self, value):
+        self.__model["lodFaceUV"] = value
+
+    @property
+    def lodOrigin(self):
+        """Az egyszerűsített szintek lapjainak eredeti lapindexe"""
+        return self.__model["lodOrigin"]
+
+    @lodOrigin.setter
+    def lodOrigin(self, value):
+        self.__model["lodOrigin"] = value
+
+    @property
+    def lodCount(self):
+        """Az egyszerűsített szintek lapszámai, C{None} ha nincsenek előkészítve"""
+        return self.__model["lodCount"]
+
+    @lodCount.setter
+    def lodCount(self, value):
+        self.__model["lodCount"] = value
+
+    def getLevels(self):
+        """
+        Az előkészített részletességi szintek
+
+        @return:    Szintenként a C{(face, faceUV, origin)} tömbök, C{None}
+                    ha nincsenek előkészítve
+        @rtype:     C{list}
+        """
+        if self.lodCount is None:
+            return None
+        levels = []
+        start  = 0
+        for count in numpy.asarray(self.lodCount).tolist():
+            end = start + count
+            levels.append((self.lodFace[start:end],
+                           self.lodFaceUV[start:end] if self.lodFaceUV is not None else None,
+                           self.lodOrigin[start:end]))
+            start = end
+        return levels
+
     #Edge-------------------------------------------------------
     @property
     def edge(self):
@@ -235,7 +330,7 @@ class ModelFile:
         self.__model["edge"].append(value)
 
     def getEdgeByIndex(self, index):
-        if self.edge != None:
+        if self.edge is not None:
             return self.edge[index]
         return None
 
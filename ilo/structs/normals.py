@@ -0,0 +1,182 @@
+# -*- coding: utf -*-
+
+__author__="Vadasz Laszlo"
+__date__ ="2010.04.28. 20:41:13"
+
+import numpy as np
+
+"""
+Csúcsnormálisok és tangens terek számítása háromszöghálókhoz
+
+A normálisokat sarkonként (lap, csúcs) számoljuk: egy sarok normálisa a
+csúcs körüli, vele egy simítási csoportba tartozó (vagy a törési szögnél
+kisebb szöget bezáró) lapok területtel súlyozott normálisainak összege.
+A csúcs körüli sarokpárokat egyetlen tömbben állítjuk elő, az összegzés
+C{np.bincount}-tal történik. Az azonos (csúcs, normális) sarkok közös
+indexet kapnak, így az eredmény a C{faceUV}-hez hasonló indexelt tömb.
+"""
+
+
+def faceNormals(vertex, face):
+    """
+    Egységnyi hosszú lapnormálisok
+
+    @param  vertex:     Csúcs koordináták C{(n, 3)} tömbje
+    @type   vertex:     C{numpy.ndarray}
+    @param  face:       A háromszögek csúcsindexeinek C{(m, 3)} tömbje
+    @type   face:       C{numpy.ndarray}
+
+    @return:            Laponként a normálvektor és a lap területének kétszerese
+    @rtype:             C{tuple}
+    """
+    tri    = vertex[face]
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    length = np.sqrt((normal * normal).sum(1))
+    return normal / np.where(length > 0, length, 1.0)[:, None], length
+
+
+def _cornerPairs(corner, numVertex):
+    """
+    Az azonos csúcsra eső sarkok összes (rendezett) párja
+
+    @param  corner:     Sarkonként a csúcs indexe
+    @type   corner:     C{numpy.ndarray}
+
+    @return:            A párok első és második sarkának indexei
+    @rtype:             C{tuple}
+    """
+    order  = np.argsort(corner, kind="mergesort")
+    count  = np.bincount(corner, minlength=numVertex)
+    start  = np.cumsum(count) - count
+    repeat = count[corner[order]]
+    total  = repeat.sum()
+    step   = np.arange(total) - np.repeat(np.cumsum(repeat) - repeat, repeat)
+    first  = np.repeat(order, repeat)
+    second = order[np.repeat(start[corner[order]], repeat) + step]
+    return first, second
+
+
+def _indexRows(key, values):
+    """
+    Az azonos C{(key, values)} sorok összevonása
+
+    @return:    Az egyedi értékek és soronként az indexük
+    @rtype:     C{tuple}
+    """
+    rows = np.column_stack((key.astype(np.float64), values.astype(np.float64)))
+    rows = np.ascontiguousarray(rows).view(np.dtype((np.void, rows.shape[1] * 8))).ravel()
+    unique, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return values[first], inverse.astype(np.int32)
+
+
+def cornerNormals(vertex, face, smoothing=None, creaseAngle=180.0):
+    """
+    Sarkonkénti normálisok simítási csoportok vagy törési szög alapján
+
+    Ha a lapokhoz simítási csoport tartozik (legalább egy nem nulla), két
+    lap akkor simít egymásba egy közös csúcsban, ha van közös csoportjuk;
+    a 0 csoportú lap éles. Simítási csoportok nélkül a lapnormálisok
+    szöge dönt.
+
+    @param  vertex:         Csúcs koordináták C{(n, 3)} tömbje
+    @type   vertex:         C{numpy.ndarray}
+    @param  face:           A háromszögek csúcsindexeinek C{(m, 3)} tömbje
+    @type   face:           C{numpy.ndarray}
+    @param  smoothing:      Laponként a simítási csoportok bitmaszkja, vagy
+                            C{None}
+    @type   smoothing:      C{numpy.ndarray}
+    @param  creaseAngle:    Törési szög fokban (180 esetén minden simít)
+    @type   creaseAngle:    C{float}
+
+    @return:                Az egyedi normálisok C{(k, 3)} C{float32} tömbje
+                            és a sarkok indexei C{(m, 3)} C{int32} tömbben
+    @rtype:                 C{tuple}
+    """
+    vertex = np.asarray(vertex, dtype=np.float64).reshape(-1, 3)
+    face   = np.asarray(face, dtype=np.int64).reshape(-1, 3)
+    if len(face) == 0:
+        return np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32)
+
+    normal, area = faceNormals(vertex, face)
+    corner = face.ravel()
+    first, second = _cornerPairs(corner, len(vertex))
+    f0, f1 = first // 3, second // 3
+
+    if smoothing is not None and np.any(smoothing):
+        smoothing = np.asarray(smoothing, dtype=np.uint32)
+        smooth = (f0 == f1) | ((smoothing[f0] & smoothing[f1]) != 0)
+    elif creaseAngle >= 180.0:
+        smooth = np.ones(len(first), dtype=bool)
+    else:
+        cosine = (normal[f0] * normal[f1]).sum(1)
+        smooth = (f0 == f1) | (cosine >= np.cos(np.radians(creaseAngle)))
+
+    weighted = normal * area[:, None]
+    first, f1 = first[smooth], f1[smooth]
+    result = np.column_stack([np.bincount(first, weighted[f1, axis], len(corner))
+                              for axis in xrange(3)])
+    length = np.sqrt((result * result).sum(1))
+    flat   = np.repeat(normal, 3, axis=0)
+    result = np.where((length > 0)[:, None], result / np.where(length > 0, length, 1.0)[:, None], flat)
+
+    unique, index = _indexRows(corner, result.astype(np.float32))
+    return unique, index.reshape(-1, 3)
+
+
+def cornerTangents(vertex, face, uv, faceUV, normal, normalIndex):
+    """
+    Sarkonkénti tangensek a normál térképezéshez
+
+    A lapok UV irányú tangens és bitangens vektorait az azonos normálisú és
+    textúra koordinátájú sarkokra összegezzük, majd a tangenst a
+    normálisra merőlegesítjük (Gram-Schmidt). A negyedik komponens a
+    bitangens iránya (C{+1} vagy C{-1}, tükrözött UV esetén).
+
+    @param  uv:             Textúra koordináták C{(k, 2)} tömbje
+    @type   uv:             C{numpy.ndarray}
+    @param  faceUV:         A lapok textúra koordináta indexei
+    @type   faceUV:         C{numpy.ndarray}
+    @param  normal:         Az egyedi normálisok (C{cornerNormals} eredménye)
+    @type   normal:         C{numpy.ndarray}
+    @param  normalIndex:    A sarkok normálisainak indexei
+    @type   normalIndex:    C{numpy.ndarray}
+
+    @return:                Sarkonként a C{(x, y, z, w)} tangens,
+                            C{(m, 3, 4)} C{float32} tömb
+    @rtype:                 C{numpy.ndarray}
+    """
+    vertex = np.asarray(vertex, dtype=np.float64).reshape(-1, 3)
+    face   = np.asarray(face, dtype=np.int64).reshape(-1, 3)
+    if len(face) == 0:
+        return np.zeros((0, 3, 4), np.float32)
+
+    tri = vertex[face]
+    tex = np.asarray(uv, dtype=np.float64)[np.asarray(faceUV, dtype=np.int64)]
+    e1, e2 = tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0]
+    d1, d2 = tex[:, 1] - tex[:, 0], tex[:, 2] - tex[:, 0]
+    det = d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+    inv = np.where(np.abs(det) > 1e-20, 1.0 / np.where(det != 0, det, 1.0), 0.0)[:, None]
+    tangent   = (e1 * d2[:, 1:2] - e2 * d1[:, 1:2]) * inv
+    bitangent = (e2 * d1[:, 0:1] - e1 * d2[:, 0:1]) * inv
+
+    # közös tangens az azonos normálisú és textúra koordinátájú sarkoknak
+    key = np.asarray(normalIndex, dtype=np.int64).ravel() * (int(np.max(faceUV)) + 1) + \
+          np.asarray(faceUV, dtype=np.int64).ravel()
+    group = np.unique(key, return_inverse=True)[1]
+    size  = group.max() + 1
+    t = np.column_stack([np.bincount(group, np.repeat(tangent[:, axis], 3), size)
+                         for axis in xrange(3)])[group]
+    b = np.column_stack([np.bincount(group, np.repeat(bitangent[:, axis], 3), size)
+                         for axis in xrange(3)])[group]
+
+    n = np.asarray(normal, dtype=np.float64)[np.asarray(normalIndex).ravel()]
+    t = t - n * (n * t).sum(1)[:, None]
+    length = np.sqrt((t * t).sum(1))
+
+    # elfajuló UV esetén tetszőleges, a normálisra merőleges irány
+    fallback = np.cross(n, np.where(np.abs(n[:, 0:1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]]))
+    fallback /= np.maximum(np.sqrt((fallback * fallback).sum(1)), 1e-20)[:, None]
+    t = np.where((length > 1e-12)[:, None], t / np.maximum(length, 1e-20)[:, None], fallback)
+
+    w = np.where((np.cross(n, t) * b).sum(1) < 0.0, -1.0, 1.0)
+    return np.column_stack((t, w)).astype(np.float32).reshape(-1, 3, 4)
@@ -0,0 +1,247 @@
+# -*- coding: utf -*-
+
+__author__="Vadasz Laszlo"
+__date__ ="2010.04.24. 16:02:45"
+
+import heapq
+import numpy as np
+
+from ilo.structs.d3d import buildEdges
+
+"""
+Háromszöghálók egyszerűsítése négyzetes hibametrikával (QEM)
+
+Garland és Heckbert (I{Surface Simplification Using Quadric Error Metrics},
+1997) élösszevonásos módszere, részhalmaz elhelyezéssel: az összevont él
+a két csúcsa közül a kisebb hibájúba húzódik, így az egyszerűsített
+szintek az eredeti csúcsokat indexelik, és a megjelenítésnél közös vertex
+bufferből rajzolhatók. A nyitott és a textúra varrat éleket merőleges
+síkok nagy súlyú hibájával őrizzük meg, a lapok átfordulását és a nem
+sokaság eredményt adó összevonásokat elvetjük.
+"""
+
+__quadric_terms__ = ((0, 0), (0, 1), (0, 2), (0, 3), (1, 1),
+                     (1, 2), (1, 3), (2, 2), (2, 3), (3, 3))
+
+__border_weight__ = 1000.0
+
+
+def _quadrics(planes, weight, corners, numVertex):
+    """
+    Síkok súlyozott négyzetes hibáinak összegzése csúcsonként
+
+    @param  planes:     A síkok C{(a, b, c, d)} együtthatóinak C{(k, 4)} tömbje
+    @type   planes:     C{numpy.ndarray}
+    @param  weight:     Síkonként a súly
+    @type   weight:     C{numpy.ndarray}
+    @param  corners:    Síkonként a csúcsok, amelyekhez a hiba tartozik
+                        (C{(k, j)} tömb)
+    @type   corners:    C{numpy.ndarray}
+
+    @return:            Csúcsonként a szimmetrikus 4x4-es mátrix 10 eleme
+    @rtype:             C{numpy.ndarray}
+    """
+    repeat = corners.shape[1]
+    return np.column_stack([np.bincount(corners.ravel(),
+                                        np.repeat(planes[:, i] * planes[:, j] * weight, repeat),
+                                        numVertex) for i, j in __quadric_terms__])
+
+
+def _error(q, point):
+    """
+    A négyzetes hiba értéke egy pontban
+    """
+    x, y, z = point
+    return (q[0] * x * x + 2.0 * (q[1] * x * y + q[2] * x * z + q[3] * x) +
+            q[4] * y * y + 2.0 * (q[5] * y * z + q[6] * y) +
+            q[7] * z * z + 2.0 * q[8] * z + q[9])
+
+
+def _normal(a, b, c):
+    """
+    A háromszög (nem normalizált) normálvektora
+    """
+    ux, uy, uz = b[0] - a[0], b[1] - a[1], b[2] - a[2]
+    vx, vy, vz = c[0] - a[0], c[1] - a[1], c[2] - a[2]
+    return (uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx)
+
+
+def simplifyMesh(vertex, face, targets, faceUV=None):
+    """
+    Háromszögháló egyszerűsítése a megadott lapszámokra
+
+    @param  vertex:     Csúcs koordináták C{(n, 3)} tömbje
+    @type   vertex:     C{numpy.ndarray}
+    @param  face:       A háromszögek csúcsindexeinek C{(m, 3)} tömbje
+    @type   face:       C{numpy.ndarray}
+    @param  targets:    A kívánt lapszámok, csökkenő sorrendben
+    @type   targets:    C{list}
+    @param  faceUV:     A háromszögek textúra koordináta indexei, vagy C{None}
+    @type   faceUV:     C{numpy.ndarray}
+
+    @return:            Az elért szintek C{(face, faceUV, origin)} tömbjei,
+                        ahol C{origin} a megmaradt lapok eredeti indexe; ha
+                        egy lapszám nem érhető el, a legegyszerűbb elért
+                        változat az utolsó szint
+    @rtype:             C{list}
+    """
+    vertex = np.asarray(vertex, dtype=np.float64).reshape(-1, 3)
+    face   = np.asarray(face, dtype=np.int64).reshape(-1, 3)
+    numVertex, numFace = len(vertex), len(face)
+    if numFace == 0 or not targets:
+        return []
+
+    edges, count = buildEdges(face, numVertex)
+    edges = edges.astype(np.int64)
+
+    # a lapok síkjai területtel súlyozva
+    tri    = vertex[face]
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    area   = np.sqrt((normal * normal).sum(1))
+    normal = normal / np.where(area > 0, area, 1.0)[:, None]
+    planes = np.column_stack((normal, -(normal * tri[:, 0]).sum(1)))
+    Q = _quadrics(planes, area * 0.5, face, numVertex)
+
+    # nyitott és textúra varrat élek: az élen átmenő, a lapra merőleges sík
+    border = count == 1
+    if faceUV is not None:
+        faceUV = np.asarray(faceUV, dtype=np.int64).reshape(-1, 3)
+        inner  = np.flatnonzero(edges[:, 3] >= 0)
+        e      = edges[inner]
+
+        def cornerUV(f, v):
+            return np.where(face[f] == v[:, None], faceUV[f], 0).sum(1)
+
+        border[inner] = ((cornerUV(e[:, 2], e[:, 0]) != cornerUV(e[:, 3], e[:, 0])) |
+                         (cornerUV(e[:, 2], e[:, 1]) != cornerUV(e[:, 3], e[:, 1])))
+
+    constrained = edges[border]
+    if len(constrained):
+        start = vertex[constrained[:, 0]]
+        along = vertex[constrained[:, 1]] - start
+        side  = np.cross(along, normal[constrained[:, 2]])
+        size  = np.sqrt((side * side).sum(1))
+        side  = side / np.where(size > 0, size, 1.0)[:, None]
+        sidePlanes = np.column_stack((side, -(side * start).sum(1)))
+        Q += _quadrics(sidePlanes, (along * along).sum(1) * __border_weight__,
+                       constrained[:, :2], numVertex)
+
+    isBorder = np.zeros(numVertex, dtype=bool)
+    isBorder[edges[count == 1, :2].ravel()] = True
+
+    Q        = Q.tolist()
+    pos      = vertex.tolist()
+    faces    = face.tolist()
+    uvs      = faceUV.tolist() if faceUV is not None else None
+    isBorder = isBorder.tolist()
+    vfaces   = [set() for i in xrange(numVertex)]
+    for f, corner in enumerate(faces):
+        for v in corner:
+            vfaces[v].add(f)
+    alive    = [True] * numFace
+    version  = [0] * numVertex
+    heap     = []
+
+    def push(u, v):
+        q = [a + b for a, b in zip(Q[u], Q[v])]
+        eu, ev = _error(q, pos[u]), _error(q, pos[v])
+        if eu <= ev:
+            heapq.heappush(heap, (eu, v, u, version[v], version[u]))
+        else:
+            heapq.heappush(heap, (ev, u, v, version[u], version[v]))
+
+    def neighbours(v):
+        return set(w for f in vfaces[v] for w in faces[f])
+
+    def collapsible(r, k, shared):
+        if not shared or (len(shared) > 1 and isBorder[r] and isBorder[k]):
+            return False
+        if len((neighbours(r) & neighbours(k)) - set((r, k))) != len(shared):
+            return False
+        target = pos[k]
+        for f in vfaces[r] - shared:
+            corner = faces[f]
+            before = _normal(*[pos[v] for v in corner])
+            after  = _normal(*[target if v == r else pos[v] for v in corner])
+            if (before[0] * after[0] + before[1] * after[1] + before[2] * after[2]) <= 0.0:
+                return False
+        return True
+
+    for v0, v1 in edges[:, :2].tolist():
+        push(v0, v1)
+
+    targets  = sorted(targets, reverse=True)
+    levels   = []
+    numAlive = numFace
+
+    def snapshot():
+        index = [f for f in xrange(numFace) if alive[f]]
+        levels.append((np.array([faces[f] for f in index], dtype=np.int32).reshape(-1, 3),
+                       np.array([uvs[f] for f in index], dtype=np.int32).reshape(-1, 3)
+                       if uvs is not None else None,
+                       np.array(index, dtype=np.int32)))
+
+    while targets:
+        if numAlive <= targets[0]:
+            snapshot()
+            while targets and numAlive <= targets[0]:
+                targets.pop(0)
+            continue
+        if not heap:
+            if not levels or len(levels[-1][0]) > numAlive:
+                snapshot()
+            break
+
+        cost, r, k, vr, vk = heapq.heappop(heap)
+        if version[r] != vr or version[k] != vk:
+            continue
+        shared = vfaces[r] & vfaces[k]
+        if not collapsible(r, k, shared):
+            continue
+
+        uvMap = {}
+        for f in shared:
+            alive[f] = False
+            numAlive -= 1
+            for v in faces[f]:
+                if v != r:
+                    vfaces[v].discard(f)
+            if uvs is not None:
+                uvMap[uvs[f][faces[f].index(r)]] = uvs[f][faces[f].index(k)]
+
+        for f in vfaces[r] - shared:
+            i = faces[f].index(r)
+            faces[f][i] = k
+            if uvs is not None:
+                uvs[f][i] = uvMap.get(uvs[f][i], uvs[f][i])
+            vfaces[k].add(f)
+        vfaces[r] = set()
+
+        Q[k] = [a + b for a, b in zip(Q[k], Q[r])]
+        isBorder[k] = isBorder[k] or isBorder[r]
+        version[r] += 1
+        version[k] += 1
+        for v in neighbours(k) - set((k,)):
+            push(k, v)
+
+    return levels
+
+
+def simplifyLevels(vertex, face, faceUV, numLevels, minFaces):
+    """
+    Részletességi szintek, szintenként feleződő lapszámmal
+
+    @param  numLevels:  A szintek száma az eredeti hálóval együtt
+    @type   numLevels:  C{int}
+    @param  minFaces:   Ennél kevesebb lapú hálót nem egyszerűsítünk
+    @type   minFaces:   C{int}
+
+    @return:            Az egyszerűsített szintek C{(face, faceUV, origin)}
+                        tömbjei (lásd C{simplifyMesh})
+    @rtype:             C{list}
+    """
+    numFace = len(face)
+    if numLevels <= 1 or numFace < minFaces:
+        return []
+    return simplifyMesh(vertex, face, [numFace >> level for level in xrange(1, numLevels)],
+                        faceUV)
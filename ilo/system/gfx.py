@@ -15,6 +15,7 @@ __all__ = ["Gfx", "GLContext", "Viewport"]
 
 
 import math
+import numpy
 from OpenGL.raw.GL import *
 
 from OpenGL.GL import *
@@ -22,6 +23,7 @@ from OpenGL.GLU import *
 
 from ilo.config import Config
 from ilo.structs.matrix import Matrix4x4
+from ilo.structs.vector import Vector3
 from ilo.messages.exceptios import *
 from ilo.system.material import Texture
 from ilo.system.text import Text
@@ -277,6 +279,7 @@ class GLContext(GfxContext):
         """
         Model leképezési fázis lezárása
         """
+        glBindVertexArray(0)
         glDisableClientState(GL_TEXTURE_COORD_ARRAY)
         glDisableClientState(GL_NORMAL_ARRAY)
         glDisableClientState(GL_VERTEX_ARRAY)
@@ -467,6 +470,19 @@ class GLContext(GfxContext):
             if type == GL_TEXTURE:
                 return Matrix4x4(glGetDoublev(GL_TEXTURE_MATRIX))
 
+        def eyePosition(self):
+            """
+            A nézőpont helye az aktuális modelview mátrix koordináta-
+            rendszerében, azaz a leképezés alatt álló objektum saját
+            koordinátáiban (a szülő objektumok transzformációit is figyelembe
+            véve)
+
+            @return:    A nézőpont objektum koordinátái
+            @rtype:     C{Vector3}
+            """
+            matrix = numpy.linalg.inv(glGetDoublev(GL_MODELVIEW_MATRIX))
+            return Vector3(matrix[3, :3] / matrix[3, 3])
+
         def setMatrix(self, matrix, type = None ):
             """
             Adott típusú mátrix beállítása
@@ -539,6 +555,7 @@ class Viewport(object):
         self.__y = 0
         self.__width = 1
         self.__height = 1
+        self.__infinite = False
 
     def setViewport(self, x, y, width, height, infFrustun=False):
         """
@@ -553,12 +570,20 @@ class Viewport(object):
         height = max(height, 1)
         self.__x, self.__y, self.__width, self.__height = x, y, width, height;
         self.__ration = width/height
+        self.__infinite = infFrustun
 
         glViewport(x, y, width, height)
         self.setPerspectiveView()
         if infFrustun :
             self.__setInfiniteFrustum()
 
+    def resetViewport(self):
+        """
+        A nézet újra beállítása a tárolt méretekkel (pl. a látószög, a
+        közeli sík vagy a végtelen vetítés változása után)
+        """
+        self.setViewport(self.__x, self.__y, self.__width, self.__height, self.__infinite)
+
     def setPerspectiveView(self):
         """
         Perspektív vetítés beállítása
@@ -606,8 +631,15 @@ class Viewport(object):
     def __setInfiniteFrustum(self):
         """
         Végtelen vetítési nézet beállítása
+
+        A beállított perspektív vetítés hátsó vágósíkját toljuk a végtelenbe
+        (az árnyéktérfogatok végtelen távoli pontjaihoz), a mélység
+        pontossága a közeli sík közelében alig változik.
         """
-        GLContext.getInstance().matrix.setMatrix(self.getInfiniteFrustumMatrix(),Gfx.PROJECTION)
+        projection = glGetDoublev(GL_PROJECTION_MATRIX)
+        projection[2][2] = -1.0
+        projection[3][2] = -2.0 * self.__nearPlane
+        GLContext.getInstance().matrix.setMatrix(projection, Gfx.PROJECTION)
 
 #-----------------------------------------GETTER/SETTER-------------------------
 
@@ -624,6 +656,17 @@ class Viewport(object):
         self.__fov = value
         self.resetViewport()
 
+    @property
+    def infiniteFrustum(self):
+        """Végtelen távoli hátsó vágósíkú-e a vetítés"""
+        return self.__infinite
+
+    @infiniteFrustum.setter
+    def infiniteFrustum(self, value):
+        if bool(value) != self.__infinite:
+            self.__infinite = bool(value)
+            self.resetViewport()
+
     @property
     def nearPlane(self):
         return self.__nearPlane
@@ -185,7 +185,7 @@ class LightObject(RenderObject):
     __slots__ = RenderObject.__slots__ + \
                 ('__glLightId','__active', 'lightType', 'diffuse', 'ambient',
                  'specular', 'lightIntesity', '__dirLight', '__spot',
-                 '__spotDirection', '__spotCutOff')
+                 '__spotDirection', '__spotCutOff', 'castShadows', 'shadowMap')
 
     LIGHT_TYPE_OMNI = "omni"
     LIGHT_TYPE_SPOT = "spot"
@@ -232,6 +232,8 @@ class LightObject(RenderObject):
         self.__spot             = False                                         #:@ivar: Spot fény tuljdonságok bekapcsolása
         self.__spotDirection    = Vector3([0.0,0.0,-1.0])                       #:@ivar: A spot fény iránya
         self.__spotCutOff       = 5                                             #:@ivar: A spot fény levágása azaz nyílásszöge
+        self.castShadows        = False                                         #:@ivar: Vet-e árnyékot a fényforrás (ha egyik sem, a legkisebb azonosítójú)
+        self.shadowMap          = None                                          #:@ivar: A fényforrás árnyéktérképe, az árnyék menet hozza létre
 
 
     def render__(self):
@@ -334,6 +336,9 @@ class LightObject(RenderObject):
         A fényforrást töröltük a fő színről
         """
         self.disable()
+        if self.shadowMap is not None:
+            self.shadowMap.remove()
+            self.shadowMap = None
         RenderObject.removedFromScene__(self)
 
 
@@ -380,6 +385,16 @@ class LightObject(RenderObject):
         self.__spotCutOff = value
         self.__spot = True
 
+    @property
+    def lightId(self):
+        """A fényforrás OpenGL-es azonosítója"""
+        return self.__glLightId
+
+    @property
+    def active(self):
+        """C{True} ha a fényforrás be van kapcsolva"""
+        return self.__active
+
     @property
     def isSpot(self):
         """C{True} ha a fényforrás típusa C{Spot} különben C{False}"""
@@ -16,6 +16,43 @@ Anyagjellemzők kezelésével foglalkozó modul
 """
 
 
+def loadBitmap(imageFile):
+    """
+    Tetszőleges típusú képfájl betöltése a C{Python PIL} segítségével.
+    A kép konvertálása RGBA formátumba
+
+    OpenGL hívást nem tartalmaz, így a képek párhuzamosan, akár
+    mellékszálakon is dekódolhatók, és később adhatók át a C{Texture}-nek.
+
+    @param  imageFile:  A képfájl neve és elérési útvonala
+    @type   imageFile:  C{String}
+
+    @return:    A kép adatait, a kép szélessége és magassága
+    @rtype:     C{Tuple}
+
+    @see U{Python PIL 1.1.6 <http://www.pythonware.com/products/pil/>}
+    """
+    # létezik-e az elérési út és a fájl?
+    if os.path.exists(imageFile) and os.path.isfile(imageFile):
+        try:
+            # kép betöltése
+            img = imgOpen(imageFile, "r")
+            try:
+                # a paettás képek RGB-re konvertálása
+                img = img.convert('RGB')
+                iw, ih, image = img.size[0], img.size[1], img.tostring("raw", "RGBA", 0, -1)
+            except SystemError:
+                iw, ih, image = img.size[0], img.size[1], img.tostring("raw", "RGBX", 0, -1)
+
+            assert iw * ih * 4 == len(image), """Nem megfelelő képméret! Támogatott formátumok: RGBX, RGBA"""
+        except IOError as err:
+            print "Bitmap betöltési hiba: ", err
+    else:
+        raise IOError("A képfájl nem található: " + imageFile)
+
+    return image, iw, ih
+
+
 class Material():
     """
     Anyagminta osztály
@@ -142,7 +179,7 @@ class Texture(object):
     FILTER_LINEAR     = "linear"
     FILTER_MIPMAP     = "mipmap"
 
-    def __init__(self, src, filter="linear", type="diffuse"):
+    def __init__(self, src, filter="linear", type="diffuse", bitmap=None):
         """
         Textúra inicilaizálása
 
@@ -152,6 +189,9 @@ class Texture(object):
         @type   filter: C{String}
         @param  type:   A textúra típusa
         @type   type:   C{String}
+        @param  bitmap: A már dekódolt kép (lásd C{loadBitmap}), C{None}
+                        esetén az C{src} fájlt töltjük be
+        @type   bitmap: C{Tuple}
         """
         self.imageFile   = src                                                  #:@ivar: Textúra elérési útonala
         self.type        = type                                                 #:@ivar: Textúra típusa
@@ -159,7 +199,7 @@ class Texture(object):
         self.__texID     = None                                                 #:@ivar: A texúra egyedi openGL azonosítója
 
         if self.type == Texture.TEXTURE_DIFFUSE:
-            self.__genDiffuseMap()
+            self.__genDiffuseMap(bitmap)
         if self.type == Texture.TEXTURE_BUMPMAP:
             pass
         if self.type == Texture.TEXTURE_NORMALMAP:
@@ -181,46 +221,17 @@ class Texture(object):
         glBindTexture(GL_TEXTURE_2D,0)
 
 
-    def __genDiffuseMap(self):
+    def __genDiffuseMap(self, bitmap=None):
         """
         Alap textura
          1. Egydei openGL textúra azonosító generálása
-         2. Képfájl betöltése
+         2. Képfájl betöltése, ha még nincs dekódolva
          3. Textúra filterezése
         """
+        if bitmap == None:
+            bitmap = loadBitmap(self.imageFile)
         self.__texID = glGenTextures(1)
-        self.__textureFilter(*self.__loadBitmap())
-
-
-    def __loadBitmap(self):
-        """
-        Tetszőleges típusú képfájl betöltése a C{Python PIL} segítségével.
-        A kép konvertálása RGBA formátumba
-
-        @return:    A kép adatait, a kép szélessége és magassága
-        @rtype:     C{Tuple}
-
-        @see U{Python PIL 1.1.6 <http://www.pythonware.com/products/pil/>}
-        """
-        # létezik-e az elérési út és a fájl?
-        if os.path.exists(self.imageFile) and os.path.isfile(self.imageFile):
-            try:
-                # kép betöltése
-                img = imgOpen(self.imageFile, "r")
-                try:
-                    # a paettás képek RGB-re konvertálása
-                    img = img.convert('RGB')
-                    iw, ih, image = img.size[0], img.size[1], img.tostring("raw", "RGBA", 0, -1)
-                except SystemError:
-                    iw, ih, image = img.size[0], img.size[1], img.tostring("raw", "RGBX", 0, -1)
-
-                assert iw * ih * 4 == len(image), """Nem megfelelő képméret! Támogatott formátumok: RGBX, RGBA"""
-            except IOError as err:
-                print "Bitmap betöltési hiba: ", err
-        else:
-            raise IOError("A képfájl nem található: " + imageFile)
-
-        return image, iw, ih
+        self.__textureFilter(*bitmap)
 
 
     def __textureFilter (self, image, iw, ih):
@@ -319,6 +330,20 @@ class Shader():
         if self.__program != None:
             glUseProgram(self.__program)
 
+    def getUniformLocation(self, name):
+        """
+        Egy uniform változó helye a shader programban
+
+        @param  name:   A változó neve
+        @type   name:   C{string}
+
+        @return:        A változó helye, -1 ha nincs ilyen változó
+        @rtype:         C{int}
+        """
+        if self.__program == None:
+            return -1
+        return glGetUniformLocation(self.__program, name)
+
     @classmethod
     def unbindShader(self):
         """
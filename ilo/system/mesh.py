@@ -6,194 +6,552 @@ __date__ ="2010.01.09. 14:13:51"
 from OpenGL.GL import *
 from OpenGL.raw.GL.VERSION.GL_3_0 import *
 
+import ctypes
 import numpy
 
+from ilo.config import Config
+from ilo.messages.exceptios import IloError
 from ilo.structs.d3d import *
+from ilo.structs.normals import faceNormals, cornerNormals, cornerTangents
+from ilo.structs.simplify import simplifyLevels
 
 """
 Modell leképező modul
 """
 
-class Mesh(object):
+def _weldVertices(data):
     """
-    3D-s modell sturktúra
+    Azonos (koordináta, normál vektor, textúra koordináta) csúcsok összevonása
 
-    Tárolja a csúcspont, lap, és él adatokat.
-    A csúcs paramétereket:
-     - koordináta
-     - textúra koordináta
-     - normál vektor
-    külön C{Vertex buffer object}-ekben vannak tárolva.
+    A rekordok 32 bites szavaiból FNV jellegű 64 bites kulcsot képzünk, és
+    a kulcsokat C{numpy.unique}-kal csoportosítjuk. Ütközés esetén a
+    rekordok bájtjai szerinti (lassabb) összevonásra térünk át. A csúcsok
+    az első előfordulásuk sorrendjében maradnak.
 
-    A model leképezés is itt megy végbe
+    @param  data:   Sarkonkénti csúcs rekordok
+    @type   data:   C{numpy.ndarray}
+
+    @return:        Az egyedi csúcs rekordok és a sarkok indexei
+    @rtype:         C{tuple}
     """
+    if len(data) == 0:
+        return data, numpy.zeros(0, numpy.uint32)
 
-    __slots__ = ('__vertexes', '__vertexesUV', '__faces', '__edges',
-                 '__vbo_vertex', '__vbo_normal', '__vbo_texture',
-                 '__hasTexture', '__normalList', 
-                 'boundingBox', 'boundingSphere',
-                 'numOfVertex', 'numOfFace')
+    # -0.0 + 0.0 = 0.0, így az előjeles nullák is összevonhatók
+    words = (data.view(numpy.float32).reshape(len(data), -1) + numpy.float32(0)).view(numpy.uint32)
+    key = numpy.zeros(len(data), numpy.uint64)
+    for column in words.T:
+        key = (key ^ column) * numpy.uint64(0x100000001b3)
+    first, inverse = numpy.unique(key, return_index=True, return_inverse=True)[1:]
 
-    def __init__(self, data):
-        """
-        Mesh inicilaizálása
+    if (words[first][inverse] != words).any():
+        rows = numpy.ascontiguousarray(words).view(numpy.dtype((numpy.void, words.shape[1] * 4)))
+        first, inverse = numpy.unique(rows.ravel(), return_index=True, return_inverse=True)[1:]
 
-        @param  data:   Mesh adatok
-        @type   data:   C{ModelFile}
-        """
-        self.numOfVertex = data.numOfVertex                                     #:@ivar: Csúcspontok száma
-        self.numOfFace   = data.numOfFace                                       #:@ivar: Háromszöglapok száma
+    order = numpy.argsort(first)
+    remap = numpy.empty(len(order), numpy.uint32)
+    remap[order] = numpy.arange(len(order), dtype=numpy.uint32)
+    return data[first[order]], remap[inverse]
 
-        self.__vertexes    = []                                                 #:@ivar: Csúcs koordináták és normálvektorok listája
-        self.__vertexesUV  = []                                                 #:@ivar: A csúcsok textúra koordinátáinak listája
-        self.__faces       = []                                                 #:@ivar: Háromszöglapok csúcsainak a listája
-        self.__edges       = []                                                 #:@ivar: Csúcsoka összekötő élek listálya
 
-        #VertexBufferObject változók
-        self.__vbo_vertex  = None                                               #:@ivar: Csúcs koordináták Vertex Buffer Objektum-a
-        self.__vbo_normal  = None                                               #:@ivar: Csúcs normál vektorok Vertex Buffer Objektum-a
-        self.__vbo_texture = None                                               #:@ivar: Csúcs textúra koordinátái Vertex Buffer Objektum-a
+def _dequantizeMatrix(offset, scale):
+    """
+    Az C{offset + q * scale} visszaalakítás 4x4-es mátrixa C{glMultMatrixf}
+    számára (oszlopfolytonos tárolás)
 
-        self.__hasTexture  = data.hasVertexUV                                   #:@ivar: Vannak-e textúra koordinátái a modelnek
-        self.__normalList  = None                                               #:@ivar: Csúcs normálvektorok GLlistája a vektorok megjelenítéséhez
+    @rtype:     C{numpy.ndarray}
+    """
+    matrix = numpy.identity(4, numpy.float32)
+    matrix[numpy.arange(len(scale)), numpy.arange(len(scale))] = scale
+    matrix[3, :len(offset)] = offset
+    return matrix
+
+
+def _packNormals(normal):
+    """
+    Normálvektorok tömörítése C{GL_INT_2_10_10_10_REV} formátumba
 
-        for i in xrange(len(data.vertex)):
-            self.__vertexes.append(Vertex(data.vertex[i], data.vertexNormal[i], i))
+    @return:    Csúcsonként egy C{uint32} érték (10-10-10 bites előjeles x,
+                y, z komponens)
+    @rtype:     C{numpy.ndarray}
+    """
+    q = numpy.clip(numpy.round(normal * 511.0), -511, 511).astype(numpy.int32) & 0x3ff
+    return (q[:, 0] | (q[:, 1] << 10) | (q[:, 2] << 20)).astype(numpy.uint32)
 
-        if data.hasVertexUV:
-            for i in xrange(len(data.vertexUV)):
-                self.__vertexesUV.append(VertexUV(data.vertexUV[i], i))
 
-        for i in xrange(len(data.face)):
-            fv = data.getFaceByIndex(i)
-            for j in xrange(3):
-                self.__vertexes[fv[j]].norm = data.getVertexNormalByIndex(fv[j])
+def _quantize(values, uniform):
+    """
+    Értékek 16 bites egészekké alakítása a befoglaló tartományukon belül
 
-        for face in data.face:
-            for i in face:
-                self.__vertexes[i].norm = data.getVertexNormalByIndex(i)
+    @param  uniform:    Minden komponens ugyanazzal a léptékkel (a
+                        koordinátáknál a normálvektorok miatt kell)
+    @type   uniform:    C{bool}
 
-        for i in xrange(len(data.face)):
-            v  = [self.__vertexes[x] for x in data.face[i]]
-            uv = [self.__vertexesUV[x] for x in data.faceUV[i]]
-            f  = data.faceNormal[i]
-            self.__faces.append(Face(v, uv, f, i))
+    @return:            A kvantált értékek, az eltolás és a lépték
+    @rtype:             C{tuple}
+    """
+    low, high = values.min(0), values.max(0)
+    offset = (low + high) * 0.5
+    scale  = (high - low) / 65534.0
+    if uniform:
+        scale = numpy.repeat(scale.max(), len(scale))
+    scale = numpy.where(scale > 0, scale, 1.0)
+    q = numpy.clip(numpy.round((values - offset) / scale), -32767, 32767)
+    return q.astype(numpy.int16), offset, scale
 
-        edge = {}
-        for face in self.__faces:
-            last = face.verts[-1]
-            for v in face.verts:
-                if not (((v, last) in edge) or ((last, v) in edge)):
-                    edge[(v,last)] = [face.index]
-                else:
-#                    edge[(last,v)].append(face.index)
-                    pass
-                last = v
 
+def _encodeVertices(data, format):
+    """
+    Csúcs rekordok átalakítása a megadott vertex formátumba
 
-        for key, e in edge.iteritems():
-            self.__edges.append(Edge(key[0], key[1], e[0], e[-1]))
+    @param  data:   C{Mesh.VERTEX_TYPE} típusú rekordok
+    @type   data:   C{numpy.ndarray}
+    @param  format: A vertex formátum neve (C{Mesh.VERTEX_FORMATS} kulcsa)
+    @type   format: C{string}
 
-        self.boundingBox    = BoundBox(self.__vertexes)                         #:@ivar: Befoglaló doboz
-        self.boundingSphere = BoundShpere(self.__vertexes)                      #:@ivar: Befoglaló gömb
-        
-        self.__createBuffers()
+    @return:        A rekordok, és a koordináták illetve a textúra
+                    koordináták visszaalakító mátrixa (C{None}, ha nem kell)
+    @rtype:         C{tuple}
+    """
+    if format == "float" or len(data) == 0:
+        return data, None, None
+
+    position = data["position"].astype(numpy.float64)
+    records  = numpy.zeros(len(data), Mesh.VERTEX_FORMATS[format][0])
+    if format == "half":
+        offset = (position.min(0) + position.max(0)) * 0.5
+        records["position"][:, :3] = position - offset
+        positionMatrix = _dequantizeMatrix(offset, numpy.ones(3))
+    else:
+        q, offset, scale = _quantize(position, True)
+        records["position"][:, :3] = q
+        positionMatrix = _dequantizeMatrix(offset, scale)
+
+    records["normal"] = _packNormals(data["normal"])
+    q, offset, scale = _quantize(data["uv"].astype(numpy.float64), False)
+    records["uv"] = q
+    return records, positionMatrix, _dequantizeMatrix(offset, scale)
 
 
-    def __createBuffers(self):
-        """
-        Csúcs koordináták, normál vektor és textúra koordináták kiszámítása és a
-        Vertex Buffer Object-ek inicilaizálása
+class Mesh(object):
+    """
+    3D-s modell sturktúra
+
+    Tárolja a csúcspont, lap, és él adatokat összefüggő C{numpy} tömbökben
+    (C{float32} koordináták, normálvektorok és textúra koordináták,
+    C{int32} lap és él indexek). A C{Vertex}, C{Face} és C{Edge} objektumok
+    csak lekérdezéskor, a tömbökből készülnek.
+    A csúcs paramétereket:
+     - koordináta
+     - normál vektor
+     - textúra koordináta
+    egyetlen, összefésült (interleaved) C{Vertex buffer object}-ben tároljuk,
+    az azonos csúcsokat összevonva. A háromszögeket index bufferből
+    rajzoljuk, a tömbmutatókat és a kötéseket egy C{Vertex array object}
+    rögzíti, így leképezéskor egy kötés és egy rajzoló hívás elég.
+    A sűrű hálókhoz egyszerűsített részletességi szinteket (LOD) is
+    készítünk, ezek az eredeti csúcsokat indexelik, így a vertex és az index
+    buffer közös, a szintek az index buffer egymás utáni tartományai.
+
+    A normálvektorok sarkonként indexeltek. Ha a fájl nem ad normálisokat,
+    a lapok simítási csoportjai, ezek hiányában a C{render.creaseangle}
+    törési szög alapján számoljuk őket, így az éles élek mentén a csúcsok
+    több normálist kapnak.
+
+    A vertex buffer formátuma választható (C{render.vertexformat} vagy a
+    konstruktor paramétere):
+     - C{float}: C{float32} koordináták, normálvektorok és textúra
+       koordináták (32 bájt)
+     - C{half}: C{float16} koordináták a befoglaló doboz közepéhez képest
+       (16 bájt)
+     - C{int16}: a befoglaló dobozra kvantált 16 bites koordináták (16 bájt)
+    A tömörített formátumokban a normálvektorok C{GL_INT_2_10_10_10_REV}, a
+    textúra koordináták a tartományukra kvantált 16 bites egészek, a
+    visszaalakítást a modelview és a textúra mátrix végzi.
+
+    A bufferek feltöltése után a CPU oldali tömböket felszabadítjuk, hacsak
+    nem kérik a megtartásukat (árnyékvetés, ütközésvizsgálat, normálvektorok
+    megjelenítése). Felszabadítás után a tömb tulajdonságok C{None}-t adnak,
+    a topológiát igénylő műveletek kivételt dobnak.
+
+    A model leképezés is itt megy végbe
+    """
+
+    __slots__ = ('__vertex', '__normal', '__normalIndex', '__uv', '__face', '__faceUV',
+                 '__faceNormal', '__smoothing', '__creaseAngle', '__tangent',
+                 '__edge', '__edgeFaces',
+                 '__vbo', '__ibo', '__vao', '__indexType', '__levels',
+                 '__format', '__positionMatrix', '__uvMatrix', '__gpuBytes',
+                 '__hasTexture', '__normalLines',
+                 '__orientedBox', 'boundingBox', 'boundingSphere',
+                 'numOfVertex', 'numOfFace')
+
+    VERTEX_TYPE = numpy.dtype([("position", numpy.float32, 3),
+                               ("normal",   numpy.float32, 3),
+                               ("uv",       numpy.float32, 2)])                 #:@cvar: Az összefésült csúcs rekordok típusa
+
+    LINE_VERTEX_TYPE = numpy.dtype([("position", numpy.float32, 3),
+                                    ("color",    numpy.uint8, 4)])              #:@cvar: A normálvektor vonalak csúcs rekordjainak típusa
+
+    VERTEX_FORMATS = {
+        "float" : (VERTEX_TYPE, GL_FLOAT, GL_FLOAT, GL_FLOAT),
+        "half"  : (numpy.dtype([("position", numpy.float16, 4),
+                                ("normal",   numpy.uint32),
+                                ("uv",       numpy.int16, 2)]),
+                   GL_HALF_FLOAT, GL_INT_2_10_10_10_REV, GL_SHORT),
+        "int16" : (numpy.dtype([("position", numpy.int16, 4),
+                                ("normal",   numpy.uint32),
+                                ("uv",       numpy.int16, 2)]),
+                   GL_SHORT, GL_INT_2_10_10_10_REV, GL_SHORT),
+    }                                                                           #:@cvar: Vertex buffer formátumok: rekordtípus, koordináta, normálvektor és textúra koordináta típus
+
+    def __init__(self, data, vertexFormat=None, keepData=None):
         """
+        Mesh inicilaizálása
 
-        vertex, normal, uv = [], [], []
+        @param  data:           Mesh adatok
+        @type   data:           C{ModelFile}
+        @param  vertexFormat:   A vertex buffer formátuma (C{float}, C{half}
+                                vagy C{int16}), C{None} esetén a
+                                C{render.vertexformat} beállítás
+        @type   vertexFormat:   C{string}
+        @param  keepData:       Megmaradjanak-e a CPU oldali tömbök a bufferek
+                                feltöltése után, C{None} esetén a
+                                C{resource.keepmeshdata} és a
+                                C{display.normalvectors} beállítás dönt
+        @type   keepData:       C{bool}
+        """
+        if vertexFormat == None:
+            vertexFormat = "float"
+            if Config.hasValue("render.vertexformat"):
+                vertexFormat = Config.getValue("render.vertexformat")
+        if vertexFormat not in Mesh.VERTEX_FORMATS:
+            raise IloError("Ismeretlen vertex formatum: %s" % vertexFormat)
 
-        for face in self.__faces :
-            for v in face.verts:
-                vertex.append(v.vert)
-                normal.append(v.norm)
-            if self.__hasTexture :
-                for u in face.uvs:
-                    uv.append(u.uv)
+        self.numOfVertex = data.numOfVertex                                     #:@ivar: Csúcspontok száma
+        self.numOfFace   = data.numOfFace                                       #:@ivar: Háromszöglapok száma
 
-        vertex = numpy.array(vertex , numpy.float32)
-        normal = numpy.array(normal , numpy.float32)
-        uv     = numpy.array(uv     , numpy.float32)
+        self.__vertex      = numpy.ascontiguousarray(data.vertex, numpy.float32)   #:@ivar: Csúcs koordináták C{(n, 3)} tömbje
+        self.__face        = numpy.ascontiguousarray(data.face, numpy.int32)       #:@ivar: Háromszöglapok csúcsindexeinek C{(m, 3)} tömbje
+        self.__uv          = None                                               #:@ivar: Textúra koordináták C{(k, 2)} tömbje
+        self.__faceUV      = None                                               #:@ivar: Háromszöglapok textúra koordináta indexei C{(m, 3)}
 
-        self.__vbo_vertex = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_vertex)
-        glBufferData(GL_ARRAY_BUFFER, vertex, GL_STATIC_DRAW)
+        #VertexBufferObject változók
+        self.__vbo         = None                                               #:@ivar: Az összefésült csúcs adatok Vertex Buffer Objektum-a
+        self.__ibo         = None                                               #:@ivar: A háromszögek csúcsindexeinek buffere
+        self.__indexType   = GL_UNSIGNED_INT                                    #:@ivar: Az index buffer elemtípusa
+        self.__vao         = None                                               #:@ivar: A tömbmutatókat rögzítő Vertex Array Objektum
+        self.__levels      = []                                                 #:@ivar: Részletességi szintenként az index buffer tartománya (darabszám, bájt eltolás)
+        self.__format      = vertexFormat                                       #:@ivar: A vertex buffer formátuma
+        self.__positionMatrix = None                                            #:@ivar: A tömörített koordináták visszaalakító mátrixa
+        self.__uvMatrix    = None                                               #:@ivar: A tömörített textúra koordináták visszaalakító mátrixa
+        self.__gpuBytes    = 0                                                  #:@ivar: A vertex és index bufferek mérete bájtban
+
+        self.__hasTexture  = data.hasVertexUV and data.faceUV is not None       #:@ivar: Vannak-e textúra koordinátái a modelnek
+        self.__normalLines = None                                               #:@ivar: A normálvektorok megjelenítésének C{(vao, vbo, csúcsszám)} adatai
+
+        if self.__hasTexture:
+            self.__uv     = numpy.ascontiguousarray(data.vertexUV, numpy.float32)
+            self.__faceUV = numpy.ascontiguousarray(data.faceUV, numpy.int32)
+
+        faceNormal = data.faceNormal
+        if faceNormal is None:
+            faceNormal = faceNormals(self.__vertex.astype(numpy.float64), self.__face)[0]
+        self.__faceNormal  = numpy.ascontiguousarray(faceNormal, numpy.float32)  #:@ivar: Lapnormálisok C{(m, 3)} tömbje
+
+        self.__smoothing   = None                                               #:@ivar: Laponként a simítási csoportok bitmaszkja, vagy C{None}
+        self.__creaseAngle = None                                               #:@ivar: A normálisok számításának törési szöge, C{None} ha a fájl normálisait használjuk
+        self.__tangent     = None                                               #:@ivar: Sarkonkénti tangensek, első lekérdezéskor számítódnak
+        if data.faceSmoothing is not None:
+            self.__smoothing = numpy.ascontiguousarray(data.faceSmoothing, numpy.uint32)
+
+        if data.vertexNormal is not None:
+            normal, normalIndex = data.vertexNormal, self.__face
+        else:
+            self.__creaseAngle = Config.getValue("render.creaseangle")
+            normal, normalIndex = cornerNormals(self.__vertex, self.__face,
+                                                self.__smoothing, self.__creaseAngle)
+        self.__normal      = numpy.ascontiguousarray(normal, numpy.float32)     #:@ivar: Egyedi normálvektorok C{(k, 3)} tömbje
+        self.__normalIndex = numpy.ascontiguousarray(normalIndex, numpy.int32)  #:@ivar: Háromszöglapok sarkainak normálvektor indexei C{(m, 3)}
+
+        edges = buildEdges(self.__face, len(self.__vertex))
+        self.__edge        = edges[0]                                           #:@ivar: Élek C{(v0, v1, f0, f1)} sorainak C{(e, 4)} tömbje, nyitott élnél C{f1 = -1}
+        self.__edgeFaces   = edges[1]                                           #:@ivar: Élenként a kapcsolódó lapok száma
+
+        self.boundingBox    = BoundBox(self.__vertex)                           #:@ivar: Befoglaló doboz
+        self.boundingSphere = BoundShpere(self.__vertex)                        #:@ivar: Befoglaló gömb
+        self.__orientedBox  = None                                              #:@ivar: Irányított befoglaló doboz, első lekérdezéskor (vagy a CPU adatok felszabadításakor) számítódik
+
+        self.__createBuffers(self.__buildLevels(data))
+
+        if keepData == None:
+            keepData = Config.getValue("resource.keepmeshdata") or \
+                       Config.getValue("display.normalvectors")
+        if not keepData:
+            self.releaseData()
+
+
+    def __buildLevels(self, data):
+        """
+        Egyszerűsített részletességi szintek készítése
 
-        self.__vbo_normal = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_normal)
-        glBufferData(GL_ARRAY_BUFFER, normal, GL_STATIC_DRAW)
+        Szintenként feleződik a lapok száma. A szintek számát a
+        C{render.lodlevels} (az eredetivel együtt), a legkisebb egyszerűsítendő
+        hálót a C{render.lodminfaces} beállítás adja meg. A betöltéskor
+        előkészített (gyorsítótárazott) szinteket használjuk, ha vannak.
 
-        self.__vbo_texture = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_texture)
-        glBufferData(GL_ARRAY_BUFFER, uv, GL_STATIC_DRAW)
+        A szintek normálisait a megmaradt lapok simítási csoportjaival
+        újraszámoljuk, a fájlból beolvasott normálisokat a csúcsindexekkel
+        használjuk tovább.
 
+        @param  data:   Mesh adatok
+        @type   data:   C{ModelFile}
 
-    def renderMesh (self, frontFaces=[]):
+        @return:    Szintenként a lapok, a textúra lapok és a sarkok
+                    normálvektorainak tömbje
+        @rtype:     C{list}
+        """
+        simplified = data.getLevels()
+        if simplified is None:
+            numLevels = 1
+            if Config.hasValue("render.lodlevels"):
+                numLevels = Config.getValue("render.lodlevels")
+            simplified = simplifyLevels(self.__vertex, self.__face, self.__faceUV, numLevels,
+                                        Config.getValue("render.lodminfaces"))
+        levels = []
+        for face, faceUV, origin in simplified:
+            face = numpy.asarray(face, numpy.int32)
+            if not self.__hasTexture:
+                faceUV = None
+            if self.__creaseAngle is None:
+                normal = self.__normal[face]
+            else:
+                smoothing = self.__smoothing[origin] if self.__smoothing is not None else None
+                normal, normalIndex = cornerNormals(self.__vertex, face, smoothing,
+                                                    self.__creaseAngle)
+                normal = normal[normalIndex]
+            levels.append((face, faceUV, normal))
+        return levels
+
+
+    def __vertexRecords(self, face, faceUV, normal):
         """
-        Vertex Object Buffer-ek leképezése
+        A lapok sarkainak összefésült csúcs rekordjai
 
-        @param  frontFaces: A látható lapok listája
-        @type   frontFaces: C{list}
+        @param  normal: A sarkok normálvektorai C{(m, 3, 3)} tömbben
+        @type   normal: C{numpy.ndarray}
+
+        @rtype:     C{numpy.ndarray}
         """
+        data = numpy.zeros(len(face) * 3, Mesh.VERTEX_TYPE)
+        data["position"] = self.__vertex[face].reshape(-1, 3)
+        data["normal"]   = normal.reshape(-1, 3)
+        if self.__hasTexture:
+            data["uv"]   = self.__uv[faceUV].reshape(-1, 2)
+        return data
 
-        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_vertex)
-        glVertexPointer(3, GL_FLOAT, 0, None)
 
-        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_normal)
-        glNormalPointer(GL_FLOAT, 0, None)
+    def __createBuffers(self, simplified):
+        """
+        Az összefésült csúcs adatok (koordináta, normál vektor, textúra
+        koordináta) kiszámítása és összevonása, a Vertex Buffer Object és az
+        index buffer feltöltése, majd a tömbmutatók rögzítése egy Vertex
+        Array Object-ben
+
+        Az összes részletességi szint sarkait együtt vonjuk össze, így a
+        szintek közös csúcsai egyszer kerülnek a bufferbe. Legfeljebb 65536
+        csúcs esetén 16 bites indexeket használunk, végül a rekordokat a
+        választott vertex formátumba alakítjuk.
+
+        @param  simplified: Az egyszerűsített szintek (C{__buildLevels})
+        @type   simplified: C{list}
+        """
+        levels = [(self.__face, self.__faceUV, self.__normal[self.__normalIndex])] + simplified
+        data = numpy.concatenate([self.__vertexRecords(face, faceUV, normal)
+                                  for face, faceUV, normal in levels])
+        data, indices = _weldVertices(data)
+        if len(data) <= 0x10000:
+            indices = indices.astype(numpy.uint16)
+            self.__indexType = GL_UNSIGNED_SHORT
+
+        data, self.__positionMatrix, self.__uvMatrix = _encodeVertices(data, self.__format)
+        if not self.__hasTexture:
+            self.__uvMatrix = None
+
+        counts = [len(face) * 3 for face, faceUV, normal in levels]
+        starts = numpy.cumsum([0] + counts[:-1]) * indices.itemsize
+        self.__levels = zip(counts, starts.tolist())
+
+        vao = numpy.zeros(1, numpy.uint32)
+        glGenVertexArrays(1, vao)
+        self.__vao = int(vao[0])
+        glBindVertexArray(self.__vao)
+
+        self.__vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.view(numpy.uint8), GL_STATIC_DRAW)
+
+        self.__ibo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.__ibo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices, GL_STATIC_DRAW)
+        self.__gpuBytes = data.nbytes + indices.nbytes
+
+        recordType, positionType, normalType, uvType = Mesh.VERTEX_FORMATS[self.__format]
+        stride = recordType.itemsize
+        fields = recordType.fields
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, positionType, stride, None)
+        glNormalPointer(normalType, stride, ctypes.c_void_p(fields["normal"][1]))
+        glTexCoordPointer(2, uvType, stride, ctypes.c_void_p(fields["uv"][1]))
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+
+    def renderMesh (self, frontFaces=[], level=0):
+        """
+        Az indexelt háromszögek leképezése a rögzített Vertex Array Object-tel
 
-        glBindBuffer(GL_ARRAY_BUFFER, self.__vbo_texture)
-        glTexCoordPointer(2, GL_FLOAT, 0, None)
+        A VAO kötve marad, a nem VAO-s leképezők (pl. C{Q3BSP}) és a
+        leképezési fázis vége a 0-s VAO-t kötik vissza. Tömörített vertex
+        formátumnál a visszaalakító mátrixokat a rajzolás idejére a
+        modelview és a textúra mátrixra szorozzuk.
 
-        glDrawArrays(GL_TRIANGLES, 0, self.numOfFace * 3)
-        #glDrawElements(GL_TRIANGLES, len(frontFaces), GL_UNSIGNED_INT, frontFaces)
+        @param  frontFaces: A látható lapok listája
+        @type   frontFaces: C{list}
+        @param  level:      A részletességi szint, 0 az eredeti háló
+        @type   level:      C{int}
+        """
+        count, start = self.__levels[level]
+        glBindVertexArray(self.__vao)
+        if self.__positionMatrix is None:
+            glDrawElements(GL_TRIANGLES, count, self.__indexType, ctypes.c_void_p(start))
+            return
+
+        glPushMatrix()
+        glMultMatrixf(self.__positionMatrix)
+        if self.__uvMatrix is not None:
+            glMatrixMode(GL_TEXTURE)
+            glPushMatrix()
+            glMultMatrixf(self.__uvMatrix)
+            glMatrixMode(GL_MODELVIEW)
+
+        glDrawElements(GL_TRIANGLES, count, self.__indexType, ctypes.c_void_p(start))
+
+        if self.__uvMatrix is not None:
+            glMatrixMode(GL_TEXTURE)
+            glPopMatrix()
+            glMatrixMode(GL_MODELVIEW)
+        glPopMatrix()
+
+
+    def selectLevel(self, eye, current=0):
+        """
+        Részletességi szint választása a nézőpont távolsága alapján
+
+        A távolságot a befoglaló gömb sugarában mérjük, ami rögzített
+        látószögnél a vetített mérettel arányos. Az 1. szint
+        C{render.loddistance} sugárnyi távolságtól kezdődik, minden további
+        szint kétszer ilyen messze. A szintváltás a határ körüli
+        C{render.lodhysteresis} arányú sávban késleltetett, így a határon
+        mozgó nézőpontnál nem vált folyamatosan.
+
+        @param  eye:        A nézőpont a háló koordináta-rendszerében
+        @type   eye:        C{Vector3}
+        @param  current:    Az eddig használt szint
+        @type   current:    C{int}
+
+        @return:            A használandó szint
+        @rtype:             C{int}
+        """
+        last = len(self.__levels) - 1
+        if last <= 0:
+            return 0
+        offset   = numpy.asarray(eye, numpy.float64) - numpy.asarray(self.boundingSphere.center)
+        distance = numpy.sqrt((offset * offset).sum()) / max(self.boundingSphere.radius, 1e-6)
+        start    = Config.getValue("render.loddistance")
+        margin   = Config.getValue("render.lodhysteresis")
+
+        level = min(current, last)
+        while level < last and distance > start * (1 << level) * (1.0 + margin):
+            level += 1
+        while level > 0 and distance < start * (1 << (level - 1)) * (1.0 - margin):
+            level -= 1
+        return level
 
 
     def renderNormalVectors(self):
         """
-        Vertex normál vektorok megjelenítése C{glList} segítségével
+        A normálvektorok vonalainak kirajzolása a saját Vertex Array
+        Object-jükkel
         """
-        if self.__normalList:
-            glCallList(self.__normalList)
+        if self.__normalLines:
+            vao, vbo, count = self.__normalLines
+            glBindVertexArray(vao)
+            glDrawArrays(GL_LINES, 0, count)
+            glBindVertexArray(0)
 
 
     def showNormalVectors(self):
         """
-        A csúcs normálvektorainak megjelenítéséhez szükséges C{glList}
-        létrehozása és számított adatokkal (csúcspont koordináták + eltolás)
-        való feltöltés.
-        """
-        self.__normalList = glGenLists(1)
-        glNewList(self.__normalList, GL_COMPILE)
-        glBegin(GL_LINES)
-        glColor(1.,1.,1.)
-        def add(x, y): return x + y
-        #vertex normal
-        for i in self.__vertexes:
-            glVertex3fv(i.vert)
-            glVertex3fv(i.vert+i.norm*3)
-        #face normal
-        glColor(1.,0.,1.)
-        for i in self.__faces:
-            center = (i.verts[0].vert + i.verts[1].vert + i.verts[2].vert) / 3.0
-            glVertex3fv(center)
-            glVertex3fv(i.norm *10 + center)
-        glEnd()
-        glEndList()
+        A normálvektorok vonalainak feltöltése egy vertex bufferbe
+
+        A sarkok normálvektorai (fehér) és a lapnormálisok (lila, a lapok
+        középpontjából) vonalainak végpontjait egyetlen tömbművelettel
+        számoljuk, a színnel összefésülve töltjük fel, a tömbmutatókat külön
+        Vertex Array Object rögzíti.
+        """
+        self.__checkData()
+        self.hideNormalVectors()
+
+        position = numpy.zeros_like(self.__normal)
+        position[self.__normalIndex.ravel()] = self.__vertex[self.__face.ravel()]
+        centers = self.__vertex[self.__face].mean(1)
+        start = numpy.concatenate((position, centers))
+        end   = numpy.concatenate((position + self.__normal * 3,
+                                   centers + self.__faceNormal * 10))
+
+        data = numpy.zeros((len(start), 2), Mesh.LINE_VERTEX_TYPE)
+        data["position"][:, 0] = start
+        data["position"][:, 1] = end
+        data["color"][:len(position)] = (255, 255, 255, 255)
+        data["color"][len(position):] = (255, 0, 255, 255)
+        data = data.ravel()
+
+        vao = numpy.zeros(1, numpy.uint32)
+        glGenVertexArrays(1, vao)
+        glBindVertexArray(int(vao[0]))
+        vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.view(numpy.uint8), GL_STATIC_DRAW)
+
+        stride = Mesh.LINE_VERTEX_TYPE.itemsize
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, None)
+        glColorPointer(4, GL_UNSIGNED_BYTE, stride,
+                       ctypes.c_void_p(Mesh.LINE_VERTEX_TYPE.fields["color"][1]))
+
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.__normalLines = (int(vao[0]), vbo, len(data))
+        self.__gpuBytes += data.nbytes
 
 
     def hideNormalVectors(self):
         """
-        Csúcs normálvektorok megjelenítési listájának (C{glList}) törlése
+        A normálvektorok vertex bufferének és Vertex Array Object-jének
+        törlése
         """
-        if self.__normalList:
-            glDeleteLists(self.__normalList, 1)
-            self.__normalList = None
+        if self.__normalLines:
+            vao, vbo, count = self.__normalLines
+            glDeleteVertexArrays(1, numpy.array([vao], numpy.uint32))
+            glDeleteBuffers([vbo])
+            self.__gpuBytes -= count * Mesh.LINE_VERTEX_TYPE.itemsize
+            self.__normalLines = None
 
 
     def remove(self):
@@ -201,22 +559,199 @@ class Mesh(object):
         Geometria adatok törlése
         """
         self.hideNormalVectors()
-        glDeleteBuffers([self.__vbo_normal,
-                         self.__vbo_texture,
-                         self.__vbo_vertex])
+        glDeleteVertexArrays(1, numpy.array([self.__vao], numpy.uint32))
+        glDeleteBuffers([self.__vbo, self.__ibo])
+        self.__gpuBytes = 0
+
+
+    def releaseData(self):
+        """
+        A CPU oldali csúcs, lap és él tömbök felszabadítása
+
+        A befoglaló térfogatok és a részletességi szintek adatai megmaradnak,
+        a leképezéshez csak a GPU bufferek kellenek. Az irányított befoglaló
+        dobozt a felszabadítás előtt kiszámoljuk.
+        """
+        if self.__vertex is not None and self.__orientedBox is None:
+            self.__orientedBox = BoundOrientedBox(self.__vertex)
+        self.__vertex      = None
+        self.__normal      = None
+        self.__normalIndex = None
+        self.__uv          = None
+        self.__face        = None
+        self.__faceUV      = None
+        self.__faceNormal  = None
+        self.__smoothing   = None
+        self.__tangent     = None
+        self.__edge        = None
+        self.__edgeFaces   = None
+
+
+    def __checkData(self):
+        """
+        Kivétel, ha a CPU oldali tömbök már fel vannak szabadítva
+        """
+        if self.__vertex is None:
+            raise IloError("A mesh CPU adatai fel vannak szabaditva (keepData)")
+
+
+    def memoryUsage(self):
+        """
+        A mesh memóriafoglalása
+
+        A CPU oldalon a tömbök mérete (a gyorsítótárból leképezett tömböké
+        is), a GPU oldalon a vertex és index bufferek mérete számít.
+
+        @return:    C{{"cpu": bájt, "gpu": bájt}} szótár
+        @rtype:     C{dict}
+        """
+        cpu = 0
+        for array in (self.__vertex, self.__normal, self.__normalIndex, self.__uv,
+                      self.__face, self.__faceUV, self.__faceNormal, self.__smoothing,
+                      self.__tangent, self.__edge, self.__edgeFaces):
+            if array is not None:
+                cpu += array.nbytes
+        return {"cpu": cpu, "gpu": self.__gpuBytes}
 
     @property
     def vertexes(self):
-        """Csúcspontok listája"""
-        return self.__vertexes
+        """Csúcspontok listája (a tömbökből minden lekérdezéskor készül), több
+        normálisú csúcsnál az utolsó sarok normálisával"""
+        self.__checkData()
+        normal = numpy.zeros_like(self.__vertex)
+        normal[self.__face.ravel()] = self.__normal[self.__normalIndex.ravel()]
+        return [Vertex(vert, norm, i) for i, (vert, norm) in
+                enumerate(zip(self.__vertex, normal))]
+
+    @property
+    def vertexesUV(self):
+        """Textúra koordináták listája (a tömbökből minden lekérdezéskor készül)"""
+        self.__checkData()
+        if not self.__hasTexture:
+            return []
+        return [VertexUV(uv, i) for i, uv in enumerate(self.__uv)]
 
     @property
     def faces(self):
-        """Lapok listája"""
-        return self.__faces
+        """Lapok listája (a tömbökből minden lekérdezéskor készül)"""
+        vertexes   = self.vertexes
+        vertexesUV = self.vertexesUV
+        faces = []
+        for i, face in enumerate(self.__face.tolist()):
+            uvs = []
+            if self.__hasTexture:
+                uvs = [vertexesUV[x] for x in self.__faceUV[i]]
+            faces.append(Face([vertexes[x] for x in face], uvs, self.__faceNormal[i], i))
+        return faces
 
     @property
     def edges(self):
-        """Élek listája"""
-        return self.__edges
+        """Élek listája (a tömbökből minden lekérdezéskor készül), nyitott élnél
+        a második lap C{None}"""
+        self.__checkData()
+        vertexes = self.vertexes
+        return [Edge(vertexes[v0], vertexes[v1], f0, f1 if f1 >= 0 else None)
+                for v0, v1, f0, f1 in self.__edge.tolist()]
+
+    @property
+    def hasData(self):
+        """Megvannak-e még a CPU oldali tömbök"""
+        return self.__vertex is not None
+
+    @property
+    def vertexFormat(self):
+        """A vertex buffer formátuma"""
+        return self.__format
+
+    @property
+    def numOfLevels(self):
+        """A részletességi szintek száma (az eredeti hálóval együtt)"""
+        return len(self.__levels)
 
+    @property
+    def levelFaces(self):
+        """Szintenként a háromszögek száma"""
+        return [count // 3 for count, start in self.__levels]
+
+    @property
+    def orientedBoundingBox(self):
+        """Irányított befoglaló doboz (első lekérdezéskor számítódik)"""
+        if self.__orientedBox is None:
+            self.__orientedBox = BoundOrientedBox(self.__vertex)
+        return self.__orientedBox
+
+    @property
+    def vertexArray(self):
+        """Csúcs koordináták C{(n, 3)} C{float32} tömbje"""
+        return self.__vertex
+
+    @property
+    def normalArray(self):
+        """Egyedi normálvektorok C{(k, 3)} C{float32} tömbje, a sarkokhoz a
+        C{normalIndexArray} rendeli"""
+        return self.__normal
+
+    @property
+    def normalIndexArray(self):
+        """Lapok sarkainak normálvektor indexei, C{(m, 3)} C{int32} tömb"""
+        return self.__normalIndex
+
+    @property
+    def faceSmoothingArray(self):
+        """Laponként a simítási csoportok C{uint32} bitmaszkja, vagy C{None}"""
+        return self.__smoothing
+
+    @property
+    def tangentArray(self):
+        """Sarkonkénti C{(x, y, z, w)} tangensek C{(m, 3, 4)} C{float32}
+        tömbje a normál térképezéshez (első lekérdezéskor számítódik), textúra
+        koordináták nélkül C{None}"""
+        if self.__tangent is None and self.__hasTexture:
+            self.__checkData()
+            self.__tangent = cornerTangents(self.__vertex, self.__face, self.__uv,
+                                            self.__faceUV, self.__normal, self.__normalIndex)
+        return self.__tangent
+
+    @property
+    def uvArray(self):
+        """Textúra koordináták C{(k, 2)} C{float32} tömbje, vagy C{None}"""
+        return self.__uv
+
+    @property
+    def faceArray(self):
+        """Lapok csúcsindexeinek C{(m, 3)} C{int32} tömbje"""
+        return self.__face
+
+    @property
+    def faceUVArray(self):
+        """Lapok textúra koordináta indexeinek C{(m, 3)} C{int32} tömbje, vagy C{None}"""
+        return self.__faceUV
+
+    @property
+    def faceNormalArray(self):
+        """Lapnormálisok C{(m, 3)} C{float32} tömbje"""
+        return self.__faceNormal
+
+    @property
+    def edgeArray(self):
+        """Élek C{(v0, v1, f0, f1)} indexeinek C{(e, 4)} C{int32} tömbje,
+        nyitott élnél C{f1 = -1}"""
+        return self.__edge
+
+    @property
+    def openEdges(self):
+        """Élenként: csak egy laphoz tartozik-e (logikai tömb)"""
+        self.__checkData()
+        return self.__edgeFaces == 1
+
+    @property
+    def nonManifoldEdges(self):
+        """Élenként: kettőnél több laphoz tartozik-e (logikai tömb)"""
+        self.__checkData()
+        return self.__edgeFaces > 2
+
+    @property
+    def isClosed(self):
+        """Zárt, sokaság felület-e (minden élhez pontosan két lap tartozik)"""
+        self.__checkData()
+        return bool((self.__edgeFaces == 2).all())
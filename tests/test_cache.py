@@ -0,0 +1,46 @@
+# -*- coding: utf -*-
+
+import shutil
+import tempfile
+import unittest
+
+from ilo.filereader.model.ase import loadASEFile
+from ilo.filereader.model.cache import loadCachedModel, isCached
+
+"""
+A lemezes geometria gyorsítótár tesztjei
+"""
+
+
+class CacheTest(unittest.TestCase):
+
+    SOURCE = "data/model/gomb.ase"
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheDir)
+
+    def loader(self, fileName, geomIDs=None):
+        self.calls.append(geomIDs)
+        return loadASEFile(fileName, geomIDs)
+
+    def testSelectiveLoadFillsCache(self):
+        first = loadCachedModel(self.SOURCE, "ase", self.loader, self.cacheDir, ["Cone"])
+        self.assertEqual([geom.name for geom in first], ["Cone"])
+        self.assertTrue(isCached(self.SOURCE, "ase", self.cacheDir))
+
+        second = loadCachedModel(self.SOURCE, "ase", self.loader, self.cacheDir, ["Cone"])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([geom.name for geom in second], ["Cone"])
+        self.assertEqual(second[0].numOfFace, first[0].numOfFace)
+
+        other = loadCachedModel(self.SOURCE, "ase", self.loader, self.cacheDir, ["Suzanne"])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual([geom.name for geom in other], ["Suzanne"])
+
+
+if __name__ == "__main__":
+    unittest.main()
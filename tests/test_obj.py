@@ -0,0 +1,43 @@
+# -*- coding: utf -*-
+
+import os
+import tempfile
+import unittest
+
+from ilo.filereader.model.obj import loadOBJFile
+
+"""
+A Wavefront OBJ beolvasó tesztjei
+"""
+
+
+class ObjTest(unittest.TestCase):
+
+    def load(self, text):
+        handle, fileName = tempfile.mkstemp(suffix=".obj")
+        try:
+            os.write(handle, text)
+            os.close(handle)
+            return loadOBJFile(fileName)
+        finally:
+            os.remove(fileName)
+
+    def testMixedFormats(self):
+        geoms = self.load("v 0 0 0\n"
+                          "v 1 0 0 1 0 0  # szinnel\n"
+                          "v 1 1 0\n"
+                          "v 0 1 0 0.5 0.5 0.5\n"
+                          "vt 0 0\n"
+                          "vn 0 0 1\n"
+                          "f 1/1 2/1 3/1\n"
+                          "f 1 3 4\n"
+                          "f 1//1 2//1 3//1\n"
+                          "f 1/1/1 3/1/1 4/1/1\n")
+        self.assertEqual(len(geoms), 1)
+        self.assertEqual(geoms[0].numOfVertex, 4)
+        self.assertEqual(geoms[0].face.tolist(), [[0, 1, 2], [0, 2, 3], [0, 1, 2], [0, 2, 3]])
+        self.assertEqual(geoms[0].vertex[1].tolist(), [1.0, 0.0, 0.0])
+
+
+if __name__ == "__main__":
+    unittest.main()